@@ -0,0 +1,32 @@
+"""
+Microbenchmark of delfi_check_which_case: the ORDER_CASES hash indexes against the old branch-by-branch code.
+
+Run from the repository root: python benchmarks/bench_order_cases.py
+"""
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'tests')]
+
+from krembot_order_cases import delfi_check_which_case
+from legacy_order_cases import delfi_check_which_case as legacy_check_which_case
+
+ORDERS = {
+    'first case (x1)': {'type': 'standard', 'status': 'finished', 'delivery_service': 'DEFAULT', 'payment_type': 'ON_DELIVERY', 'package_status': 'WAITING_FOR_EXPORT'},
+    'card payment (x10)': {'type': 'standard', 'status': 'paymentCompleted', 'delivery_service': 'DEFAULT', 'payment_type': 'VISA_CREDIT_CARD', 'package_status': 'WAITING_FOR_EXPORT'},
+    'last case (x30)': {'type': 'standard', 'status': 'finished', 'delivery_service': 'DHL', 'payment_type': 'ON_DELIVERY', 'package_status': 'EXPORTED_TO_MP99'},
+    'no match (x24)': {'type': 'standard', 'status': 'finished', 'delivery_service': 'DHL', 'payment_type': 'PAYMENT_SLIP', 'package_status': 'EXPORTED'},
+}
+
+
+def bench(function, order, number=20000):
+    return min(timeit.repeat(lambda: function(order), number=number, repeat=5)) / number * 1e6
+
+
+if __name__ == '__main__':
+    print(f"{'order':<22}{'legacy us':>12}{'table us':>12}{'speedup':>10}")
+    for name, order in ORDERS.items():
+        legacy, table = bench(legacy_check_which_case, order), bench(delfi_check_which_case, order)
+        print(f"{name:<22}{legacy:>12.2f}{table:>12.2f}{legacy / table:>9.1f}x")
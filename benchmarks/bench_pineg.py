@@ -0,0 +1,144 @@
+"""
+Wall-clock benchmark of pineg: the concurrent lookups against the old sequential loop.
+
+OpenAI, Pinecone, the product API and Neo4j are replaced by stand-ins that sleep for a typical latency, so the
+numbers show how many round trips each version waits for, not the speed of the services. krembot_tools is
+imported, so the app's dependencies must be installed.
+Run from the repository root: python benchmarks/bench_pineg.py
+"""
+import contextlib
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+os.environ.setdefault('DESCRIPTION_STORE_PATH', os.path.join(tempfile.mkdtemp(), 'descriptions.sqlite3'))
+
+import krembot_tools
+import legacy_pineg
+
+# Simulated latencies in seconds
+EMBEDDING_LATENCY = 0.15
+PINECONE_LATENCY = 0.06
+PRODUCT_API_LATENCY = 0.12
+NEO4J_LATENCY = 0.04
+
+# Products found by the question, in search order, and by the second search for an out-of-stock product
+SEARCH_IDS = [101, 102, 103, 104]
+SECOND_SEARCH_IDS = [201, 202, 203, 204, 205]
+
+
+class Response:
+    def __init__(self, matches):
+        self.matches = matches
+
+    def to_dict(self):
+        return {'matches': self.matches}
+
+
+class Index:
+    def query(self, top_k, filter, **kwargs):
+        time.sleep(PINECONE_LATENCY)
+        ids = SEARCH_IDS if filter is None else SECOND_SEARCH_IDS
+        return Response([
+            {'score': 1 - rank / 10, 'metadata': {
+                'id': f"id-{sec_id}", 'sec_id': sec_id, 'text': f"Opis knjige {sec_id}",
+                'authors': ['Ivo Andrić'], 'title': f"Knjiga {sec_id}",
+            }}
+            for rank, sec_id in enumerate(ids[:top_k])
+        ])
+
+
+class Session:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query):
+        time.sleep(NEO4J_LATENCY)
+        sec_id = int(re.search(r'oldProductId = (\d+)', query).group(1))
+        book = {
+            'id': f"id-{sec_id}", 'oldProductId': sec_id, 'title': f"Knjiga {sec_id}", 'category': 'Knjiga',
+            'price': 1999.0, 'quantity': 5, 'pages': 320, 'eBook': False,
+        }
+        return [{'b': book, 'author': 'Ivo Andrić', 'genre': 'Roman'}]
+
+
+class Driver:
+    def session(self):
+        return Session()
+
+
+class Embedding:
+    def __init__(self):
+        self.embedding = [0.0] * 8
+        self.data = [self]
+
+
+class Embeddings:
+    def create(self, input, model):
+        time.sleep(EMBEDDING_LATENCY)
+        return Embedding()
+
+
+class Client:
+    embeddings = Embeddings()
+
+
+def stand_ins(out_of_stock):
+    def delfi_api_products(sec_ids, *args, **kwargs):
+        time.sleep(PRODUCT_API_LATENCY)
+        return [
+            {'id': str(sec_id), 'puna cena': 1999.0, 'lager': '5', 'url': f"https://delfi.rs/knjige/{sec_id}"}
+            for sec_id in sec_ids if sec_id not in out_of_stock
+        ]
+
+    def embed_text(text, model="text-embedding-3-large"):
+        time.sleep(EMBEDDING_LATENCY)
+        return [0.0] * 8
+
+    return {
+        'connect_to_pinecone': lambda x: Index(),
+        'connect_to_neo4j': lambda: Driver(),
+        'delfi_api_products': delfi_api_products,
+        'embed_text': embed_text,
+        'client': Client(),
+    }
+
+
+SCENARIOS = {
+    'all in stock': set(),
+    'first out of stock': {101},
+    'two out of stock': {101, 102},
+}
+
+
+def bench(pineg, module, out_of_stock, repeat=3):
+    for name, stand_in in stand_ins(out_of_stock).items():
+        if hasattr(module, name):
+            setattr(module, name, stand_in)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        # pineg prints every result
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = pineg("Preporuči mi neki roman Ive Andrića")
+        timings.append(time.perf_counter() - started)
+    # The old loop appended the results of a second search as a nested list
+    flat = [item for result in results for item in (result if isinstance(result, list) else [result])]
+    return min(timings), [result['id'] for result in flat]
+
+
+if __name__ == '__main__':
+    print(f"{'scenario':<22}{'legacy s':>10}{'new s':>10}{'speedup':>10}")
+    for name, out_of_stock in SCENARIOS.items():
+        legacy, legacy_ids = bench(legacy_pineg.pineg, legacy_pineg, out_of_stock)
+        new, new_ids = bench(krembot_tools.pineg, krembot_tools, out_of_stock)
+        assert legacy_ids == new_ids, (name, legacy_ids, new_ids)
+        print(f"{name:<22}{legacy:>10.2f}{new:>10.2f}{legacy / new:>9.1f}x")
@@ -0,0 +1,95 @@
+"""
+Microbenchmark of parse_product_info: the streaming parser with price tier tables against the old
+ET.fromstring parser with if/elif price branches, on product API responses of each kind.
+
+krembot_tools is imported, so the app's dependencies must be installed.
+Run from the repository root: python benchmarks/bench_product_info.py
+"""
+import contextlib
+import io
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+from krembot_tools import parse_product_info
+from legacy_product_info import parse_product_info as legacy_parse_product_info
+
+
+PRICE_LIST = '''
+    <priceList>
+      <fullPrice>1999.00</fullPrice>
+      <eBookPrice>999.00</eBookPrice>
+      <collectionFullPrice>0.00</collectionFullPrice>
+      <regularDiscountPrice>{regular}</regularDiscountPrice>
+      <regularDiscountPremiumPrice>{premium}</regularDiscountPremiumPrice>
+      <quantityDiscountPrice>{quantity}</quantityDiscountPrice>
+      <quantityDiscountPremiumPrice>{quantity_premium}</quantityDiscountPremiumPrice>
+      <quantityDiscountLimit>3</quantityDiscountLimit>
+      <quantityDiscountPremiumLimit>3</quantityDiscountPremiumLimit>
+    </priceList>'''
+
+
+def response(lager=12, action='', regular='1799.10', premium='1699.15', quantity='1599.20', quantity_premium='1499.25'):
+    """A product API response in the shape the API returns."""
+    price_list = PRICE_LIST.format(regular=regular, premium=premium, quantity=quantity, quantity_premium=quantity_premium)
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<response>
+  <status>OK</status>
+  <product>
+    <ID>123456</ID>
+    <ID_nav>789012</ID_nav>
+    <title>Na Drini ćuprija</title>
+    <lager>{lager}</lager>
+    <url>https://delfi.rs/knjige/123456_na_drini_cuprija</url>{price_list}{action}
+  </product>
+</response>'''.encode('utf-8')
+
+
+RESPONSES = {
+    'price list': response(),
+    'one price': response(regular='1799.10', premium='1799.10', quantity='1799.10', quantity_premium='1799.10'),
+    'fixed price action': response(action='''
+    <action>
+      <type>fixedPrice</type>
+      <title>Jesenja akcija</title>
+      <endAt>2024-11-30T23:59:59Z</endAt>
+      <priceRegularStandard>1499.00</priceRegularStandard>
+      <priceRegularPremium>1399.00</priceRegularPremium>
+      <priceQuantityStandard>1499.00</priceQuantityStandard>
+      <priceQuantityPremium>1299.00</priceQuantityPremium>
+    </action>'''),
+    'exponential action': response(action='''
+    <action>
+      <type>exponentialDiscount</type>
+      <title>Više knjiga, veći popust</title>
+      <endAt>2024-11-30T23:59:59Z</endAt>
+      <levelPercentages>10,20,30</levelPercentages>
+      <levelPrices>1799.10,1599.20,1399.30</levelPrices>
+    </action>'''),
+    'quantity action': response(action='''
+    <action>
+      <type>quantityDiscount2</type>
+      <title>Druga knjiga jeftinije</title>
+      <endAt>2024-11-30T23:59:59Z</endAt>
+      <priceQuantityStandard>1399.00</priceQuantityStandard>
+      <priceQuantityPremium>1299.00</priceQuantityPremium>
+      <quantityDiscount2Limit>2</quantityDiscount2Limit>
+    </action>'''),
+    'out of stock': response(lager=0),
+}
+
+
+def bench(function, xml_data, number=5000):
+    # The old parser prints debugging lines for every product
+    with contextlib.redirect_stdout(io.StringIO()):
+        return min(timeit.repeat(lambda: function(xml_data), number=number, repeat=5)) / number * 1e6
+
+
+if __name__ == '__main__':
+    print(f"{'response':<22}{'legacy us':>12}{'new us':>12}{'speedup':>10}")
+    for name, xml_data in RESPONSES.items():
+        legacy, new = bench(legacy_parse_product_info, xml_data), bench(parse_product_info, xml_data)
+        print(f"{name:<22}{legacy:>12.2f}{new:>12.2f}{legacy / new:>9.1f}x")
@@ -0,0 +1,275 @@
+"""
+The sequential pineg from before the concurrent lookups, kept verbatim as the baseline of bench_pineg.py.
+"""
+from typing import Dict, List
+
+from krembot_tools import client, connect_to_neo4j, connect_to_pinecone, delfi_api_products
+
+
+def pineg(pitanje):
+    """
+    Processes a user's question, performs a dense vector search in Pinecone, fetches relevant data from an API and Neo4j, 
+    combines the results, and displays them in a structured format.
+
+    Parameters:
+    pitanje (str): User's question in natural language.
+
+    Returns:
+    list: A list of combined results, each containing information from the API, Pinecone, and Neo4j database.
+    
+    The function consists of the following steps:
+    1. Connects to the Pinecone index using `connect_to_pinecone(x=0)` and to the Neo4j database using `connect_to_neo4j()`.
+    2. Defines a nested function `run_cypher_query()` to execute a Cypher query on Neo4j to retrieve book data including 
+       authors and genres.
+    3. Uses `get_embedding()` to create embeddings for a given text and `dense_query()` to perform a similarity search in Pinecone.
+    4. Searches Pinecone using `search_pinecone()` for the initial query and `search_pinecone_second_set()` for secondary searches.
+    5. Combines book data retrieved from Neo4j and API data using `combine_data()`.
+    6. Displays the final combined data in a user-friendly format using `display_results()`.
+    
+    The function performs error handling to avoid processing duplicate entries, limits the number of API calls to a maximum 
+    of three, and returns a list of combined results with enriched book information.
+    """
+    index = connect_to_pinecone(x=0)
+    driver = connect_to_neo4j()
+
+    def run_cypher_query(id):
+        query = f"MATCH (b:Book)-[:WROTE]-(a:Author), (b)-[:BELONGS_TO]-(g:Genre) WHERE b.oldProductId = {id} AND b.quantity > 0 RETURN b, a.name AS author, g.name AS genre"
+        with driver.session() as session:
+            result = session.run(query)
+            book_data = []
+            for record in result:
+                book_node = record['b']
+                existing_book = next((book for book in book_data if book['id'] == book_node['id']), None)
+                if existing_book:
+                    # Proveri da li su 'author' i 'genre' liste, ako nisu, konvertuj ih
+                    if not isinstance(existing_book['author'], list):
+                        existing_book['author'] = [existing_book['author']]
+                    if not isinstance(existing_book['genre'], list):
+                        existing_book['genre'] = [existing_book['genre']]
+
+                    # Ako postoji, dodaj autora i žanr u postojeće liste ako nisu već tamo
+                    if record['author'] not in existing_book['author']:
+                        existing_book['author'].append(record['author'])
+                    if record['genre'] not in existing_book['genre']:
+                        existing_book['genre'].append(record['genre'])
+                else:
+                    # Ako ne postoji, dodaj novi zapis sa autorom i žanrom kao liste
+                    book_data.append({
+                        'id': book_node['id'],
+                        'oldProductId': book_node['oldProductId'],
+                        'title': book_node['title'],
+                        'author': record['author'],
+                        'category': book_node['category'],
+                        'genre': record['genre'],
+                        'price': book_node['price'],
+                        'quantity': book_node['quantity'],
+                        'pages': book_node['pages'],
+                        'eBook': book_node['eBook']
+                })
+            # print(f"Book Data: {book_data}")
+            return book_data
+
+    def get_embedding(text, model="text-embedding-3-large"):
+        response = client.embeddings.create(
+            input=[text],
+            model=model
+        ).data[0].embedding
+        # print(f"Embedding Response: {response}")
+        
+        return response
+
+    def dense_query(query, top_k, filter, namespace="opisi"):
+        # Get embedding for the query
+        dense = get_embedding(text=query)
+        # print(f"Dense: {dense}")
+
+        query_params = {
+            'top_k': top_k,
+            'vector': dense,
+            'include_metadata': True,
+            'filter': filter,
+            'namespace': namespace
+        }
+
+        response = index.query(**query_params)
+
+        matches = response.to_dict().get('matches', [])
+        # print(f"Matches: {matches}")
+        matches.sort(key=lambda x: x['score'], reverse=True)
+
+        return matches
+
+    def search_pinecone(query: str) -> List[Dict]:
+        # Dobij embedding za query
+        query_embedding = dense_query(query, top_k=4, filter=None)
+        # print(f"Results: {query_embedding}")
+
+        # Ekstraktuj id i text iz metapodataka rezultata
+        matches = []
+        for match in query_embedding:
+            metadata = match['metadata']
+            matches.append({
+                'id': metadata['id'],
+                'sec_id': int(metadata['sec_id']),
+                'text': metadata['text'],
+                'authors': metadata['authors'],
+                'title': metadata['title']
+            })
+        
+        return matches
+
+    def search_pinecone_second_set(title: str, authors: str ) -> List[Dict]:
+        # Dobij embedding za query
+        query = "Nađi knjigu"
+        filter = {"title" : {"$eq" : title}, "authors" : {"$in" : authors}}
+        query_embedding_2 = dense_query(query, top_k=5, filter=filter)
+        # print(f"Results: {query_embedding}")
+
+        # Ekstraktuj id i text iz metapodataka rezultata
+        matches = []
+        for match in query_embedding_2:
+            metadata = match['metadata']
+            matches.append({
+                'id': metadata['id'],
+                'sec_id': int(metadata['sec_id']),
+                'text': metadata['text'],
+                'authors': metadata['authors'],
+                'title': metadata['title']
+            })
+        
+        # print(f"Matches: {matches}")
+        return matches
+
+    def combine_data(api_data, book_data, description):
+        combined_data = []
+        for book in book_data:
+            # Pronađi odgovarajući unos u api_data na osnovu oldProductId
+            matching_api_entry = next((item for item in api_data if str(item['id']) == str(book['oldProductId'])), None)
+            
+            if matching_api_entry:
+                # Uzmemo samo potrebna polja iz book_data
+                selected_book_data = {
+                    'title': book.get('title'),
+                    'author': book.get('author', []),
+                    'category': book.get('category'),
+                    'genre': book.get('genre', []),
+                    'pages': book.get('pages'),
+                    'eBook': book.get('eBook')
+                }
+                combined_entry = {
+                    **selected_book_data,  # Dodaj samo potrebna polja iz book_data
+                    **matching_api_entry,  # Dodaj sve podatke iz api_data
+                    'description': description  # Dodaj opis
+                }
+            
+            combined_data.append(combined_entry)
+
+        return combined_data
+
+    def display_results(combined_data):
+        x = ""
+        for data in combined_data:
+            print(f"Data iz display_results: {data}")
+            if "title" in data:
+                print(f"Naziv: {data['title']}")
+                x += f"Naslov: {data['title']}\n"
+            if "author" in data:
+                x += f"Autor: {data['author']}\n"
+            if "category" in data:
+                x += f"Kategorija: {data['category']}\n"
+            if "genre" in data:
+                x += f"Žanr: {(data['genre'])}\n"
+            if "puna cena" in data:
+                x += f"Cena: {data['puna cena']}\n"
+            if "lager" in data:
+                x += f"Dostupnost: {data['lager']}\n"
+            if "pages" in data:
+                x += f"Broj stranica: {data['pages']}\n"
+            if "eBook" in data:
+                x += f"eBook: {data['eBook']}\n"
+            if "description" in data:
+                x += f"Opis: {data['description']}\n"
+            if "url" in data:
+                x += f"Link: {data['url']}\n"
+            if 'cena sa redovnim popustom' in data:
+                x += f"Cena sa redovnim popustom: {data['cena sa redovnim popustom']}\n"
+            if 'cena sa redovnim popustom na količinu' in data:
+                x += f"Cena sa redovnim popustom na količinu: {data['cena sa redovnim popustom na količinu']}\n"
+            if 'limit za količinski popust' in data:
+                x += f"Limit za količinski popust: {data['limit za količinski popust']}\n"
+            if 'cena sa premium popustom' in data:
+                x += f"Cena sa premium popustom: {data['cena sa premium popustom']}\n"
+            if 'cena sa premium popustom na količinu' in data:
+                x += f"Cena sa premium popustom na količinu: {data['cena sa premium popustom na količinu']}\n"
+            if 'limit za količinski premium popust' in data:
+                x += f"Limit za količinski premium popust: {data['limit za količinski premium popust']}\n"
+            x += "\n\n"
+
+        return x
+
+    search_results = search_pinecone(pitanje)
+    print(f"Search Results: {search_results}")
+
+    combined_results = []
+    duplicate_filter = []
+    counter = 0
+
+    for result in search_results:
+        print(f"Result: {result}")
+        if result['sec_id'] in duplicate_filter:
+            print(f"Duplicate Filter: {duplicate_filter}")
+            continue
+        else:
+            if counter < 3:
+                api_data = delfi_api_products([result['sec_id']])
+                # print(f"API Data: {api_data}")
+                if api_data:
+                    counter += 1
+                    print(f"Counter: {counter}")
+                else:
+                    print(f"API Data is empty for sec_id: {result['sec_id']}")
+                    title = result['title']
+                    authors = result['authors']
+                    search_results_2 = search_pinecone_second_set(title, authors)
+                    for result_2 in search_results_2:
+                        if result_2['sec_id'] in duplicate_filter:
+                            continue
+                        else:
+                            api_data = delfi_api_products([result_2['sec_id']])
+                            # print(f"API Data 2: {api_data}")
+                            if api_data:
+                                counter += 1
+                                # print(f"Counter 2: {counter}")
+                                data = run_cypher_query(result_2['sec_id'])
+                                # print(f"Data: {data}")
+
+                                combined_data = combine_data(api_data, data, result_2['text'])
+                                # print(f"Combined Data: {combined_data}")
+                                duplicate_filter.append(result_2['sec_id'])
+                                
+                                combined_results.append(combined_data)
+                            
+                                # display_results(combined_data)
+                                break
+
+                    continue # Preskoči ako je api_data prazan
+
+                data = run_cypher_query(result['sec_id'])
+                # print(f"Data: {data}")
+
+                combined_data = combine_data(api_data, data, result['text'])
+                # print(f"Combined Data: {combined_data}")
+                duplicate_filter.append(result['sec_id'])
+                # print(f"Duplicate Filter: {duplicate_filter}")
+                
+                combined_results.extend(combined_data)
+                # print(f"Combined Results: {combined_results}")
+                
+                
+                # return display_results(combined_data)
+            else:
+                break
+    display_results(combined_data)
+    # print(f"Combined Results: {combined_results}")
+    # print(f"Display Results: {display_results(combined_results)}")
+    return combined_results
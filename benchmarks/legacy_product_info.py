@@ -0,0 +1,193 @@
+"""
+The product API parser of delfi_api_products before DelfiProductClient, kept verbatim as the baseline of
+bench_product_info.py.
+"""
+import xml.etree.ElementTree as ET
+
+
+def parse_product_info(xml_data):
+    product_info = {}
+    quantity_discount2_flag = False
+    try:
+        root = ET.fromstring(xml_data)
+        product_node = root.find(".//product")
+        if product_node is not None:
+            # cena = product_node.findtext('cena')
+            lager = product_node.findtext('lager')
+            url = product_node.findtext('url')
+            id = product_node.findtext('ID')
+            navid = product_node.findtext('ID_nav')
+
+            action_node = product_node.find('action')
+            if action_node is not None:
+                print(f"Action node found!")  # Debugging line
+                type = action_node.find('type').text
+                if type == "fixedPrice" or type == "fixedDiscount":
+                    title = action_node.find('title').text
+                    end_at = action_node.find('endAt').text
+                    price_regular_standard = float(action_node.find('priceRegularStandard').text)
+                    price_regular_premium = float(action_node.find('priceRegularPremium').text)
+                    price_quantity_standard = float(action_node.find('priceQuantityStandard').text)
+                    price_quantity_premium = float(action_node.find('priceQuantityPremium').text)
+
+                    if price_regular_standard == price_regular_premium == price_quantity_standard == price_quantity_premium:
+                        akcija = {
+                        'naziv akcije': title,
+                        'kraj akcije': end_at,
+                        'akcijska cena': price_regular_standard
+                    }
+                    elif price_regular_standard == price_regular_premium and price_quantity_standard == price_quantity_premium:
+                        akcija = {
+                        'naziv akcije': title,
+                        'kraj akcije': end_at,
+                        'akcijska cena': price_regular_standard,
+                        'akcijska cena sa količinskim popustom': price_quantity_standard
+                    }
+                    elif price_regular_standard == price_quantity_standard and price_regular_premium == price_quantity_premium:
+                        akcija = {
+                        'naziv akcije': title,
+                        'kraj akcije': end_at,
+                        'akcijska cena': price_regular_standard,
+                        'akcijska premium cena': price_regular_premium
+                    }
+                    elif price_regular_standard == price_regular_premium == price_quantity_standard != price_quantity_premium:
+                        akcija = {
+                        'naziv akcije': title,
+                        'kraj akcije': end_at,
+                        'akcijska cena': price_regular_standard,
+                        'akcijska premium cena sa količinskim popustom': price_quantity_premium
+                    }
+                    elif price_regular_standard == price_quantity_standard and price_regular_premium != price_regular_standard and price_quantity_premium != price_quantity_standard and price_regular_premium != price_quantity_premium:
+                        akcija = {
+                        'naziv akcije': title,
+                        'kraj akcije': end_at,
+                        'akcijska cena': price_regular_standard,
+                        'akcijska premium cena': price_regular_premium,
+                        'akcijska premium cena sa količinskim popustom': price_quantity_premium
+                    }
+                    else:
+                        akcija = {
+                            'naziv akcije': title,
+                            'kraj akcije': end_at,
+                            'cena sa redovnim popustom': price_regular_standard,
+                            'cena sa premium popustom': price_regular_premium,
+                            'cena sa redovnim količinskim popustom': price_quantity_standard,
+                            'cena sa premium količinskim popustom': price_quantity_premium
+                        }
+                elif type == "exponentialDiscount":
+                    title = action_node.find('title').text
+                    end_at = action_node.find('endAt').text
+                    eksponencijalni_procenti = action_node.find('levelPercentages').text
+                    eksponencijalne_cene = action_node.find('levelPrices').text
+
+                    akcija = {
+                        'naziv akcije': title,
+                        'kraj akcije': end_at,
+                        'eksponencijalni procenti': eksponencijalni_procenti,
+                        'eksponencijalne cene': eksponencijalne_cene
+                    }
+                elif type == "quantityDiscount2":
+                    quantity_discount2_flag = True
+                    title = action_node.find('title').text
+                    end_at = action_node.find('endAt').text
+                    price_quantity_standard_d2 = float(action_node.find('priceQuantityStandard').text)
+                    price_quantity_premium_d2 = float(action_node.find('priceQuantityPremium').text)
+                    quantity_discount_limit = int(action_node.find('quantityDiscount2Limit').text)
+
+                    akcija = {
+                        'naziv akcije': title,
+                        'kraj akcije': end_at,
+                        'cena sa redovnim količinskim popustom': price_quantity_standard_d2,
+                        'cena sa premium količinskim popustom': price_quantity_premium_d2,
+                        'limit za količinski popust': quantity_discount_limit
+                    }
+            else:
+                print("Action node not found, taking regular price")  # Debugging line
+            
+            # Pristupanje priceList elementu
+            price_list = product_node.find('priceList')
+            if price_list is not None:
+                collection_price = float(price_list.find('collectionFullPrice').text)
+                full_price = float(price_list.find('fullPrice').text)
+                eBook_price = float(price_list.find('eBookPrice').text)
+                regular_discount_price = float(price_list.find('regularDiscountPrice').text)
+                quantity_discount_price = float(price_list.find('quantityDiscountPrice').text)
+                quantity_discount_limit = int(price_list.find('quantityDiscountLimit').text)
+                premium_discount_price = float(price_list.find('regularDiscountPremiumPrice').text)
+                premium_quantity_discount_price = float(price_list.find('quantityDiscountPremiumPrice').text)
+                premium_quantity_discount_limit = int(price_list.find('quantityDiscountPremiumLimit').text)
+
+                if regular_discount_price == premium_discount_price == quantity_discount_price == premium_quantity_discount_price:
+                    cene = {
+                        'akcijska cena': regular_discount_price
+                    }
+                elif regular_discount_price == premium_discount_price and quantity_discount_price == premium_quantity_discount_price:
+                    cene = {
+                        'cena sa popustom': regular_discount_price,
+                        'cena sa količinskim popustom': quantity_discount_price
+                    }
+                elif regular_discount_price == quantity_discount_price and premium_discount_price == premium_quantity_discount_price:
+                    cene = {
+                        'cena sa redovnim popustom': regular_discount_price,
+                        'cena sa premium popustom': premium_discount_price
+                    }
+                elif regular_discount_price == premium_discount_price == quantity_discount_price != premium_quantity_discount_price:
+                    cene = {
+                        'cena sa popustom': regular_discount_price,
+                        'cena sa premium količinskim popustom': premium_quantity_discount_price
+                    }
+                elif regular_discount_price == quantity_discount_price and premium_discount_price != regular_discount_price and premium_quantity_discount_price != quantity_discount_price and premium_discount_price != premium_quantity_discount_price:
+                    cene = {
+                        'cena sa redovnim popustom': regular_discount_price,
+                        'cena sa premium popustom': premium_discount_price,
+                        'cena sa premium količinskim popustom': premium_quantity_discount_price
+                    }
+                else:
+                    cene = {
+                    'cena sa redovnim popustom': regular_discount_price,
+                    'cena sa redovnim popustom na količinu': quantity_discount_price,
+                    'cena sa premium popustom': premium_discount_price,
+                    'cena sa premium popustom na količinu': premium_quantity_discount_price,
+                    }
+                
+                if quantity_discount_limit == quantity_discount_limit:
+                    limit = {
+                        'limit za količinski popust': quantity_discount_limit
+                    }
+                else:
+                    limit = {
+                        'limit za redovan količinski popust': quantity_discount_limit,
+                        'limit za premium količinski popust': premium_quantity_discount_limit
+                    }
+            
+                pojedinacne_cene_za_quantity_discount2 = {
+                    'cena sa redovnim popustom': regular_discount_price,
+                    'cena sa premium popustom': premium_discount_price
+                }
+
+            # if lager and int(lager) > 0:
+            if int(lager) > 0:
+                product_info = {
+                    'puna cena': full_price,
+                    'eBook cena': eBook_price,
+                    'cena kolekcije': collection_price,
+                    'lager': lager,
+                    'url': url,
+                    'id': id,
+                    # 'navid': navid
+                }
+                if action_node is None:
+                    product_info.update(cene)
+                    product_info.update(limit)
+                elif quantity_discount2_flag:
+                    product_info.update(pojedinacne_cene_za_quantity_discount2)
+                    product_info.update(akcija)
+                else:
+                    product_info.update(akcija)
+            else:
+                print(f"Skipping product with lager {lager}")  # Debugging line
+        else:
+            print("Product node not found in XML data")  # Debugging line
+    except ET.ParseError as e:
+        print(f"Error parsing XML: {e}")  # Debugging line
+    return product_info
@@ -5,7 +5,7 @@ from openai import OpenAI
 from os import getenv
 # from streamlit_mic_recorder import mic_recorder
 
-from krembot_auxiliary import load_config, CATEGORY_DEVICE_MAPPING, reset_memory, handle_feedback, initialize_session_state
+from krembot_auxiliary import load_config, CATEGORY_DEVICE_MAPPING, reset_memory, handle_feedback, initialize_session_state, persist_conversation, load_thread, load_older, touch_thread, visible_history, remember_tool_output, report_session_memory
 
 # IZABERI JEDAN OD: Delfi, DentyR, DentyS, ECD
 which_client_locally = "Delfi"
@@ -15,6 +15,7 @@ load_config(which_client_locally)
 
 from krembot_tools import rag_tool_answer
 from krembot_db import ConversationDatabase, work_prompts
+from krembot_usage import usage_collector
 #from krembot_stui import *
 from krembot_funcs import *
 
@@ -44,6 +45,7 @@ default_values = {
     "messages": {},
     "image_ai": None,
     "thread_id": str(uuid.uuid4()),
+    "session_id": str(uuid.uuid4()),
     "filtered_messages": "",
     "selected_question": None,
     "username": "positive",
@@ -51,6 +53,8 @@ default_values = {
     # "app_name": "Krembot",
     "feedback": {},
     "fb_k": {},
+    "persisted": {},
+    "history": {},
 }
 
 initialize_session_state(default_values)
@@ -106,14 +110,6 @@ def main():
     else:
         current_thread_id = st.session_state.thread_id
 
-        with ConversationDatabase() as db:
-            db.update_or_insert_sql_record(
-                st.session_state.app_name,
-                st.session_state.username,
-                current_thread_id,
-                st.session_state.messages[current_thread_id]
-            )
-
         try:
             if "Thread_" in st.session_state.thread_id:
                 contains_system_role = any(message.get('role') == 'system' for message in st.session_state.messages[thread_name])
@@ -124,13 +120,16 @@ def main():
        
         # Check if there's an existing conversation in the session state
         if current_thread_id not in st.session_state.messages:
-            # If not, initialize it with the conversation from the database or as an empty list
-            with ConversationDatabase() as db:
-                st.session_state.messages[current_thread_id] = db.query_sql_record(st.session_state.app_name, st.session_state.username, current_thread_id) or []
+            # If not, load its last page from the database
+            load_thread(current_thread_id)
+        touch_thread(current_thread_id)
         if current_thread_id in st.session_state.messages:
             # avatari primena
             if current_thread_id in st.session_state.messages:
-                for message in st.session_state.messages[current_thread_id]:
+                history, has_older = visible_history(current_thread_id)
+                if has_older:
+                    st.button("⬆ Prikaži starije poruke", key="load_older", on_click=load_older, args=(current_thread_id,))
+                for message in history:
                     if message["role"] == "assistant": 
                         with st.chat_message("assistant", avatar=avatar_ai):
                             st.markdown(message["content"])
@@ -188,6 +187,7 @@ def main():
                             file=audio_bio,
                             language="sr"
                         )
+                        usage_collector.transcription(transcript, "whisper-1", "stt")
                     except Exception as e:
                         st.error(f"Neočekivana Greška : {str(e)} pokušajte malo kasnije.")
                         err += 1
@@ -207,10 +207,7 @@ def main():
         else:
             result, tool = rag_tool_answer(st.session_state.prompt, 1)
         # After getting the tool output
-        st.session_state.tool_outputs.append({
-            'user_message': st.session_state.prompt,
-            'tool_output': result
-        })
+        remember_tool_output(st.session_state.prompt, result)
 
         st.session_state.tool_answer = result
         with st.expander("Expand"):
@@ -279,6 +276,9 @@ def main():
                     stream=True,
                     stream_options={"include_usage":True},
                     ):
+                    if response.usage:
+                        # Final chunk of the stream, requested with include_usage
+                        usage_collector.chat(response, "answer")
                     try:
                         full_response += (response.choices[0].delta.content or "")
                         message_placeholder.markdown(full_response + "▌")
@@ -291,6 +291,8 @@ def main():
             # Append assistant's response to the conversation
             st.session_state.messages[current_thread_id].append({"role": "tool", "content": str(tool)})
             st.session_state.messages[current_thread_id].append({"role": "assistant", "content": full_response})
+            # Persist once the answer is complete; reruns without new messages write nothing
+            persist_conversation(current_thread_id)
             st.session_state.filtered_messages = ""
             # da pise i tool
             filtered_data = [entry for entry in st.session_state.messages[current_thread_id] if entry['role'] in ["user", "assistant", "tool"]]
@@ -336,6 +338,8 @@ def main():
             st.button("🗑 Obriši", on_click=reset_memory)
     """
 
+    report_session_memory()
+
  
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,11 +3,36 @@ from os import getenv
 from neo4j import GraphDatabase, Driver
 from neo4j.graph import Node
 import json
+import sys
+import threading
+from hashlib import sha256
 from pinecone import Pinecone
-from typing import Any, List, Dict, Any
+from typing import Any, List, Dict, Tuple
 from re import finditer
+from time import monotonic
+from unicodedata import combining, normalize
 import streamlit as st
-from krembot_db import ConversationDatabase
+from krembot_db import ConversationDatabase, write_behind
+
+
+# Messages shown per history page, and threads kept in the session state
+HISTORY_PAGE_SIZE = int(getenv("HISTORY_PAGE_SIZE", "20"))
+SESSION_MAX_THREADS = int(getenv("SESSION_MAX_THREADS", "5"))
+
+# Tool outputs kept in the session state, by count and by total size in bytes
+TOOL_OUTPUTS_MAX_COUNT = int(getenv("TOOL_OUTPUTS_MAX_COUNT", "10"))
+TOOL_OUTPUTS_MAX_BYTES = int(getenv("TOOL_OUTPUTS_MAX_BYTES", str(1024 * 1024)))
+
+# Memory reports of the sessions of this process, see `report_session_memory`. A session is measured at most
+# once per SESSION_MEMORY_SAMPLE_INTERVAL seconds and a summary of all sessions is printed every
+# SESSION_MEMORY_LOG_INTERVAL seconds.
+SESSION_MEMORY_TTL = 3600
+SESSION_MEMORY_SAMPLE_INTERVAL = float(getenv("SESSION_MEMORY_SAMPLE_INTERVAL", "60"))
+SESSION_MEMORY_LOG_INTERVAL = float(getenv("SESSION_MEMORY_LOG_INTERVAL", "600"))
+session_memory: Dict[str, Dict[str, Any]] = {}
+session_memory_lock = threading.Lock()
+session_memory_logged = 0.0
+
 
 # Load the configurations from JSON file located in the 'clients' folder
 def load_config(client_key: str) -> None:
@@ -126,6 +151,20 @@ def generate_tool_dict(choose_rag: str) -> Dict[str, str]:
 
     return tools_dict
 
+def strip_diacritics(text: str) -> str:
+    """
+    Lowercases the text and removes Serbian diacritics so that e.g. 'Andrić' and 'andric' compare equal.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: The lowercased text without diacritics ('đ' becomes 'dj').
+    """
+    text = text.lower().replace('đ', 'dj')
+    return ''.join(char for char in normalize('NFKD', text) if not combining(char))
+
+
 def connect_to_neo4j() -> Driver:
     """
     Establishes a connection to the Neo4j database using credentials from environment variables.
@@ -171,7 +210,7 @@ def handle_feedback() -> None:
     Processes and stores user feedback within the Streamlit application.
 
     This function retrieves feedback data from the Streamlit session state, structures it into a predefined
-    format, and stores it in the database using the `ConversationDatabase` context manager. The feedback
+    format, and queues it for the database on the `write_behind` queue, so the click does not wait for MSSQL. The feedback
     includes details such as the previous question, the tool's answer, the user's given answer, the type
     of feedback (Good/Bad), and any optional text provided by the user.
 
@@ -198,21 +237,291 @@ def handle_feedback() -> None:
 
     # Store feedback data in the database
     try:
-        with ConversationDatabase() as db:
-            db.insert_feedback(
-                thread_id=st.session_state.thread_id,
-                app_name=st.session_state.app_name,
-                previous_question=feedback_data["previous_question"],
-                tool_answer=feedback_data["tool_answer"],
-                given_answer=feedback_data["given_answer"],
-                thumbs=feedback_data["feedback_type"],
-                feedback_text=feedback_data["optional_text"]
-            )
+        write_behind.add_feedback(
+            thread_id=st.session_state.thread_id,
+            app_name=st.session_state.app_name,
+            previous_question=feedback_data["previous_question"],
+            tool_answer=feedback_data["tool_answer"],
+            given_answer=feedback_data["given_answer"],
+            thumbs=feedback_data["feedback_type"],
+            feedback_text=feedback_data["optional_text"]
+        )
         st.toast("✔️ Feedback received and stored in the database!")
     except Exception as e:
         st.error(f"Error storing feedback: {e}")
 
 
+def message_digest(message: Dict[str, Any]) -> str:
+    """
+    Hashes one message.
+
+    Args:
+        message (Dict[str, Any]): The message.
+
+    Returns:
+        str: The SHA-256 hash of the message.
+    """
+    payload = json.dumps(message, sort_keys=True, ensure_ascii=False, default=str)
+    return sha256(payload.encode('utf-8')).hexdigest()
+
+
+def mark_persisted(thread_id: str, messages: List[Dict[str, Any]]) -> None:
+    """
+    Records in the session state that a conversation is stored in the database as it is now.
+
+    The record holds the message count and the hash of the last message, so the next check is O(1).
+
+    Args:
+        thread_id (str): The thread identifier.
+        messages (List[Dict[str, Any]]): The stored conversation.
+    """
+    st.session_state.persisted[thread_id] = {
+        'count': len(messages),
+        'last': message_digest(messages[-1]) if messages else '',
+    }
+
+
+def is_dirty(thread_id: str, messages: List[Dict[str, Any]]) -> bool:
+    """
+    Checks whether a conversation changed since it was last stored or loaded.
+
+    Messages are only ever appended (or the conversation is reset), so comparing the message count and the
+    last message is enough; the conversation is not re-serialized.
+
+    Args:
+        thread_id (str): The thread identifier.
+        messages (List[Dict[str, Any]]): The current conversation.
+
+    Returns:
+        bool: True if the conversation has messages that are not stored yet.
+    """
+    record = st.session_state.persisted.get(thread_id)
+    if record is None:
+        return bool(messages)
+    if len(messages) != record['count']:
+        return True
+    return bool(messages) and message_digest(messages[-1]) != record['last']
+
+
+def persist_conversation(thread_id: str) -> bool:
+    """
+    Queues the conversation of a thread for the database if it has new messages.
+
+    Args:
+        thread_id (str): The thread identifier.
+
+    Returns:
+        bool: True if the conversation was queued, False if it was unchanged.
+    """
+    messages = st.session_state.messages.get(thread_id, [])
+    if not is_dirty(thread_id, messages):
+        return False
+    history = st.session_state.history.get(thread_id, {})
+    write_behind.save_conversation(
+        st.session_state.app_name,
+        st.session_state.username,
+        thread_id,
+        messages,
+        history.get('offset', 0),
+        history.get('head', 0)
+    )
+    mark_persisted(thread_id, messages)
+    return True
+
+
+def load_thread(thread_id: str) -> None:
+    """
+    Loads a thread from the database into the session state.
+
+    In the 'messages' storage mode only the system prompt and the last HISTORY_PAGE_SIZE messages are loaded;
+    older messages are loaded on demand by `load_older`. The session keeps, per thread, the number of leading
+    messages ('head'), the number of stored messages not loaded ('offset') and the number of messages shown
+    ('visible').
+
+    Args:
+        thread_id (str): The thread identifier.
+    """
+    app_name, user_name = st.session_state.app_name, st.session_state.username
+    head: List[Dict[str, Any]] = []
+    with ConversationDatabase() as db:
+        if db.storage == 'messages':
+            page, start = db.query_sql_record_page(app_name, user_name, thread_id, HISTORY_PAGE_SIZE)
+            if start > 0:
+                first, _ = db.query_sql_record_page(app_name, user_name, thread_id, 1, before=1)
+                head = [message for message in first if message['role'] == 'system']
+        else:
+            page, start = db.query_sql_record(app_name, user_name, thread_id) or [], 0
+    st.session_state.messages[thread_id] = head + page
+    st.session_state.history[thread_id] = {'head': len(head), 'offset': start - len(head), 'visible': HISTORY_PAGE_SIZE}
+    mark_persisted(thread_id, st.session_state.messages[thread_id])
+
+
+def load_older(thread_id: str) -> None:
+    """
+    Shows the previous page of a thread, loading it from the database if it is not in the session yet.
+
+    Args:
+        thread_id (str): The thread identifier.
+    """
+    messages = st.session_state.messages[thread_id]
+    history = st.session_state.history.setdefault(thread_id, {'head': 0, 'offset': 0, 'visible': HISTORY_PAGE_SIZE})
+    history['visible'] += HISTORY_PAGE_SIZE
+    head, offset = history['head'], history['offset']
+    if history['visible'] <= len(messages) - head or offset == 0:
+        return
+    with ConversationDatabase() as db:
+        page, _ = db.query_sql_record_page(
+            st.session_state.app_name, st.session_state.username, thread_id,
+            HISTORY_PAGE_SIZE, before=head + offset, after=head
+        )
+    record = st.session_state.persisted.get(thread_id)
+    messages[head:head] = page
+    history['offset'] = offset - len(page)
+    if record:
+        # The loaded page is stored already; the last stored message is unchanged
+        record['count'] += len(page)
+
+
+def visible_history(thread_id: str) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Returns the messages of a thread to render.
+
+    Args:
+        thread_id (str): The thread identifier.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], bool]: The last 'visible' messages after the head, and whether there are
+                                           older messages to show.
+    """
+    messages = st.session_state.messages.get(thread_id, [])
+    history = st.session_state.history.get(thread_id, {'head': 0, 'offset': 0, 'visible': HISTORY_PAGE_SIZE})
+    body = messages[history['head']:]
+    visible = body[-history['visible']:]
+    return visible, len(body) > len(visible) or history['offset'] > 0
+
+
+def touch_thread(thread_id: str) -> None:
+    """
+    Marks a thread as the most recently used and evicts the least recently used threads from the session.
+
+    At most SESSION_MAX_THREADS threads are kept in `st.session_state.messages`. Evicted threads are queued
+    for the database if they have unsaved messages and are loaded again by `load_thread` when reopened.
+
+    Args:
+        thread_id (str): The thread identifier.
+    """
+    threads = st.session_state.messages
+    if thread_id in threads:
+        threads[thread_id] = threads.pop(thread_id)
+    for old in [thread for thread in threads if thread != thread_id][:max(0, len(threads) - SESSION_MAX_THREADS)]:
+        persist_conversation(old)
+        del threads[old]
+        st.session_state.persisted.pop(old, None)
+        st.session_state.history.pop(old, None)
+
+
+def approximate_size(value: Any) -> int:
+    """
+    Returns the approximate memory use of a value in bytes, including the lists, dicts and strings it holds.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_size(key) + approximate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(approximate_size(item) for item in value)
+    return size
+
+
+def remember_tool_output(user_message: str, tool_output: Any) -> None:
+    """
+    Keeps a tool output in `st.session_state.tool_outputs`, within TOOL_OUTPUTS_MAX_COUNT entries and
+    TOOL_OUTPUTS_MAX_BYTES bytes.
+
+    The oldest entries over either limit are removed from the session and queued for the 'tool_outputs'
+    table, so a long session does not keep every tool output in memory.
+
+    Args:
+        user_message (str): The user's question.
+        tool_output (Any): The output of the tool that answered it.
+    """
+    outputs = st.session_state.tool_outputs
+    entry = {'thread_id': st.session_state.thread_id, 'user_message': user_message, 'tool_output': tool_output}
+    entry['size'] = approximate_size(entry)
+    outputs.append(entry)
+    total = sum(output.get('size', 0) for output in outputs)
+    while len(outputs) > TOOL_OUTPUTS_MAX_COUNT or (len(outputs) > 1 and total > TOOL_OUTPUTS_MAX_BYTES):
+        old = outputs.pop(0)
+        total -= old.get('size', 0)
+        write_behind.add_tool_output(
+            st.session_state.app_name,
+            st.session_state.username,
+            old.get('thread_id', st.session_state.thread_id),
+            old['user_message'],
+            old['tool_output'] if isinstance(old['tool_output'], str) else json.dumps(old['tool_output'], ensure_ascii=False, default=str)
+        )
+
+
+def report_session_memory() -> Dict[str, Any]:
+    """
+    Measures the memory held by the current session and records it for `session_memory_stats`.
+
+    Measuring walks every message of the session, so it runs at most once per SESSION_MEMORY_SAMPLE_INTERVAL
+    seconds per session; reruns in between return the last report. Every SESSION_MEMORY_LOG_INTERVAL seconds
+    the number of sessions, their total size and the largest session are printed.
+
+    Returns:
+        Dict[str, Any]: Sizes in bytes of 'messages' (all threads), 'tool_outputs', 'image_ai' and
+                        'filtered_messages', their 'total', and the 'threads' and 'message_count' counts.
+    """
+    global session_memory_logged
+    now = monotonic()
+    last = st.session_state.get('memory_report')
+    if last is not None and now - last[0] < SESSION_MEMORY_SAMPLE_INTERVAL:
+        return last[1]
+    messages = st.session_state.get('messages', {})
+    report = {
+        key: approximate_size(st.session_state.get(key))
+        for key in ('messages', 'tool_outputs', 'image_ai', 'filtered_messages')
+    }
+    report['total'] = sum(report.values())
+    report['threads'] = len(messages)
+    report['message_count'] = sum(len(thread) for thread in messages.values())
+    st.session_state.memory_report = (now, report)
+    with session_memory_lock:
+        session_memory[st.session_state.session_id] = {**report, 'updated': now}
+        for session_id in [key for key, value in session_memory.items() if now - value['updated'] > SESSION_MEMORY_TTL]:
+            del session_memory[session_id]
+        log = now - session_memory_logged >= SESSION_MEMORY_LOG_INTERVAL
+        if log:
+            session_memory_logged = now
+    if log:
+        stats = session_memory_stats()
+        largest = stats[0]
+        print(
+            f"Session memory: {len(stats)} sessions, {sum(row['total'] for row in stats) / 1024 / 1024:.1f} MB; "
+            f"largest {largest['session_id']}: {largest['total'] / 1024 / 1024:.1f} MB, "
+            f"{largest['threads']} threads, {largest['message_count']} messages"
+        )
+    return report
+
+
+def session_memory_stats() -> List[Dict[str, Any]]:
+    """
+    Reports the memory of the sessions active in the last SESSION_MEMORY_TTL seconds, largest first.
+
+    Returns:
+        List[Dict[str, Any]]: Per session: 'session_id', 'age' in seconds since the last report, and the
+                              sizes of `report_session_memory`.
+    """
+    now = monotonic()
+    with session_memory_lock:
+        report = [
+            {'session_id': session_id, 'age': now - value['updated'], **{key: item for key, item in value.items() if key != 'updated'}}
+            for session_id, value in session_memory.items()
+        ]
+    return sorted(report, key=lambda row: -row['total'])
+
+
 # NOT USED CURERNTLY, wait for stui to be functional again
 def reset_memory(sys_ragbot) -> None:
     """
@@ -232,6 +541,7 @@ def reset_memory(sys_ragbot) -> None:
         None: The function performs operations on the session state without raising exceptions.
     """
     st.session_state.messages[st.session_state.thread_id] = [{'role': 'system', 'content': sys_ragbot}]
+    st.session_state.history.pop(st.session_state.thread_id, None)
     st.session_state.filtered_messages = ""
 
 
@@ -0,0 +1,498 @@
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from os import getenv
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from krembot_auxiliary import connect_to_pinecone
+
+
+class DescriptionStore:
+    """
+    A local store of product descriptions mirrored from the Pinecone "opisi" namespace.
+
+    Descriptions are persisted in a small SQLite file keyed by oldProductId (sec_id) and served from an
+    in-memory dictionary, so recommendation turns can look up many descriptions at once without a network
+    call. Pinecone is only contacted for ids that are not yet in the store.
+    """
+
+    missing_description = 'Nemamo opis za ovaj artikal.'
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        namespace: str = "opisi",
+        batch_size: int = 100
+    ) -> None:
+        """
+        Initializes the DescriptionStore and loads all stored descriptions into memory.
+
+        Args:
+            path (Optional[str], optional): Path of the SQLite file. Defaults to the 'DESCRIPTION_STORE_PATH'
+                                            environment variable or 'descriptions.sqlite3'.
+            namespace (str, optional): The Pinecone namespace holding the descriptions. Defaults to "opisi".
+            batch_size (int, optional): Number of ids per Pinecone fetch request. Defaults to 100.
+        """
+        self.path = path or getenv("DESCRIPTION_STORE_PATH", "descriptions.sqlite3")
+        self.namespace = namespace
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._index = None
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS descriptions (
+            product_id TEXT PRIMARY KEY,
+            description TEXT NOT NULL,
+            synced_at REAL NOT NULL
+        )
+        ''')
+        self._conn.commit()
+        self._descriptions: Dict[str, str] = dict(
+            self._conn.execute("SELECT product_id, description FROM descriptions")
+        )
+
+    @property
+    def index(self) -> Any:
+        """
+        Returns the Pinecone index, connecting on first use.
+
+        Returns:
+            Any: The Pinecone index holding the description vectors.
+        """
+        if self._index is None:
+            self._index = connect_to_pinecone(x=0)
+        return self._index
+
+    def __len__(self) -> int:
+        return len(self._descriptions)
+
+    def put_many(self, descriptions: Dict[str, str]) -> None:
+        """
+        Stores descriptions in memory and persists them to the SQLite file.
+
+        Args:
+            descriptions (Dict[str, str]): A mapping of product id to description text.
+        """
+        now = time.time()
+        rows = [
+            (str(product_id), text, now) for product_id, text in descriptions.items()
+            if self._descriptions.get(str(product_id)) != text
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO descriptions (product_id, description, synced_at) VALUES (?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            self._descriptions.update({product_id: text for product_id, text, _ in rows})
+
+    def _fetch_from_pinecone(self, ids: List[str]) -> Dict[str, str]:
+        """
+        Fetches descriptions for the given vector ids from Pinecone in batches.
+
+        Args:
+            ids (List[str]): Vector ids to fetch.
+
+        Returns:
+            Dict[str, str]: A mapping of product id to description text for every id found in Pinecone.
+                            Descriptions are keyed both by vector id and by the 'sec_id' metadata field.
+        """
+        fetched = {}
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            results = self.index.fetch(ids=batch, namespace=self.namespace)
+            for vector_id, vector_data in results['vectors'].items():
+                metadata = vector_data.get('metadata') or {}
+                text = metadata.get('text')
+                if text is None:
+                    continue
+                fetched[str(vector_id)] = text
+                if 'sec_id' in metadata:
+                    fetched[str(int(metadata['sec_id']))] = text
+        return fetched
+
+    def get_many(self, ids: Iterable[Any]) -> Dict[str, str]:
+        """
+        Returns descriptions for the given product ids, fetching only the missing ones from Pinecone.
+
+        Args:
+            ids (Iterable[Any]): Product ids (oldProductId / sec_id) to look up.
+
+        Returns:
+            Dict[str, str]: A mapping of every requested id (as a string) to its description. Ids without a
+                            description map to `missing_description`.
+        """
+        ids = [str(product_id) for product_id in ids]
+        misses = [product_id for product_id in dict.fromkeys(ids) if product_id not in self._descriptions]
+        if misses:
+            try:
+                self.put_many(self._fetch_from_pinecone(misses))
+            except Exception as e:
+                print(f"Error fetching descriptions from Pinecone: {e}")
+        return {product_id: self._descriptions.get(product_id, self.missing_description) for product_id in ids}
+
+    def sync(self) -> int:
+        """
+        Bulk-copies every description from the Pinecone namespace into the local store.
+
+        Returns:
+            int: The number of descriptions written to the store.
+        """
+        written = 0
+        for ids in self.index.list(namespace=self.namespace):
+            fetched = self._fetch_from_pinecone(list(ids))
+            self.put_many(fetched)
+            written += len(fetched)
+        print(f"Synced {written} descriptions from namespace '{self.namespace}'.")
+        return written
+
+
+class SingleFlight:
+    """
+    Collapses identical concurrent calls into one.
+
+    While a call for a key is running, every other caller asking for the same key waits for it and gets the
+    same result (or exception) instead of issuing its own upstream request. Nothing is cached once the call
+    has finished.
+    """
+
+    def __init__(self, name: str) -> None:
+        """
+        Initializes the SingleFlight group.
+
+        Args:
+            name (str): The group name used in stats.
+        """
+        self.name = name
+        self.calls = 0
+        self.collapsed = 0
+        self._in_flight: Dict[Any, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Any, fn: Callable[[], Any]) -> Any:
+        """
+        Runs fn, unless a call with the same key is already running, in which case its result is shared.
+
+        Args:
+            key (Any): A hashable key identifying identical calls.
+            fn (Callable[[], Any]): The upstream call.
+
+        Returns:
+            Any: The result of fn. Exceptions raised by fn are propagated to every caller sharing the call.
+        """
+        with self._lock:
+            self.calls += 1
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+            else:
+                self.collapsed += 1
+        if not owner:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Reports how many calls were made and how many of them were collapsed into another call.
+        """
+        return {'calls': self.calls, 'collapsed': self.collapsed}
+
+
+single_flights: Dict[str, SingleFlight] = {}
+single_flights_lock = threading.Lock()
+
+
+def single_flight(name: str) -> SingleFlight:
+    """
+    Returns the process-wide SingleFlight group with the given name.
+
+    Args:
+        name (str): The group name, e.g. "products" or "embeddings".
+
+    Returns:
+        SingleFlight: The shared group.
+    """
+    with single_flights_lock:
+        if name not in single_flights:
+            single_flights[name] = SingleFlight(name)
+        return single_flights[name]
+
+
+def single_flight_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Reports calls and collapsed duplicate calls for every SingleFlight group.
+
+    Returns:
+        Dict[str, Dict[str, int]]: Per group name: 'calls' and 'collapsed'.
+    """
+    with single_flights_lock:
+        return {name: flight.stats() for name, flight in single_flights.items()}
+
+
+class ProductInfoCache:
+    """
+    An in-memory cache of product API results with separate freshness rules per kind of field.
+
+    Fields are grouped by how quickly they change: 'static' (url, id) rarely changes, 'price' (prices and
+    actions) changes a few times a day, and 'stock' (lager) can change at any moment. Whether a product is
+    returned at all depends on its stock (products out of stock are cached as an empty dictionary), so every
+    cached product is served only while its stock is younger than the stock TTL, whichever groups the caller
+    asks for; the requested groups add their own TTLs and are counted in the per-group metrics. Products whose
+    stock is about to expire are refreshed in the background while the cached value is still served
+    (refresh-ahead): one worker fetches all products due for a refresh together, and a product already being
+    refreshed is not queued again.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[List[Any]], Dict[Any, Dict[str, Any]]],
+        max_entries: Optional[int] = None,
+        ttl: Optional[Dict[str, float]] = None,
+        refresh_ahead: Optional[float] = None
+    ) -> None:
+        """
+        Initializes the ProductInfoCache.
+
+        Args:
+            fetch (Callable[[List[Any]], Dict[Any, Dict[str, Any]]]): Fetches product info for a list of ids.
+                Ids whose request failed must be left out of the result.
+            max_entries (Optional[int], optional): Maximum number of cached products. Defaults to the
+                                                   'PRODUCT_CACHE_MAX_ENTRIES' environment variable or 5000.
+            ttl (Optional[Dict[str, float]], optional): TTL in seconds per field group. Defaults to the
+                'PRODUCT_CACHE_TTL_<GROUP>' environment variables or 1 day (static), 15 minutes (price) and
+                2 minutes (stock).
+            refresh_ahead (Optional[float], optional): Fraction of the stock TTL after which a served product is
+                refreshed in the background, 0 to disable. Defaults to the 'PRODUCT_CACHE_REFRESH_AHEAD'
+                environment variable or 0.75.
+        """
+        self.fetch = fetch
+        self.max_entries = max_entries or int(getenv("PRODUCT_CACHE_MAX_ENTRIES", "5000"))
+        self.ttl = ttl or {
+            group: float(getenv(f"PRODUCT_CACHE_TTL_{group.upper()}", default))
+            for group, default in (('static', 86400), ('price', 900), ('stock', 120))
+        }
+        self.refresh_ahead = float(getenv("PRODUCT_CACHE_REFRESH_AHEAD", "0.75")) if refresh_ahead is None else refresh_ahead
+        self.metrics = {group: {'hits': 0, 'misses': 0, 'max_age_served': 0.0} for group in self.ttl}
+        self._entries: OrderedDict[str, Tuple[Dict[str, Any], float]] = OrderedDict()
+        self._refreshing = set()
+        self._refresh_pending: List[str] = []
+        self._refresh_scheduled = False
+        self._refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="product-refresh")
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put_many(self, products_info: Dict[Any, Dict[str, Any]]) -> None:
+        """
+        Stores freshly fetched product info, evicting the least recently used products above the memory cap.
+
+        Args:
+            products_info (Dict[Any, Dict[str, Any]]): Product info per id. An empty dictionary marks a product
+                                                       that is out of stock.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for product_id, product_info in products_info.items():
+                self._entries[str(product_id)] = (product_info, now)
+                self._entries.move_to_end(str(product_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_many(
+        self,
+        ids: Iterable[Any],
+        groups: Iterable[str] = ('static', 'price', 'stock'),
+        bypass: bool = False
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns product info for the given ids, fetching only products that are missing or stale.
+
+        Args:
+            ids (Iterable[Any]): Product ids (oldProductId / sec_id).
+            groups (Iterable[str], optional): Field groups the caller needs to be fresh, on top of the stock
+                                              that is always checked. Defaults to all groups.
+            bypass (bool, optional): Ignore cached values and always fetch, for order-critical flows.
+                                     Defaults to False.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Product info per id (as a string). Products out of stock map to an empty
+                                       dictionary; ids that could not be fetched are left out.
+        """
+        ids = list(dict.fromkeys(str(product_id) for product_id in ids))
+        groups = tuple(groups)
+        # Stanje odlucuje da li se proizvod uopste vraca, pa njegov TTL vazi za svaki upit
+        max_age = min(self.ttl[group] for group in set(groups) | {'stock'})
+        now = time.monotonic()
+        found, misses, refresh = {}, [], []
+        with self._lock:
+            for product_id in ids:
+                entry = None if bypass else self._entries.get(product_id)
+                age = None if entry is None else now - entry[1]
+                for group in groups:
+                    if age is not None and age < self.ttl[group]:
+                        self.metrics[group]['hits'] += 1
+                        self.metrics[group]['max_age_served'] = max(self.metrics[group]['max_age_served'], age)
+                    else:
+                        self.metrics[group]['misses'] += 1
+                if age is None or age >= max_age:
+                    misses.append(product_id)
+                    continue
+                self._entries.move_to_end(product_id)
+                found[product_id] = entry[0]
+                if (
+                    self.refresh_ahead and age >= self.ttl['stock'] * self.refresh_ahead
+                    and product_id not in self._refreshing
+                ):
+                    self._refreshing.add(product_id)
+                    self._refresh_pending.append(product_id)
+                    refresh.append(product_id)
+            schedule = bool(refresh) and not self._refresh_scheduled
+            if schedule:
+                self._refresh_scheduled = True
+
+        if schedule:
+            self._refresher.submit(self._refresh)
+        if misses:
+            fetched = {str(product_id): product_info for product_id, product_info in self.fetch(misses).items()}
+            self.put_many(fetched)
+            found.update(fetched)
+        return found
+
+    def _refresh(self) -> None:
+        while True:
+            with self._lock:
+                ids, self._refresh_pending = self._refresh_pending, []
+                if not ids:
+                    self._refresh_scheduled = False
+                    return
+            try:
+                self.put_many(self.fetch(ids))
+            except Exception as e:
+                print(f"Error refreshing product info: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.difference_update(ids)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Reports hit rate and staleness per field group.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Per field group: 'ttl', 'hits', 'misses', 'hit_rate' and 'max_age_served'
+                                       (the oldest value served from the cache, in seconds).
+        """
+        with self._lock:
+            return {
+                group: {
+                    'ttl': self.ttl[group],
+                    **metrics,
+                    'hit_rate': metrics['hits'] / max(1, metrics['hits'] + metrics['misses']),
+                }
+                for group, metrics in self.metrics.items()
+            }
+
+
+class OrderStatusCache:
+    """
+    A short-lived cache of order and shipment statuses keyed by order ID (or tracking code).
+
+    Orders in a final state (delivered, cancelled, returned) are kept longer than orders that are still moving,
+    and no value is ever served after the 'ORDER_CACHE_MAX_AGE' freshness limit. Concurrent lookups of the same
+    key share one backend request. Expired values are kept until evicted and handed to the next fetch, so it can
+    reuse whatever did not change.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        is_final: Callable[[Any], Optional[bool]],
+        max_entries: int = 1000
+    ) -> None:
+        """
+        Initializes the OrderStatusCache.
+
+        Args:
+            name (str): The cache name, also used for the SingleFlight group of its lookups.
+            is_final (Callable[[Any], Optional[bool]]): Tells whether a fetched value is in a final state. Returning
+                None means the value must not be cached (e.g. an order that was not found).
+            max_entries (int, optional): Maximum number of cached keys. Defaults to 1000.
+        """
+        self.name = name
+        self.is_final = is_final
+        self.max_entries = max_entries
+        self.max_age = float(getenv("ORDER_CACHE_MAX_AGE", "1800"))
+        self.ttl_final = min(float(getenv("ORDER_CACHE_TTL_FINAL", "1800")), self.max_age)
+        self.ttl_active = min(float(getenv("ORDER_CACHE_TTL_ACTIVE", "60")), self.max_age)
+        self._entries: OrderedDict[str, Tuple[Any, float, float]] = OrderedDict()
+        self._flight = single_flight(name)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Any, fetch: Callable[[Optional[Any]], Any], bypass: bool = False) -> Any:
+        """
+        Returns the cached value for a key, or fetches it if it is missing or expired.
+
+        Args:
+            key (Any): The order ID or tracking code.
+            fetch (Callable[[Optional[Any]], Any]): Fetches a fresh value. It receives the previous (expired) value,
+                                                    or None, so it can skip reprocessing unchanged data.
+            bypass (bool, optional): Always fetch, ignoring the cached value. Defaults to False.
+
+        Returns:
+            Any: The cached or freshly fetched value. Exceptions raised by fetch are propagated to every caller
+                 waiting for the same key.
+        """
+        key = str(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not bypass and time.monotonic() - entry[1] < entry[2]:
+                self._entries.move_to_end(key)
+                return entry[0]
+        return self._flight.do(key, lambda: self._fetch(key, fetch, entry[0] if entry is not None else None))
+
+    def _fetch(self, key: str, fetch: Callable[[Optional[Any]], Any], previous: Optional[Any]) -> Any:
+        value = fetch(previous)
+        final = self.is_final(value)
+        if final is not None:
+            with self._lock:
+                self._entries[key] = (value, time.monotonic(), self.ttl_final if final else self.ttl_active)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+
+@lru_cache(maxsize=1)
+def description_store() -> DescriptionStore:
+    """
+    Returns the process-wide DescriptionStore instance.
+
+    Returns:
+        DescriptionStore: The shared description store.
+    """
+    return DescriptionStore()
+
+
+if __name__ == "__main__":
+    description_store().sync()
@@ -0,0 +1,163 @@
+import gzip
+import json
+import threading
+
+from hashlib import sha256
+from os import getenv
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# First byte of an encoded payload, identifies the compression
+PAYLOAD_FORMATS = {'none': b'j', 'gzip': b'g', 'zstd': b'z'}
+
+
+def prompt_version(content: str) -> str:
+    """
+    Returns the version of a prompt text: a short hash of its content.
+    """
+    return sha256(content.encode('utf-8')).hexdigest()[:16]
+
+
+class ConversationCodec:
+    """
+    Encodes conversations into compact binary payloads for the 'conversations.conversation_data' column.
+
+    System messages are stored as a reference to the prompt name and version instead of the full prompt text,
+    since the same system prompt is repeated in every conversation. The prompt texts themselves are stored
+    once per version through the `store_prompt` callback. The rest of the conversation is compressed with
+    zstd (when the 'zstandard' package is installed) or gzip.
+    """
+
+    def __init__(self, compression: Optional[str] = None, level: Optional[int] = None) -> None:
+        """
+        Initializes the codec.
+
+        Args:
+            compression (Optional[str], optional): 'zstd', 'gzip' or 'none'. Defaults to the 'CONVERSATION_CODEC'
+                                                   environment variable or 'none' (payloads are not used).
+                                                   'zstd' falls back to 'gzip' if 'zstandard' is not installed.
+            level (Optional[int], optional): Compression level. Defaults to 'CONVERSATION_CODEC_LEVEL' or 3 for
+                                             zstd and 6 for gzip.
+        """
+        compression = compression or getenv('CONVERSATION_CODEC', 'none')
+        if compression not in PAYLOAD_FORMATS:
+            raise ValueError(f"Unknown conversation codec: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            print("zstandard is not installed, compressing conversations with gzip.")
+            compression = 'gzip'
+        self.compression = compression
+        default_level = 3 if compression == 'zstd' else 6
+        self.level = level if level is not None else int(getenv('CONVERSATION_CODEC_LEVEL', default_level))
+        self.names: Dict[str, str] = {}
+        self.texts: Dict[Tuple[str, str], str] = {}
+        self._stored = set()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.compression != 'none'
+
+    def register_prompts(self, prompts: Dict[str, str]) -> None:
+        """
+        Registers the current prompts, so system messages using them are referenced by their name.
+
+        System prompts that are not registered are referenced under the name 'system'.
+
+        Args:
+            prompts (Dict[str, str]): Prompt names mapped to prompt texts, e.g. the result of `work_prompts`.
+        """
+        with self._lock:
+            for name, content in prompts.items():
+                version = prompt_version(content)
+                self.names.setdefault(version, name)
+                self.texts[(self.names[version], version)] = content
+
+    def encode(
+        self,
+        messages: List[Dict[str, Any]],
+        store_prompt: Callable[[str, str, str], None]
+    ) -> bytes:
+        """
+        Encodes a conversation.
+
+        Args:
+            messages (List[Dict[str, Any]]): The conversation.
+            store_prompt (Callable[[str, str, str], None]): Stores a prompt text given (name, version, content).
+                                                            Called once per prompt version and process, so
+                                                            the prompt must be committed when it returns.
+
+        Returns:
+            bytes: The payload.
+        """
+        encoded = []
+        for message in messages:
+            content = message.get('content')
+            if message.get('role') == 'system' and isinstance(content, str):
+                version = prompt_version(content)
+                with self._lock:
+                    name = self.names.get(version, 'system')
+                    stored = (name, version) in self._stored
+                if not stored:
+                    store_prompt(name, version, content)
+                    with self._lock:
+                        self._stored.add((name, version))
+                        self.texts[(name, version)] = content
+                message = {key: value for key, value in message.items() if key != 'content'}
+                message['prompt_ref'] = [name, version]
+            encoded.append(message)
+        data = json.dumps(encoded, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if self.compression == 'zstd':
+            data = zstandard.ZstdCompressor(level=self.level).compress(data)
+        elif self.compression == 'gzip':
+            data = gzip.compress(data, compresslevel=self.level)
+        return PAYLOAD_FORMATS[self.compression] + data
+
+    def decode(
+        self,
+        payload: bytes,
+        load_prompt: Callable[[str, str], Optional[str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Decodes a payload produced by `encode`, with any compression setting.
+
+        Args:
+            payload (bytes): The payload.
+            load_prompt (Callable[[str, str], Optional[str]]): Returns the prompt text for (name, version).
+                                                               Called once per prompt version and process.
+
+        Returns:
+            List[Dict[str, Any]]: The conversation.
+        """
+        marker, data = payload[:1], payload[1:]
+        if marker == PAYLOAD_FORMATS['zstd']:
+            if zstandard is None:
+                raise RuntimeError("Conversation is compressed with zstd, but zstandard is not installed.")
+            data = zstandard.ZstdDecompressor().decompress(data)
+        elif marker == PAYLOAD_FORMATS['gzip']:
+            data = gzip.decompress(data)
+        elif marker != PAYLOAD_FORMATS['none']:
+            raise ValueError(f"Unknown conversation payload format: {marker!r}")
+        messages = json.loads(data.decode('utf-8'))
+        for message in messages:
+            reference = message.pop('prompt_ref', None)
+            if reference is None:
+                continue
+            key = tuple(reference)
+            with self._lock:
+                content = self.texts.get(key)
+            if content is None:
+                content = load_prompt(*key)
+                if content is None:
+                    raise KeyError(f"Prompt {key[0]} version {key[1]} not found")
+                with self._lock:
+                    self.texts[key] = content
+            message['content'] = content
+        return messages
+
+
+conversation_codec = ConversationCodec()
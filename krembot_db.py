@@ -1,16 +1,632 @@
-import streamlit as st
+from __future__ import annotations
+
+import atexit
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
 from datetime import datetime
+from functools import lru_cache
+from time import monotonic, sleep
 
 from os import getenv
 
 import json
-import pyodbc
 import os
-from typing import Any, Dict, List, Optional, Tuple
+import sqlite3
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from krembot_codec import ConversationCodec, conversation_codec, prompt_version
+
+
+if TYPE_CHECKING:
+    import pyodbc
+
+# Errors raised by the database drivers of all backends. The pyodbc errors are added by `load_pyodbc` when the MSSQL backend
+# opens its first connection.
+DatabaseError: Tuple[type, ...] = (sqlite3.Error,)
+
+
+def load_pyodbc() -> Any:
+    """
+    Imports pyodbc on first use of the MSSQL backend, so the SQLite backend runs without pyodbc and libodbc.
+
+    Returns:
+        Any: The pyodbc module.
+    """
+    global DatabaseError
+    import pyodbc
+    DatabaseError = (pyodbc.Error, sqlite3.Error)
+    return pyodbc
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of database connections shared by every ConversationDatabase and PromptDatabase block.
+
+    Connections are borrowed on `__enter__` and returned on `__exit__` instead of being opened and closed for
+    every block, so a Streamlit rerun no longer pays for a new login and TLS handshake per query. Connections
+    idle for a while are validated before they are handed out, connections idle for too long are closed
+    (down to the minimum size), and callers wait at most `timeout` seconds for a free connection.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        timeout: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+        validate_after: Optional[float] = None
+    ) -> None:
+        """
+        Initializes the pool and opens the minimum number of connections.
+
+        Args:
+            connect (Callable[[], Any]): Opens a new database connection.
+            min_size (Optional[int], optional): Connections kept open even when idle. Defaults to the
+                                                'DB_POOL_MIN' environment variable or 1.
+            max_size (Optional[int], optional): Maximum open connections. Defaults to 'DB_POOL_MAX' or 10.
+            timeout (Optional[float], optional): Seconds to wait for a free connection. Defaults to
+                                                 'DB_POOL_TIMEOUT' or 10.
+            idle_timeout (Optional[float], optional): Seconds after which an idle connection above the minimum
+                                                      size is closed. Defaults to 'DB_POOL_IDLE_TIMEOUT' or 300.
+            validate_after (Optional[float], optional): Idle seconds after which a connection is checked with
+                                                        'SELECT 1' before use. Defaults to 'DB_POOL_VALIDATE_AFTER'
+                                                        or 30.
+        """
+        self.connect = connect
+        self.min_size = min_size if min_size is not None else int(os.getenv('DB_POOL_MIN', '1'))
+        self.max_size = max_size if max_size is not None else int(os.getenv('DB_POOL_MAX', '10'))
+        self.timeout = timeout if timeout is not None else float(os.getenv('DB_POOL_TIMEOUT', '10'))
+        self.idle_timeout = idle_timeout if idle_timeout is not None else float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300'))
+        self.validate_after = validate_after if validate_after is not None else float(os.getenv('DB_POOL_VALIDATE_AFTER', '30'))
+        self.metrics = {'checkouts': 0, 'waits': 0, 'wait_time': 0.0, 'max_wait': 0.0, 'timeouts': 0, 'opened': 0, 'closed': 0, 'invalid': 0}
+        self._idle: deque = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        for _ in range(self.min_size):
+            self._size += 1
+            self._idle.append((self._open(), monotonic()))
+
+    def _open(self) -> Any:
+        conn = self.connect()
+        with self._cond:
+            self.metrics['opened'] += 1
+        return conn
+
+    def _close(self, conn: Any) -> None:
+        with self._cond:
+            self.metrics['closed'] += 1
+        try:
+            conn.close()
+        except Exception as e:
+            print(f"Error closing pooled connection: {e}")
+
+    @staticmethod
+    def _validate(conn: Any) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1").fetchone()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self) -> Any:
+        """
+        Borrows a connection from the pool, opening a new one if none is idle and the pool is not full.
+
+        Returns:
+            Any: An open database connection. It must be given back with `release`.
+
+        Raises:
+            TimeoutError: If no connection becomes free within `timeout` seconds.
+        """
+        started = monotonic()
+        conn, last_used, waited, expired = None, None, False, []
+        with self._cond:
+            while True:
+                now = monotonic()
+                while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+                    expired.append(self._idle.popleft()[0])
+                    self._size -= 1
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = started + self.timeout - now
+                if remaining <= 0:
+                    self.metrics['timeouts'] += 1
+                    raise TimeoutError(f"No database connection available within {self.timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+            waited_for = monotonic() - started
+            self.metrics['checkouts'] += 1
+            if waited:
+                self.metrics['waits'] += 1
+                self.metrics['wait_time'] += waited_for
+                self.metrics['max_wait'] = max(self.metrics['max_wait'], waited_for)
+        for old in expired:
+            self._close(old)
+
+        try:
+            if conn is not None and monotonic() - last_used > self.validate_after and not self._validate(conn):
+                with self._cond:
+                    self.metrics['invalid'] += 1
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn: Any, discard: bool = False) -> None:
+        """
+        Gives a borrowed connection back to the pool.
+
+        Args:
+            conn (Any): The connection returned by `acquire`.
+            discard (bool, optional): Close the connection instead of reusing it, e.g. after a connection error.
+                                      Defaults to False.
+        """
+        with self._cond:
+            if discard:
+                self._size -= 1
+            else:
+                self._idle.append((conn, monotonic()))
+            self._cond.notify()
+        if discard:
+            self._close(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Reports pool usage and wait metrics.
+
+        Returns:
+            Dict[str, Any]: 'size' (open connections), 'idle', 'in_use', and the counters 'checkouts', 'waits',
+                            'wait_time', 'max_wait', 'timeouts', 'opened', 'closed' and 'invalid'.
+        """
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                **self.metrics,
+            }
+
+
+@lru_cache(maxsize=None)
+def connection_pool(host: str, user: str, password: str, database: str) -> ConnectionPool:
+    """
+    Returns the process-wide connection pool for the given MSSQL connection parameters.
+
+    Args:
+        host (str): The database server host.
+        user (str): The database username.
+        password (str): The database password.
+        database (str): The database name.
+
+    Returns:
+        ConnectionPool: The shared pool.
+    """
+    pyodbc = load_pyodbc()
+    return ConnectionPool(lambda: pyodbc.connect(
+        driver='{ODBC Driver 18 for SQL Server}',
+        server=host,
+        database=database,
+        uid=user,
+        pwd=password,
+        TrustServerCertificate='yes'
+    ))
+
+
+def release_connection(pool: ConnectionPool, conn: Any, exc_type: Optional[type]) -> None:
+    """
+    Returns a connection to its pool at the end of a `with` block.
+
+    Any transaction the block left open (including the implicit one of a read-only block) is rolled back, so
+    idle pooled connections hold no transaction, and connections broken by a database error are closed instead
+    of being reused.
+
+    Args:
+        pool (ConnectionPool): The pool the connection was borrowed from.
+        conn (Any): The connection.
+        exc_type (Optional[type]): The type of the exception that ended the block, if any.
+    """
+    discard = exc_type is not None and issubclass(exc_type, DatabaseError)
+    if not discard:
+        try:
+            conn.rollback()
+        except Exception:
+            discard = True
+    pool.release(conn, discard=discard)
+
+
+class DatabaseBackend(ABC):
+    """
+    The database behind ConversationDatabase and PromptDatabase: how connections are opened and the few
+    statements whose SQL differs between databases. Everything else is plain SQL with '?' parameters and
+    runs unchanged on every backend.
+    """
+
+    name = ''
+    statements: Dict[str, str] = {}
+
+    @abstractmethod
+    def pool(self, host: str, user: str, password: str, database: str) -> ConnectionPool:
+        """
+        Returns the shared connection pool for the given connection parameters.
+        """
+
+    def execute_script(self, cursor: Any, script: str) -> None:
+        """
+        Executes a statement that may contain several SQL statements.
+        """
+        cursor.execute(script)
+
+    def executemany(self, cursor: Any, sql: str, rows: List[Tuple[Any, ...]]) -> None:
+        """
+        Executes a statement once per row, in as few round trips as the driver allows.
+        """
+        cursor.executemany(sql, rows)
+
+
+class MSSQLBackend(DatabaseBackend):
+    """
+    MSSQL Server through pyodbc and 'ODBC Driver 18 for SQL Server'.
+    """
+
+    name = 'mssql'
+    statements = {
+        'create_conversations': '''
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='conversations' AND xtype='U')
+        CREATE TABLE conversations (
+            id INT IDENTITY(1,1) PRIMARY KEY,
+            app_name VARCHAR(255) NOT NULL,
+            date DATE NULL,
+            user_name VARCHAR(255) NOT NULL,
+            thread_id VARCHAR(255) NOT NULL,
+            conversation NVARCHAR(MAX) NOT NULL
+        )
+        ''',
+        'migrate_schema': '''
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='conversations_duplicates' AND xtype='U')
+        CREATE TABLE conversations_duplicates (
+            id INT NOT NULL PRIMARY KEY,
+            app_name VARCHAR(255) NOT NULL,
+            date DATE NULL,
+            user_name VARCHAR(255) NOT NULL,
+            thread_id VARCHAR(255) NOT NULL,
+            conversation NVARCHAR(MAX) NOT NULL,
+            archived_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+        );
+
+        IF NOT EXISTS (
+            SELECT * FROM sys.indexes
+            WHERE name = 'UX_conversations_app_user_thread' AND object_id = OBJECT_ID('conversations')
+        )
+        BEGIN
+            WITH ranked AS (
+                SELECT id, app_name, date, user_name, thread_id, conversation,
+                    ROW_NUMBER() OVER (PARTITION BY app_name, user_name, thread_id ORDER BY id DESC) AS row_number
+                FROM conversations
+            )
+            DELETE FROM ranked
+            OUTPUT deleted.id, deleted.app_name, deleted.date, deleted.user_name, deleted.thread_id, deleted.conversation
+            INTO conversations_duplicates (id, app_name, date, user_name, thread_id, conversation)
+            WHERE row_number > 1;
+
+            CREATE UNIQUE NONCLUSTERED INDEX UX_conversations_app_user_thread
+            ON conversations (app_name, user_name, thread_id);
+        END
+
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='conversation_messages' AND xtype='U')
+        CREATE TABLE conversation_messages (
+            app_name VARCHAR(255) NOT NULL,
+            user_name VARCHAR(255) NOT NULL,
+            thread_id VARCHAR(255) NOT NULL,
+            seq INT NOT NULL,
+            role VARCHAR(32) NOT NULL,
+            content NVARCHAR(MAX) NOT NULL,
+            is_json BIT NOT NULL DEFAULT 0,
+            CONSTRAINT PK_conversation_messages PRIMARY KEY CLUSTERED (app_name, user_name, thread_id, seq)
+        );
+
+        IF COL_LENGTH('conversations', 'conversation_data') IS NULL
+        ALTER TABLE conversations ADD conversation_data VARBINARY(MAX) NULL;
+
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='conversation_prompts' AND xtype='U')
+        CREATE TABLE conversation_prompts (
+            name VARCHAR(255) NOT NULL,
+            version CHAR(16) NOT NULL,
+            content NVARCHAR(MAX) NOT NULL,
+            CONSTRAINT PK_conversation_prompts PRIMARY KEY (name, version)
+        );
+
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='tool_outputs' AND xtype='U')
+        CREATE TABLE tool_outputs (
+            id INT IDENTITY(1,1) PRIMARY KEY,
+            app_name VARCHAR(255) NOT NULL,
+            user_name VARCHAR(255) NOT NULL,
+            thread_id VARCHAR(255) NOT NULL,
+            date DATE NULL,
+            user_message NVARCHAR(MAX) NULL,
+            tool_output NVARCHAR(MAX) NULL
+        );
+        ''',
+        'upsert_conversation': '''
+        MERGE conversations WITH (HOLDLOCK) AS target
+        USING (SELECT ? AS app_name, ? AS user_name, ? AS thread_id, ? AS conversation, ? AS conversation_data, ? AS date) AS source
+        ON target.app_name = source.app_name AND target.user_name = source.user_name AND target.thread_id = source.thread_id
+        WHEN MATCHED THEN
+            UPDATE SET conversation = source.conversation, conversation_data = source.conversation_data
+        WHEN NOT MATCHED THEN
+            INSERT (app_name, date, user_name, thread_id, conversation, conversation_data)
+            VALUES (source.app_name, source.date, source.user_name, source.thread_id, source.conversation, source.conversation_data);
+        ''',
+        'insert_thread_header': '''
+        MERGE conversations WITH (HOLDLOCK) AS target
+        USING (SELECT ? AS app_name, ? AS user_name, ? AS thread_id, ? AS date) AS source
+        ON target.app_name = source.app_name AND target.user_name = source.user_name AND target.thread_id = source.thread_id
+        WHEN NOT MATCHED THEN
+            INSERT (app_name, date, user_name, thread_id, conversation)
+            VALUES (source.app_name, source.date, source.user_name, source.thread_id, '[]');
+        ''',
+        'store_prompt': '''
+        MERGE conversation_prompts WITH (HOLDLOCK) AS target
+        USING (SELECT ? AS name, ? AS version, ? AS content) AS source
+        ON target.name = source.name AND target.version = source.version
+        WHEN NOT MATCHED THEN
+            INSERT (name, version, content) VALUES (source.name, source.version, source.content);
+        ''',
+        'recent_threads': "SELECT TOP (?) app_name, user_name, thread_id FROM conversations ORDER BY id DESC",
+        # SQL expression for the version stamp of a PromptStrings row
+        'prompt_version': "CONVERT(VARCHAR(64), HASHBYTES('SHA2_256', PromptString), 2)",
+        'message_page': '''
+        SELECT seq, role, content, is_json FROM conversation_messages
+        WHERE app_name = ? AND user_name = ? AND thread_id = ? AND seq >= ? AND seq < ?
+        ORDER BY seq DESC
+        OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
+        ''',
+    }
+
+    def pool(self, host: str, user: str, password: str, database: str) -> ConnectionPool:
+        return connection_pool(host, user, password, database)
+
+    def executemany(self, cursor: Any, sql: str, rows: List[Tuple[Any, ...]]) -> None:
+        # Sends all rows in one round trip instead of one per row
+        cursor.fast_executemany = True
+        cursor.executemany(sql, rows)
+
+
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL,
+    date TEXT NULL,
+    user_name TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    conversation TEXT NOT NULL,
+    conversation_data BLOB NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS UX_conversations_app_user_thread ON conversations (app_name, user_name, thread_id);
+
+CREATE TABLE IF NOT EXISTS conversations_duplicates (
+    id INTEGER PRIMARY KEY,
+    app_name TEXT NOT NULL,
+    date TEXT NULL,
+    user_name TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    conversation TEXT NOT NULL,
+    archived_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS conversation_messages (
+    app_name TEXT NOT NULL,
+    user_name TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    is_json INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (app_name, user_name, thread_id, seq)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS conversation_prompts (
+    name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (name, version)
+);
+
+CREATE TABLE IF NOT EXISTS tool_outputs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL,
+    user_name TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    date TEXT NULL,
+    user_message TEXT NULL,
+    tool_output TEXT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT,
+    date TEXT,
+    previous_question TEXT,
+    tool_answer TEXT,
+    given_answer TEXT,
+    Thumbs TEXT,
+    Feedback_text TEXT,
+    thread_id TEXT
+);
+
+CREATE TABLE IF NOT EXISTS chatbot_token_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_id TEXT,
+    embedding_tokens INTEGER,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    stt_tokens INTEGER,
+    tts_tokens INTEGER,
+    model_name TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS Users (
+    UserID INTEGER PRIMARY KEY AUTOINCREMENT,
+    Username TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS PromptVariables (
+    VariableID INTEGER PRIMARY KEY AUTOINCREMENT,
+    VariableName TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS PythonFiles (
+    FileID INTEGER PRIMARY KEY AUTOINCREMENT,
+    Filename TEXT NOT NULL,
+    FilePath TEXT
+);
+
+CREATE TABLE IF NOT EXISTS PromptStrings (
+    PromptID INTEGER PRIMARY KEY AUTOINCREMENT,
+    PromptString TEXT,
+    PromptName TEXT NOT NULL,
+    Comment TEXT,
+    UserID INTEGER REFERENCES Users (UserID),
+    VariableID INTEGER REFERENCES PromptVariables (VariableID),
+    VariableFileID INTEGER REFERENCES PythonFiles (FileID)
+);
+CREATE INDEX IF NOT EXISTS IX_PromptStrings_PromptName ON PromptStrings (PromptName);
+
+CREATE TABLE IF NOT EXISTS CentralRelationshipTable (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    PromptID INTEGER REFERENCES PromptStrings (PromptID),
+    UserID INTEGER REFERENCES Users (UserID),
+    VariableID INTEGER REFERENCES PromptVariables (VariableID),
+    FileID INTEGER REFERENCES PythonFiles (FileID)
+);
+
+CREATE TABLE IF NOT EXISTS prompts (
+    prompt_name TEXT PRIMARY KEY,
+    prompt_text TEXT,
+    comment TEXT
+);
+'''
+
+
+@lru_cache(maxsize=None)
+def sqlite_pool(path: str) -> ConnectionPool:
+    """
+    Returns the process-wide connection pool for a SQLite database file, creating the schema if needed.
+
+    Connections run in WAL mode, so readers do not block the writer, and keep a cache of prepared statements,
+    so the statements of a turn are compiled once per connection. The 'prompt_version' SQL function returns
+    the version stamp of a prompt text.
+
+    Args:
+        path (str): The database file.
+
+    Returns:
+        ConnectionPool: The shared pool.
+    """
+    def connect() -> sqlite3.Connection:
+        conn = sqlite3.connect(path, timeout=30, check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.create_function('prompt_version', 1, lambda text: None if text is None else prompt_version(text), deterministic=True)
+        conn.executescript(SQLITE_SCHEMA)
+        return conn
+
+    return ConnectionPool(connect)
+
+
+class SQLiteBackend(DatabaseBackend):
+    """
+    A local SQLite file, for tests, benchmarks and single-box deployments without MSSQL.
+    """
+
+    name = 'sqlite'
+    statements = {
+        'create_conversations': SQLITE_SCHEMA,
+        'migrate_schema': SQLITE_SCHEMA,
+        'upsert_conversation': '''
+        INSERT INTO conversations (app_name, user_name, thread_id, conversation, conversation_data, date)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (app_name, user_name, thread_id) DO UPDATE
+        SET conversation = excluded.conversation, conversation_data = excluded.conversation_data
+        ''',
+        'insert_thread_header': '''
+        INSERT INTO conversations (app_name, user_name, thread_id, date, conversation)
+        VALUES (?, ?, ?, ?, '[]')
+        ON CONFLICT (app_name, user_name, thread_id) DO NOTHING
+        ''',
+        'store_prompt': '''
+        INSERT INTO conversation_prompts (name, version, content)
+        VALUES (?, ?, ?)
+        ON CONFLICT (name, version) DO NOTHING
+        ''',
+        'recent_threads': "SELECT app_name, user_name, thread_id FROM conversations ORDER BY id DESC LIMIT ?",
+        'prompt_version': "prompt_version(PromptString)",
+        'message_page': '''
+        SELECT seq, role, content, is_json FROM conversation_messages
+        WHERE app_name = ? AND user_name = ? AND thread_id = ? AND seq >= ? AND seq < ?
+        ORDER BY seq DESC
+        LIMIT ?
+        ''',
+    }
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """
+        Initializes the backend.
+
+        Args:
+            path (Optional[str], optional): The database file. Defaults to the 'SQLITE_PATH' environment
+                                            variable or 'krembot.db'.
+        """
+        self.path = path or os.getenv('SQLITE_PATH', 'krembot.db')
+
+    def pool(self, host: str, user: str, password: str, database: str) -> ConnectionPool:
+        return sqlite_pool(self.path)
+
+    def execute_script(self, cursor: Any, script: str) -> None:
+        cursor.executescript(script)
+
+
+@lru_cache(maxsize=None)
+def database_backend(name: Optional[str] = None) -> DatabaseBackend:
+    """
+    Returns the database backend selected by name or by the 'DB_BACKEND' environment variable.
+
+    Args:
+        name (Optional[str], optional): 'mssql' or 'sqlite'. Defaults to 'DB_BACKEND' or 'mssql'.
+
+    Returns:
+        DatabaseBackend: The backend.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    name = name or os.getenv('DB_BACKEND', 'mssql')
+    if name == 'mssql':
+        return MSSQLBackend()
+    if name == 'sqlite':
+        return SQLiteBackend()
+    raise ValueError(f"Unknown database backend: {name}")
+
+
 
 class ConversationDatabase:
     """
-    A class to interact with a MSSQL database for storing and retrieving conversation data.
+    A class to interact with the conversation database (MSSQL, or SQLite with 'DB_BACKEND=sqlite') for storing and
+    retrieving conversation data.
 
     This class provides methods to create tables, insert, update, query, and delete conversation records.
     It also handles logging of token usage and user feedback. The class is designed to be used as a
@@ -22,7 +638,9 @@ class ConversationDatabase:
         host: Optional[str] = None,
         user: Optional[str] = None,
         password: Optional[str] = None,
-        database: Optional[str] = None
+        database: Optional[str] = None,
+        storage: Optional[str] = None,
+        backend: Optional[DatabaseBackend] = None
     ) -> None:
         """
         Initializes the ConversationDatabase with database connection parameters.
@@ -38,17 +656,26 @@ class ConversationDatabase:
             user (Optional[str], optional): The database username. Defaults to environment variable 'MSSQL_USER'.
             password (Optional[str], optional): The database password. Defaults to environment variable 'MSSQL_PASS'.
             database (Optional[str], optional): The database name. Defaults to environment variable 'MSSQL_DB'.
+            storage (Optional[str], optional): How conversations are stored: 'blob' (the whole conversation as one
+                                               JSON value in 'conversations') or 'messages' (one row per message in
+                                               'conversation_messages'). Defaults to environment variable
+                                               'CONVERSATION_STORAGE' or 'blob'.
+            backend (Optional[DatabaseBackend], optional): The database backend. Defaults to the backend selected
+                                                           by the 'DB_BACKEND' environment variable (MSSQL).
         """
         self.host: str = host if host is not None else os.getenv('MSSQL_HOST')
         self.user: str = user if user is not None else os.getenv('MSSQL_USER')
         self.password: str = password if password is not None else os.getenv('MSSQL_PASS')
         self.database: str = database if database is not None else os.getenv('MSSQL_DB')
+        self.storage: str = storage if storage is not None else os.getenv('CONVERSATION_STORAGE', 'blob')
+        self.backend: DatabaseBackend = backend if backend is not None else database_backend()
+        self.pool: Optional[ConnectionPool] = None
         self.conn: Optional[pyodbc.Connection] = None
         self.cursor: Optional[pyodbc.Cursor] = None
 
     def __enter__(self) -> 'ConversationDatabase':
         """
-        Establishes a connection to the MSSQL database and initializes a cursor.
+        Borrows a connection from the shared connection pool of the backend and initializes a cursor.
 
         This method is called when entering the context of the `with` statement.
 
@@ -59,14 +686,8 @@ class ConversationDatabase:
             Exception: If there is an error connecting to the database.
         """
         try:
-            self.conn = pyodbc.connect(
-                driver='{ODBC Driver 18 for SQL Server}',
-                server=self.host,
-                database=self.database,
-                uid=self.user,
-                pwd=self.password,
-                TrustServerCertificate='yes'
-            )
+            self.pool = self.backend.pool(self.host, self.user, self.password, self.database)
+            self.conn = self.pool.acquire()
             self.cursor = self.conn.cursor()
         except Exception as e:
             print(f"Error connecting to the database: {e}")
@@ -80,7 +701,7 @@ class ConversationDatabase:
         exc_tb: Optional[Any]
     ) -> None:
         """
-        Closes the database cursor and connection upon exiting the context.
+        Closes the database cursor and returns the connection to the pool upon exiting the context.
 
         This method is called when exiting the context of the `with` statement, regardless of whether
         an exception occurred.
@@ -95,8 +716,10 @@ class ConversationDatabase:
         """
         if self.cursor is not None:
             self.cursor.close()
+            self.cursor = None
         if self.conn is not None:
-            self.conn.close()
+            release_connection(self.pool, self.conn, exc_type)
+            self.conn = None
         if exc_type or exc_val or exc_tb:
             print(f"Exception occurred: {exc_type}, {exc_val}")
 
@@ -113,22 +736,43 @@ class ConversationDatabase:
         Raises:
             Exception: If there is an error executing the SQL statement.
         """
-        check_table_sql = '''
-        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='conversations' AND xtype='U')
-        CREATE TABLE conversations (
-            id INT IDENTITY(1,1) PRIMARY KEY,
-            app_name VARCHAR(255) NOT NULL,
-            user_name VARCHAR(255) NOT NULL,
-            thread_id VARCHAR(255) NOT NULL,
-            conversation NVARCHAR(MAX) NOT NULL
-        )
-        '''
         try:
-            self.cursor.execute(check_table_sql)
+            self.backend.execute_script(self.cursor, self.backend.statements['create_conversations'])
             self.conn.commit()
         except Exception as e:
             print(f"Error creating table: {e}")
             raise
+        self.migrate_schema()
+
+    def migrate_schema(self) -> int:
+        """
+        Adds the unique index on (app_name, user_name, thread_id) to the 'conversations' table and creates the
+        'conversation_messages' table used by the 'messages' storage mode, the 'conversation_data' column and
+        'conversation_prompts' table used by compressed payloads, and the 'tool_outputs' table.
+
+        The index makes every lookup by thread (query, upsert, delete) and `list_threads` an index seek, and
+        guarantees one row per thread. Duplicate rows left by the old check-then-insert upsert are moved to the
+        'conversations_duplicates' table first, keeping the most recent row of each thread in 'conversations',
+        and the number of archived rows is reported. Messages are clustered by thread and sequence number, so
+        reading a thread is a single range scan. Running the migration again is a no-op.
+
+        Returns:
+            int: The number of duplicate rows in 'conversations_duplicates'.
+
+        Raises:
+            Exception: If there is an error executing the SQL statements.
+        """
+        try:
+            self.backend.execute_script(self.cursor, self.backend.statements['migrate_schema'])
+            self.conn.commit()
+            archived = self.cursor.execute("SELECT COUNT(*) FROM conversations_duplicates").fetchone()[0]
+        except Exception as e:
+            print(f"Error migrating schema: {e}")
+            self.conn.rollback()
+            raise
+        if archived:
+            print(f"{archived} duplicate conversation rows are archived in 'conversations_duplicates'; the newest row of each thread is kept in 'conversations'.")
+        return archived
 
     def update_sql_record(
         self,
@@ -158,7 +802,7 @@ class ConversationDatabase:
         new_conversation_json = json.dumps(new_conversation)
         update_sql = '''
         UPDATE conversations
-        SET conversation = ?
+        SET conversation = ?, conversation_data = NULL
         WHERE app_name = ? AND user_name = ? AND thread_id = ?
         '''
         try:
@@ -167,7 +811,7 @@ class ConversationDatabase:
             affected_rows = self.cursor.rowcount
             if affected_rows == 0:
                 print("No rows were updated. Please check if the record exists.")
-        except pyodbc.Error as e:
+        except DatabaseError as e:
             print(f"Error updating record: {e}")
             self.conn.rollback()
 
@@ -229,7 +873,7 @@ class ConversationDatabase:
         try:
             self.cursor.execute(insert_sql, (app_name, current_date, user_name, thread_id, conversation_json))
             self.conn.commit()
-        except pyodbc.Error as e:
+        except DatabaseError as e:
             print(f"Error adding record: {e}")
             self.conn.rollback()
 
@@ -238,24 +882,292 @@ class ConversationDatabase:
             app_name: str,
             user_name: str,
             thread_id: str,
-            new_conversation: List[Dict[str, Any]]
+            new_conversation: List[Dict[str, Any]],
+            offset: int = 0,
+            head: int = 0,
+            raise_errors: bool = False
         ) -> None:
         """
         Updates an existing conversation record or inserts a new one if it does not exist.
 
+        The upsert is a single MERGE statement, so it takes one round trip and two sessions saving the same
+        thread at the same time cannot both insert it. In the 'messages' storage mode only the messages that
+        are not stored yet are inserted (see `append_messages`). When a conversation codec is configured
+        ('CONVERSATION_CODEC'), the conversation is stored as a compressed payload in 'conversation_data'.
+
         Args:
             app_name (str): The name of the application.
             user_name (str): The name of the user.
             thread_id (str): The thread identifier.
             new_conversation (List[Dict[str, Any]]): The conversation data as a list of dictionaries.
+            offset (int, optional): Stored messages missing from a partially loaded conversation, see
+                                    `append_messages`. Only supported in the 'messages' storage mode. Defaults to 0.
+            head (int, optional): Leading messages of a partially loaded conversation. Defaults to 0.
+            raise_errors (bool, optional): Re-raise database errors after the rollback instead of only printing
+                                           them, so the caller can retry the write. Defaults to False.
 
         Returns:
             None
         """
-        if self.record_exists(app_name, user_name, thread_id):
-            self.update_sql_record(app_name, user_name, thread_id, new_conversation)
-        else:
-            self.add_sql_record(app_name, user_name, thread_id, new_conversation)
+        if self.storage == 'messages':
+            self.append_messages(app_name, user_name, thread_id, new_conversation, offset, head, raise_errors)
+            return
+        if offset:
+            raise ValueError("Partially loaded conversations can only be stored in the 'messages' storage mode.")
+        try:
+            if conversation_codec.enabled:
+                conversation, payload = '', conversation_codec.encode(new_conversation, self.store_prompt)
+            else:
+                conversation, payload = json.dumps(new_conversation), None
+            values = (app_name, user_name, thread_id, conversation, payload, datetime.now().date())
+            self.cursor.execute(self.backend.statements['upsert_conversation'], values)
+            self.conn.commit()
+        except DatabaseError as e:
+            print(f"Error upserting record: {e}")
+            self.conn.rollback()
+            if raise_errors:
+                raise
+
+    def store_prompt(self, name: str, version: str, content: str) -> None:
+        """
+        Stores a version of a system prompt referenced by compressed conversations, if it is not stored yet.
+
+        The prompt is committed on its own, before the conversation referencing it is written, because the
+        codec stores every prompt version only once per process: if it were rolled back together with a failed
+        conversation write, later payloads would reference a prompt that is not in the database.
+
+        Args:
+            name (str): The prompt name.
+            version (str): The prompt version (a hash of its content).
+            content (str): The prompt text.
+        """
+        self.cursor.execute(self.backend.statements['store_prompt'], (name, version, content))
+        self.conn.commit()
+
+    def load_prompt(self, name: str, version: str) -> Optional[str]:
+        """
+        Loads a version of a system prompt referenced by compressed conversations.
+
+        Args:
+            name (str): The prompt name.
+            version (str): The prompt version.
+
+        Returns:
+            Optional[str]: The prompt text, or None if it is not stored.
+        """
+        cursor = self.conn.cursor()
+        try:
+            row = cursor.execute(
+                "SELECT content FROM conversation_prompts WHERE name = ? AND version = ?", (name, version)
+            ).fetchone()
+        finally:
+            cursor.close()
+        return row[0] if row else None
+
+    def decode_conversation(self, conversation: str, payload: Optional[bytes]) -> List[Dict[str, Any]]:
+        """
+        Decodes a 'conversations' row: the compressed payload if there is one, otherwise the JSON column.
+
+        Args:
+            conversation (str): The 'conversation' column.
+            payload (Optional[bytes]): The 'conversation_data' column.
+
+        Returns:
+            List[Dict[str, Any]]: The conversation.
+        """
+        if payload is not None:
+            return conversation_codec.decode(bytes(payload), self.load_prompt)
+        return json.loads(conversation) if conversation else []
+
+    @staticmethod
+    def _message_row(message: Dict[str, Any]) -> Tuple[str, str, bool]:
+        content = message.get('content', '')
+        if isinstance(content, str):
+            return message['role'], content, False
+        return message['role'], json.dumps(content), True
+
+    def append_messages(
+        self,
+        app_name: str,
+        user_name: str,
+        thread_id: str,
+        messages: List[Dict[str, Any]],
+        offset: int = 0,
+        head: int = 0,
+        raise_errors: bool = False
+    ) -> None:
+        """
+        Stores a conversation one message per row, inserting only the messages that are not stored yet.
+
+        Conversations only grow between turns, so a turn costs one query for the last stored message and the
+        insert of the new messages instead of rewriting the whole conversation. If the conversation is no longer
+        a continuation of the stored one (it got shorter, or the message at the last stored position differs,
+        e.g. its memory was reset and new turns followed before the save), the stored messages are replaced.
+        New threads also get an empty 'conversations' row, so `list_threads` keeps working.
+
+        A conversation loaded page by page (see `query_sql_record_page`) is passed as its first `head` messages
+        followed by the most recent ones; the `offset` stored messages in between were not loaded and are kept.
+
+        Args:
+            app_name (str): The name of the application.
+            user_name (str): The name of the user.
+            thread_id (str): The thread identifier.
+            messages (List[Dict[str, Any]]): The conversation as a list of dictionaries.
+            offset (int, optional): Stored messages between the head and the rest of `messages`. Defaults to 0.
+            head (int, optional): Number of leading messages in `messages` that precede the gap. Defaults to 0.
+            raise_errors (bool, optional): Re-raise database errors after the rollback. Defaults to False.
+
+        Returns:
+            None
+        """
+        delete_sql = '''
+        DELETE FROM conversation_messages
+        WHERE app_name = ? AND user_name = ? AND thread_id = ?
+        '''
+        insert_sql = '''
+        INSERT INTO conversation_messages (app_name, user_name, thread_id, seq, role, content, is_json)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        '''
+        key = (app_name, user_name, thread_id)
+        try:
+            # Sequence numbers are contiguous from 0, so the last stored message also gives the count
+            last = self.cursor.execute(self.backend.statements['message_page'], (*key, 0, 2 ** 31 - 1, 1)).fetchone()
+            stored = last[0] + 1 if last else 0
+            if stored == 0:
+                self.cursor.execute(self.backend.statements['insert_thread_header'], (*key, datetime.now().date()))
+            elif not offset and (len(messages) < stored or (last[1], last[2], bool(last[3])) != self._message_row(messages[stored - 1])):
+                self.cursor.execute(delete_sql, key)
+                stored = 0
+            rows = [
+                (*key, seq, *self._message_row(message))
+                for seq, message in ((i if i < head else i + offset, message) for i, message in enumerate(messages))
+                if seq >= stored
+            ]
+            if rows:
+                self.backend.executemany(self.cursor, insert_sql, rows)
+            self.conn.commit()
+        except DatabaseError as e:
+            print(f"Error appending messages: {e}")
+            self.conn.rollback()
+            if raise_errors:
+                raise
+
+    def iter_messages(
+        self,
+        app_name: str,
+        user_name: str,
+        thread_id: str
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Streams the messages of a conversation stored in the 'messages' storage mode, ordered by sequence number.
+
+        Args:
+            app_name (str): The name of the application.
+            user_name (str): The name of the user.
+            thread_id (str): The thread identifier.
+
+        Yields:
+            Dict[str, Any]: The messages of the conversation, as they were passed to `append_messages`.
+        """
+        self.cursor.execute('''
+        SELECT role, content, is_json FROM conversation_messages
+        WHERE app_name = ? AND user_name = ? AND thread_id = ?
+        ORDER BY seq
+        ''', (app_name, user_name, thread_id))
+        for role, content, is_json in self.cursor:
+            yield {'role': role, 'content': json.loads(content) if is_json else content}
+
+    def query_sql_record_page(
+        self,
+        app_name: str,
+        user_name: str,
+        thread_id: str,
+        limit: int,
+        before: Optional[int] = None,
+        after: int = 0
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Retrieves one page of a conversation: the last `limit` messages before position `before`.
+
+        In the 'messages' storage mode only the page is read from 'conversation_messages'. Otherwise the whole
+        conversation is read and sliced; threads whose messages are not stored yet are migrated on this read.
+
+        Args:
+            app_name (str): The name of the application.
+            user_name (str): The name of the user.
+            thread_id (str): The thread identifier.
+            limit (int): Maximum number of messages.
+            before (Optional[int], optional): Position of the first message not to return. Defaults to the end
+                                              of the conversation.
+            after (int, optional): Position of the first message that may be returned. Defaults to 0.
+
+        Returns:
+            Tuple[List[Dict[str, Any]], int]: The messages in conversation order and the position of the first one.
+        """
+        end = before if before is not None else 2 ** 31 - 1
+        if self.storage == 'messages':
+            rows = self.cursor.execute(
+                self.backend.statements['message_page'], (app_name, user_name, thread_id, after, end, limit)
+            ).fetchall()
+            if rows or before is not None:
+                messages = [
+                    {'role': role, 'content': json.loads(content) if is_json else content}
+                    for _, role, content, is_json in reversed(rows)
+                ]
+                return messages, rows[-1][0] if rows else min(end, after)
+        conversation = self.query_sql_record(app_name, user_name, thread_id) or []
+        if self.storage == 'messages' and conversation:
+            # Not migrated yet: store the messages, so the positions of later pages and appends are valid
+            self.append_messages(app_name, user_name, thread_id, conversation)
+        end = min(end, len(conversation))
+        start = max(after, end - limit)
+        return conversation[start:end], start
+
+    def migrate_to_messages(self, batch_size: int = 100) -> int:
+        """
+        Copies conversations stored as JSON blobs into 'conversation_messages'.
+
+        Only threads without stored messages are copied, so the migration can be interrupted and run again.
+        The blobs are left in place, so switching back to the 'blob' storage mode shows the conversations as
+        they were at migration time.
+
+        Args:
+            batch_size (int, optional): Number of conversations committed per transaction. Defaults to 100.
+
+        Returns:
+            int: The number of migrated conversations.
+        """
+        self.migrate_schema()
+        pending = self.cursor.execute('''
+        SELECT c.app_name, c.user_name, c.thread_id, c.conversation, c.conversation_data FROM conversations c
+        WHERE NOT EXISTS (
+            SELECT 1 FROM conversation_messages m
+            WHERE m.app_name = c.app_name AND m.user_name = c.user_name AND m.thread_id = c.thread_id
+        )
+        ''').fetchall()
+        insert_sql = '''
+        INSERT INTO conversation_messages (app_name, user_name, thread_id, seq, role, content, is_json)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        '''
+        migrated = 0
+        for app_name, user_name, thread_id, conversation, payload in pending:
+            try:
+                messages = self.decode_conversation(conversation, payload)
+            except (ValueError, KeyError) as e:
+                print(f"Skipping thread {thread_id}, invalid conversation JSON: {e}")
+                continue
+            rows = [
+                (app_name, user_name, thread_id, seq, *self._message_row(message))
+                for seq, message in enumerate(messages)
+            ]
+            if rows:
+                self.backend.executemany(self.cursor, insert_sql, rows)
+                migrated += 1
+                if migrated % batch_size == 0:
+                    self.conn.commit()
+        self.conn.commit()
+        print(f"Migrated {migrated} conversations to conversation_messages.")
+        return migrated
 
     def query_sql_record(
         self,
@@ -266,6 +1178,9 @@ class ConversationDatabase:
         """
         Retrieves a conversation record from the database.
 
+        In the 'messages' storage mode the conversation is read from 'conversation_messages', falling back to
+        the JSON blob for threads that have not been migrated yet. Compressed payloads are decoded transparently.
+
         Args:
             app_name (str): The name of the application.
             user_name (str): The name of the user.
@@ -279,20 +1194,77 @@ class ConversationDatabase:
             Exception: If there is an error executing the SQL statement.
         """
         query_sql = '''
-        SELECT conversation FROM conversations 
+        SELECT conversation, conversation_data FROM conversations 
         WHERE app_name = ? AND user_name = ? AND thread_id = ?
         '''
         try:
+            if self.storage == 'messages':
+                messages = list(self.iter_messages(app_name, user_name, thread_id))
+                if messages:
+                    return messages
             self.cursor.execute(query_sql, (app_name, user_name, thread_id))
             result = self.cursor.fetchone()
             if result:
-                return json.loads(result[0])
+                return self.decode_conversation(result[0], result[1])
             else:
                 return None
         except Exception as e:
             print(f"Error querying record: {e}")
             raise
 
+    def codec_report(self, limit: int = 200) -> Dict[str, float]:
+        """
+        Measures what the conversation codec would save on the most recent conversations.
+
+        Every conversation is read with `query_sql_record`, then encoded and decoded with the configured codec
+        (gzip if none is configured). Both forms are also written over a scratch 'conversations' row with the
+        upsert statement and rolled back, to time the database write; nothing is kept and prompt texts are not
+        stored.
+
+        Args:
+            limit (int, optional): Number of conversations to measure. Defaults to 200.
+
+        Returns:
+            Dict[str, float]: 'rows', average 'json_bytes' and 'payload_bytes', their 'ratio', and average
+                              'read_ms', 'encode_ms', 'decode_ms', 'write_json_ms' and 'write_payload_ms' per
+                              conversation.
+        """
+        codec = ConversationCodec(conversation_codec.compression if conversation_codec.enabled else 'gzip')
+        codec.names.update(conversation_codec.names)
+        threads = self.cursor.execute(
+            self.backend.statements['recent_threads'], (limit,)
+        ).fetchall()
+        totals = {'json_bytes': 0, 'payload_bytes': 0, 'read_ms': 0.0, 'encode_ms': 0.0, 'decode_ms': 0.0, 'write_json_ms': 0.0, 'write_payload_ms': 0.0}
+
+        def timed_write(app_name: str, user_name: str, conversation: str, payload: Optional[bytes]) -> float:
+            values = (app_name, user_name, '__codec_report__', conversation, payload, datetime.now().date())
+            started = monotonic()
+            self.cursor.execute(self.backend.statements['upsert_conversation'], values)
+            written = monotonic()
+            self.conn.rollback()
+            return (written - started) * 1000
+
+        for app_name, user_name, thread_id in threads:
+            started = monotonic()
+            messages = self.query_sql_record(app_name, user_name, thread_id) or []
+            read = monotonic()
+            payload = codec.encode(messages, lambda name, version, content: None)
+            encoded = monotonic()
+            codec.decode(payload, lambda name, version: None)
+            decoded = monotonic()
+            totals['json_bytes'] += len(json.dumps(messages).encode('utf-8'))
+            totals['payload_bytes'] += len(payload)
+            totals['read_ms'] += (read - started) * 1000
+            totals['encode_ms'] += (encoded - read) * 1000
+            totals['decode_ms'] += (decoded - encoded) * 1000
+            totals['write_json_ms'] += timed_write(app_name, user_name, json.dumps(messages), None)
+            totals['write_payload_ms'] += timed_write(app_name, user_name, '', payload)
+        rows = len(threads)
+        report = {'rows': rows, **{key: value / rows if rows else 0.0 for key, value in totals.items()}}
+        report['ratio'] = report['payload_bytes'] / report['json_bytes'] if report['json_bytes'] else 0.0
+        print(f"Conversation codec ({codec.compression}) on {rows} conversations: {report}")
+        return report
+
     def delete_sql_record(
         self,
         app_name: str,
@@ -318,6 +1290,11 @@ class ConversationDatabase:
         WHERE app_name = ? AND user_name = ? AND thread_id = ?
         '''
         try:
+            if self.storage == 'messages':
+                self.cursor.execute('''
+                DELETE FROM conversation_messages
+                WHERE app_name = ? AND user_name = ? AND thread_id = ?
+                ''', (app_name, user_name, thread_id))
             self.cursor.execute(delete_sql, (app_name, user_name, thread_id))
             self.conn.commit()
         except Exception as e:
@@ -342,6 +1319,7 @@ class ConversationDatabase:
         Raises:
             Exception: If there is an error executing the SQL statement.
         """
+        # Seek on UX_conversations_app_user_thread; the index is unique, so DISTINCT costs nothing
         list_threads_sql = '''
         SELECT DISTINCT thread_id FROM conversations
         WHERE app_name = ? AND user_name = ?
@@ -398,6 +1376,33 @@ class ConversationDatabase:
             print(f"Error adding token record: {e}")
             raise
 
+    def add_token_records_openai(self, records: List[Tuple[str, str, int, int, int, int, int]]) -> None:
+        """
+        Inserts several token usage records into the 'chatbot_token_log' table in one batch.
+
+        Args:
+            records (List[Tuple[str, str, int, int, int, int, int]]): Rows of (app_id, model_name,
+                embedding_tokens, prompt_tokens, completion_tokens, stt_tokens, tts_tokens), in the order of the
+                `add_token_record_openai` arguments.
+
+        Returns:
+            None
+
+        Raises:
+            Exception: If there is an error executing the SQL statement.
+        """
+        insert_sql = """
+        INSERT INTO chatbot_token_log (app_id, embedding_tokens, prompt_tokens, completion_tokens, stt_tokens, tts_tokens, model_name)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """
+        rows = [(app_id, *tokens, model_name) for app_id, model_name, *tokens in records]
+        try:
+            self.backend.executemany(self.cursor, insert_sql, rows)
+            self.conn.commit()
+        except Exception as e:
+            print(f"Error adding token records: {e}")
+            raise
+
     def insert_feedback(
         self,
         thread_id: str,
@@ -442,31 +1447,477 @@ class ConversationDatabase:
             print(f"Error inserting feedback into the database: {e}")
             raise
 
+    def insert_feedback_many(self, records: List[Tuple[str, str, str, str, str, str, str]]) -> None:
+        """
+        Inserts several feedback records into the 'Feedback' table in one batch.
+
+        Args:
+            records (List[Tuple[str, str, str, str, str, str, str]]): Rows of (thread_id, app_name,
+                previous_question, tool_answer, given_answer, thumbs, feedback_text), in the order of the
+                `insert_feedback` arguments.
+
+        Returns:
+            None
+
+        Raises:
+            Exception: If there is an error executing the SQL statement.
+        """
+        current_date = datetime.now().date()
+        insert_query = """
+        INSERT INTO Feedback (app_name, date, previous_question, tool_answer, given_answer, Thumbs, Feedback_text, thread_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        rows = [(app_name, current_date, *answers, thread_id) for thread_id, app_name, *answers in records]
+        try:
+            self.backend.executemany(self.cursor, insert_query, rows)
+            self.conn.commit()
+        except Exception as e:
+            print(f"Error inserting feedback into the database: {e}")
+            raise
+
+    def insert_tool_outputs_many(self, records: List[Tuple[str, str, str, str, str]]) -> None:
+        """
+        Inserts tool outputs moved out of the session state into the 'tool_outputs' table in one batch.
+
+        Args:
+            records (List[Tuple[str, str, str, str, str]]): Rows of (app_name, user_name, thread_id, user_message,
+                                                            tool_output).
+
+        Returns:
+            None
+
+        Raises:
+            Exception: If there is an error executing the SQL statement.
+        """
+        current_date = datetime.now().date()
+        insert_query = """
+        INSERT INTO tool_outputs (app_name, user_name, thread_id, date, user_message, tool_output)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """
+        rows = [(app_name, user_name, thread_id, current_date, user_message, tool_output) for app_name, user_name, thread_id, user_message, tool_output in records]
+        try:
+            self.backend.executemany(self.cursor, insert_query, rows)
+            self.conn.commit()
+        except Exception as e:
+            print(f"Error inserting tool outputs into the database: {e}")
+            raise
+
     def close(self) -> None:
         """
-        Closes the database connection if it is open.
+        Returns the database connection to the pool if it is open.
 
-        This method ensures that both the cursor and connection to the database are properly closed,
+        This method ensures that both the cursor and connection to the database are properly released,
         releasing any held resources. It is recommended to call this method when the database interactions
         are complete to prevent potential memory leaks or connection issues.
 
         Returns:
             None
         """
+        if self.cursor is not None:
+            self.cursor.close()
+            self.cursor = None
         if self.conn:
-            self.conn.close()
-            print("Database connection closed.")
+            release_connection(self.pool, self.conn, None)
+            self.conn = None
+            print("Database connection returned to the pool.")
+
+
+# Record types of the WriteBehindQueue and the ConversationDatabase methods inserting them in bulk
+RECORD_WRITERS = {
+    'feedback': 'insert_feedback_many',
+    'tokens': 'add_token_records_openai',
+    'tool_outputs': 'insert_tool_outputs_many',
+}
+
+
+class WriteBehindQueue:
+    """
+    Persists conversations, feedback, token usage and offloaded tool outputs on a background thread instead of
+    the Streamlit script.
+
+    Writers only enqueue and return. Saving the same thread again before a flush replaces the pending
+    conversation, so only its latest state is written; feedback and token records are inserted in batches with
+    `executemany`. The queue is flushed every `flush_interval` seconds, as soon as `batch_size` writes are
+    pending, and at interpreter shutdown. If MSSQL falls behind and `max_pending` writes are waiting, writers
+    block until the queue drains (backpressure) and, after `put_timeout` seconds, write synchronously.
+
+    A flush that cannot reach the database is retried as a whole after `retry_delay` seconds. A conversation
+    or record the database rejects is retried on its own and, after `max_attempts` failures, dropped, logged
+    and kept in `dead_letters`, so it cannot hold back the rest of the queue.
+
+    The durability mode trades latency for safety: 'async' (default) returns immediately, 'flush' waits for
+    the flush containing the write (at most `put_timeout` seconds, then it is written synchronously), 'sync'
+    writes on the caller's thread as before.
+    """
+
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        flush_interval: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        put_timeout: Optional[float] = None,
+        retry_delay: float = 5.0,
+        max_attempts: Optional[int] = None
+    ) -> None:
+        """
+        Initializes the queue. The flush thread starts with the first write.
+
+        Args:
+            mode (Optional[str], optional): Durability mode, 'async', 'flush' or 'sync'. Defaults to the
+                                            'DB_WRITE_MODE' environment variable or 'async'.
+            flush_interval (Optional[float], optional): Maximum seconds a write waits for its flush. Defaults to
+                                                        'DB_WRITE_FLUSH_INTERVAL' or 1.
+            batch_size (Optional[int], optional): Pending writes that trigger an immediate flush. Defaults to
+                                                  'DB_WRITE_BATCH_SIZE' or 100.
+            max_pending (Optional[int], optional): Pending writes at which writers are blocked. Defaults to
+                                                   'DB_WRITE_MAX_PENDING' or 1000.
+            put_timeout (Optional[float], optional): Seconds a blocked writer waits before writing synchronously.
+                                                     Defaults to 'DB_WRITE_PUT_TIMEOUT' or 5.
+            retry_delay (float, optional): Seconds to wait before retrying a flush that could not reach the
+                                           database. Defaults to 5.
+            max_attempts (Optional[int], optional): Failed attempts after which a single conversation or record
+                                                    is dropped and logged. Defaults to 'DB_WRITE_MAX_ATTEMPTS' or 5.
+        """
+        self.mode = mode or os.getenv('DB_WRITE_MODE', 'async')
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.getenv('DB_WRITE_FLUSH_INTERVAL', '1'))
+        self.batch_size = batch_size if batch_size is not None else int(os.getenv('DB_WRITE_BATCH_SIZE', '100'))
+        self.max_pending = max_pending if max_pending is not None else int(os.getenv('DB_WRITE_MAX_PENDING', '1000'))
+        self.put_timeout = put_timeout if put_timeout is not None else float(os.getenv('DB_WRITE_PUT_TIMEOUT', '5'))
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts if max_attempts is not None else int(os.getenv('DB_WRITE_MAX_ATTEMPTS', '5'))
+        self.metrics = {'enqueued': 0, 'coalesced': 0, 'flushes': 0, 'written': 0, 'failures': 0, 'retried': 0, 'dropped': 0, 'blocked': 0, 'sync_fallbacks': 0}
+        self.dead_letters: deque = deque(maxlen=100)
+        self._attempts: Dict[Tuple[str, Any], Tuple[Any, int]] = {}
+        self._conversations: Dict[Tuple[str, str, str], Tuple[List[Dict[str, Any]], int, int]] = {}
+        self._records: Dict[str, List[Tuple[Any, ...]]] = {kind: [] for kind in RECORD_WRITERS}
+        self._generation = 0
+        self._flushed = 0
+        self._flush_requested = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def _pending(self) -> int:
+        return len(self._conversations) + sum(len(records) for records in self._records.values())
+
+    def _put(
+        self,
+        enqueue: Callable[[], None],
+        withdraw: Callable[[], bool],
+        write: Callable[[ConversationDatabase], None]
+    ) -> None:
+        if self.mode == 'sync':
+            with ConversationDatabase() as db:
+                write(db)
+            return
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+                self._thread.start()
+            if self._pending() >= self.max_pending:
+                self.metrics['blocked'] += 1
+                if not self._cond.wait_for(lambda: self._pending() < self.max_pending, self.put_timeout):
+                    self.metrics['sync_fallbacks'] += 1
+                    print("Write-behind queue is full, writing synchronously.")
+                    self._write_now(enqueue, write)
+                    return
+            enqueue()
+            self.metrics['enqueued'] += 1
+            generation = self._generation
+            if self._pending() >= self.batch_size:
+                self._cond.notify_all()
+            if self.mode != 'flush':
+                return
+            self._flush_requested = True
+            self._cond.notify_all()
+            if self._cond.wait_for(lambda: self._flushed > generation, max(self.put_timeout, self.flush_interval)):
+                return
+            # The flush is late (e.g. MSSQL is down): take the write back if it is still queued and write it here
+            if not withdraw():
+                return
+            self.metrics['sync_fallbacks'] += 1
+            print("Write-behind flush timed out, writing synchronously.")
+            self._write_now(enqueue, write)
+
+    def _write_now(self, enqueue: Callable[[], None], write: Callable[[ConversationDatabase], None]) -> None:
+        """
+        Writes on the caller's thread, outside the queue lock. If that fails too, the write goes back on the
+        queue instead of being lost. Must be called holding `_cond`.
+        """
+        self._cond.release()
+        try:
+            with ConversationDatabase() as db:
+                write(db)
+            return
+        except Exception as e:
+            print(f"Error writing synchronously, queueing the write again: {e}")
+        finally:
+            self._cond.acquire()
+        enqueue()
+        self.metrics['enqueued'] += 1
+
+    def save_conversation(
+        self,
+        app_name: str,
+        user_name: str,
+        thread_id: str,
+        messages: List[Dict[str, Any]],
+        offset: int = 0,
+        head: int = 0
+    ) -> None:
+        """
+        Queues the current state of a conversation for `update_or_insert_sql_record`.
+
+        Args:
+            app_name (str): The name of the application.
+            user_name (str): The name of the user.
+            thread_id (str): The thread identifier.
+            messages (List[Dict[str, Any]]): The full conversation. A copy is queued, so the caller can keep
+                                             appending to the list.
+            offset (int, optional): Stored messages missing from a partially loaded conversation. Defaults to 0.
+            head (int, optional): Leading messages of a partially loaded conversation. Defaults to 0.
+        """
+        key = (app_name, user_name, thread_id)
+        conversation = (list(messages), offset, head)
+
+        def enqueue() -> None:
+            if key in self._conversations:
+                self.metrics['coalesced'] += 1
+            self._conversations[key] = conversation
+
+        def withdraw() -> bool:
+            if self._conversations.get(key) is not conversation:
+                return False
+            del self._conversations[key]
+            return True
+
+        self._put(enqueue, withdraw, lambda db: db.update_or_insert_sql_record(*key, *conversation))
+
+    def _put_record(self, kind: str, record: Tuple[Any, ...], write: Callable[[ConversationDatabase], None]) -> None:
+        def withdraw() -> bool:
+            rows = self._records[kind]
+            for i, row in enumerate(rows):
+                if row is record:
+                    del rows[i]
+                    return True
+            return False
+
+        self._put(lambda: self._records[kind].append(record), withdraw, write)
+
+    def add_feedback(
+        self,
+        thread_id: str,
+        app_name: str,
+        previous_question: str,
+        tool_answer: str,
+        given_answer: str,
+        thumbs: str,
+        feedback_text: str
+    ) -> None:
+        """
+        Queues a feedback record for the 'Feedback' table. Takes the arguments of `insert_feedback`.
+        """
+        record = (thread_id, app_name, previous_question, tool_answer, given_answer, thumbs, feedback_text)
+        self._put_record('feedback', record, lambda db: db.insert_feedback(*record))
+
+    def add_token_record(
+        self,
+        app_id: str,
+        model_name: str,
+        embedding_tokens: int,
+        prompt_tokens: int,
+        completion_tokens: int,
+        stt_tokens: int,
+        tts_tokens: int
+    ) -> None:
+        """
+        Queues a token usage record for the 'chatbot_token_log' table. Takes the arguments of
+        `add_token_record_openai`.
+        """
+        record = (app_id, model_name, embedding_tokens, prompt_tokens, completion_tokens, stt_tokens, tts_tokens)
+        self._put_record('tokens', record, lambda db: db.add_token_record_openai(*record))
+
+    def add_tool_output(self, app_name: str, user_name: str, thread_id: str, user_message: str, tool_output: str) -> None:
+        """
+        Queues a tool output moved out of the session state for the 'tool_outputs' table. Takes the arguments
+        of `insert_tool_outputs_many`.
+        """
+        record = (app_name, user_name, thread_id, user_message, tool_output)
+        self._put_record('tool_outputs', record, lambda db: db.insert_tool_outputs_many([record]))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until everything queued so far has been written.
+
+        Args:
+            timeout (Optional[float], optional): Maximum seconds to wait. Defaults to waiting indefinitely.
+
+        Returns:
+            bool: True if the queue was flushed, False on timeout.
+        """
+        with self._cond:
+            if self._thread is None or not self._pending():
+                return True
+            generation = self._generation
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._flushed > generation, timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Reports the queue length and write metrics.
+
+        Returns:
+            Dict[str, Any]: 'pending' writes and the counters 'enqueued', 'coalesced', 'flushes', 'written',
+                            'failures' (flushes that could not reach the database), 'retried' and 'dropped'
+                            (single writes that failed), 'blocked' and 'sync_fallbacks'.
+        """
+        with self._cond:
+            return {'pending': self._pending(), **self.metrics}
 
+    def _write(
+        self,
+        conversations: Dict[Tuple[str, str, str], Tuple[List[Dict[str, Any]], int, int]],
+        records: Dict[str, List[Tuple[Any, ...]]]
+    ) -> List[Tuple[str, Any]]:
+        """
+        Writes a batch: every conversation on its own and every record type with one bulk insert. A bulk insert
+        that fails is split into single rows, so one bad row does not hold back the others. Written items are
+        removed from `conversations` and `records`, so only the failed ones are left in them.
+
+        Returns:
+            List[Tuple[str, Any]]: The writes the database rejected, as ('conversation', key) or
+                                   (record type, row).
+
+        Raises:
+            Exception: If the database cannot be reached. The items not written yet are left in the batch.
+        """
+        failed = []
+        with ConversationDatabase() as db:
+            def rejected(error: Exception) -> None:
+                db.conn.rollback()
+                # A broken connection is an outage, not a bad write: the whole batch is retried later
+                if not ConnectionPool._validate(db.conn):
+                    raise error
+
+            for key, conversation in list(conversations.items()):
+                try:
+                    db.update_or_insert_sql_record(*key, *conversation, raise_errors=True)
+                except Exception as e:
+                    rejected(e)
+                    failed.append(('conversation', key))
+                    continue
+                del conversations[key]
+                self._attempts.pop(('conversation', key), None)
+            for kind, rows in records.items():
+                if not rows:
+                    continue
+                writer = getattr(db, RECORD_WRITERS[kind])
+                try:
+                    writer(rows)
+                    written = list(rows)
+                    rows.clear()
+                except Exception as e:
+                    rejected(e)
+                    written, rejected_rows = [], []
+                    try:
+                        while rows:
+                            try:
+                                writer(rows[:1])
+                                written.append(rows.pop(0))
+                            except Exception as e:
+                                rejected(e)
+                                rejected_rows.append(rows.pop(0))
+                    finally:
+                        rows.extend(rejected_rows)
+                    failed.extend((kind, row) for row in rejected_rows)
+                if self._attempts:
+                    for row in written:
+                        self._attempts.pop(self._attempt_key(kind, row), None)
+        return failed
+
+    @staticmethod
+    def _attempt_key(kind: str, item: Any) -> Tuple[str, Any]:
+        # Conversations are coalesced per thread, while two equal records are two separate writes
+        return (kind, item) if kind == 'conversation' else (kind, id(item))
+
+    def _requeue(self, kind: str, item: Any, conversations: Dict[Tuple[str, str, str], Tuple[List[Dict[str, Any]], int, int]]) -> None:
+        """
+        Puts a failed write back on the queue, or drops and logs it after `max_attempts` failures. Must be
+        called holding `_cond`.
+        """
+        key = self._attempt_key(kind, item)
+        attempts = self._attempts.get(key, (item, 0))[1] + 1
+        if attempts >= self.max_attempts:
+            self._attempts.pop(key, None)
+            self.metrics['dropped'] += 1
+            self.dead_letters.append((kind, item))
+            print(f"Dropping {kind} write after {attempts} failed attempts: {str(item)[:200]}")
+            return
+        # The item is kept with its count, so its id cannot be reused while it is still counted
+        self._attempts[key] = (item, attempts)
+        self.metrics['retried'] += 1
+        if kind == 'conversation':
+            # A newer state of the same thread queued in the meantime wins
+            self._conversations.setdefault(item, conversations[item])
+        else:
+            self._records[kind].insert(0, item)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._flush_requested or self._pending() >= self.batch_size, self.flush_interval)
+                self._flush_requested = False
+                if not self._pending():
+                    self._flushed = self._generation = self._generation + 1
+                    self._cond.notify_all()
+                    continue
+                conversations, records = self._conversations, self._records
+                self._conversations, self._records = {}, {kind: [] for kind in RECORD_WRITERS}
+                self._generation += 1
+                generation = self._generation
+                self._cond.notify_all()
+            def remaining() -> int:
+                return len(conversations) + sum(len(rows) for rows in records.values())
+
+            count = remaining()
+            failed = []
+            try:
+                failed = self._write(conversations, records)
+                unreachable = False
+            except Exception as e:
+                print(f"Error flushing write-behind queue: {e}")
+                unreachable = True
+            with self._cond:
+                self.metrics['flushes'] += 1
+                self.metrics['written'] += count - remaining()
+                if unreachable:
+                    # Put back what was not written without counting attempts; newer states of a thread win
+                    self.metrics['failures'] += 1
+                    for key, conversation in conversations.items():
+                        self._conversations.setdefault(key, conversation)
+                    for kind, rows in records.items():
+                        self._records[kind][:0] = rows
+                else:
+                    for kind, item in reversed(failed):
+                        self._requeue(kind, item, conversations)
+                    self._flushed = generation
+                    self._cond.notify_all()
+            if unreachable:
+                sleep(self.retry_delay)
+
+write_behind = WriteBehindQueue()
+atexit.register(write_behind.flush, 30)
 
 
 import json
-import pyodbc
 import os
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 class PromptDatabase:
     """
-    A class to interact with an MSSQL database for storing and retrieving prompt templates.
+    A class to interact with the prompt database (MSSQL, or SQLite with 'DB_BACKEND=sqlite') for storing and
+    retrieving prompt templates.
 
     This class provides methods to create tables, insert, update, query, and delete prompt records.
     It also handles the retrieval of prompt details based on various criteria. The class is designed
@@ -478,7 +1929,8 @@ class PromptDatabase:
         host: Optional[str] = None,
         user: Optional[str] = None,
         password: Optional[str] = None,
-        database: Optional[str] = None
+        database: Optional[str] = None,
+        backend: Optional[DatabaseBackend] = None
     ) -> None:
         """
         Initializes the connection details for the database, with the option to use environment variables as defaults.
@@ -494,17 +1946,21 @@ class PromptDatabase:
             user (Optional[str], optional): The database username. Defaults to environment variable 'MSSQL_USER'.
             password (Optional[str], optional): The database password. Defaults to environment variable 'MSSQL_PASS'.
             database (Optional[str], optional): The database name. Defaults to environment variable 'MSSQL_DB'.
+            backend (Optional[DatabaseBackend], optional): The database backend. Defaults to the backend selected
+                                                           by the 'DB_BACKEND' environment variable (MSSQL).
         """
         self.host: str = host if host is not None else os.getenv('MSSQL_HOST')
         self.user: str = user if user is not None else os.getenv('MSSQL_USER')
         self.password: str = password if password is not None else os.getenv('MSSQL_PASS')
         self.database: str = database if database is not None else os.getenv('MSSQL_DB')
+        self.backend: DatabaseBackend = backend if backend is not None else database_backend()
+        self.pool: Optional[ConnectionPool] = None
         self.conn: Optional[pyodbc.Connection] = None
         self.cursor: Optional[pyodbc.Cursor] = None
         
     def __enter__(self) -> 'PromptDatabase':
         """
-        Establishes the database connection and returns the instance itself when entering the context.
+        Borrows a connection from the shared connection pool and returns the instance itself when entering the context.
 
         This method is called when entering the context of the `with` statement.
 
@@ -514,14 +1970,8 @@ class PromptDatabase:
         Raises:
             pyodbc.Error: If there is an error connecting to the database.
         """
-        self.conn = pyodbc.connect(
-            driver='{ODBC Driver 18 for SQL Server}',
-            server=self.host,
-            database=self.database,
-            uid=self.user,
-            pwd=self.password,
-            TrustServerCertificate='yes'
-        )
+        self.pool = self.backend.pool(self.host, self.user, self.password, self.database)
+        self.conn = self.pool.acquire()
         self.cursor = self.conn.cursor()
         return self
 
@@ -532,7 +1982,7 @@ class PromptDatabase:
         exc_tb: Optional[Any]
     ) -> None:
         """
-        Closes the database connection and cursor when exiting the context.
+        Closes the cursor and returns the connection to the pool when exiting the context.
         Handles any exceptions that occurred within the context.
 
         This method is called when exiting the context of the `with` statement, regardless of whether
@@ -550,7 +2000,7 @@ class PromptDatabase:
             self.cursor.close()
             self.cursor = None
         if self.conn is not None:
-            self.conn.close()
+            release_connection(self.pool, self.conn, exc_type)
             self.conn = None
         if exc_type or exc_val or exc_tb:
             pass
@@ -593,6 +2043,55 @@ class PromptDatabase:
             prompt_dict[result[0]] = result[1]
         return prompt_dict
 
+    def query_prompt_versions(
+        self,
+        prompt_names: List[str]
+    ) -> Dict[str, str]:
+        """
+        Fetches the version stamps of the given prompts without their texts.
+
+        The version is a hash of the prompt string computed by the database, so checking for changes
+        transfers only a few bytes per prompt.
+
+        Args:
+            prompt_names (List[str]): The prompt names.
+
+        Returns:
+            Dict[str, str]: A dictionary mapping each prompt name found to its version.
+
+        Raises:
+            pyodbc.Error: If there is an error executing the SQL statement.
+        """
+        query = f"""
+        SELECT PromptName, {self.backend.statements['prompt_version']} FROM PromptStrings
+        WHERE PromptName IN ({','.join(['?'] * len(prompt_names))})
+        """
+        self.cursor.execute(query, tuple(prompt_names))
+        return {name: version for name, version in self.cursor.fetchall()}
+
+    def query_versioned_prompt_strings(
+        self,
+        prompt_names: List[str]
+    ) -> Dict[str, Tuple[str, str]]:
+        """
+        Fetches the prompt strings of the given prompts together with their version stamps.
+
+        Args:
+            prompt_names (List[str]): The prompt names.
+
+        Returns:
+            Dict[str, Tuple[str, str]]: A dictionary mapping each prompt name found to (prompt string, version).
+
+        Raises:
+            pyodbc.Error: If there is an error executing the SQL statement.
+        """
+        query = f"""
+        SELECT PromptName, PromptString, {self.backend.statements['prompt_version']} FROM PromptStrings
+        WHERE PromptName IN ({','.join(['?'] * len(prompt_names))})
+        """
+        self.cursor.execute(query, tuple(prompt_names))
+        return {name: (text, version) for name, text, version in self.cursor.fetchall()}
+
     def get_records(
         self,
         query: str,
@@ -1026,9 +2525,9 @@ class PromptDatabase:
 
     def close(self) -> None:
         """
-        Closes the database connection and cursor, if they exist.
+        Closes the cursor and returns the database connection to the pool, if they exist.
 
-        This method ensures that both the cursor and connection to the database are properly closed,
+        This method ensures that both the cursor and connection to the database are properly released,
         releasing any held resources. It is recommended to call this method when the database interactions
         are complete to prevent potential memory leaks or connection issues.
 
@@ -1039,7 +2538,7 @@ class PromptDatabase:
             self.cursor.close()
             self.cursor = None
         if self.conn is not None:
-            self.conn.close()
+            release_connection(self.pool, self.conn, None)
             self.conn = None
 
     def query_sql_record(self, prompt_name: str) -> Optional[Dict[str, str]]:
@@ -1362,55 +2861,246 @@ class PromptDatabase:
             return []
 
 
-@st.cache_data
+# Prompts used by the chatbot, with the fallback used when a prompt is not in the database. The name of each
+# prompt in 'PromptStrings' is set per client by the environment variable of the upper-cased key.
+DEFAULT_PROMPTS = {
+    "text_from_image": "You are a helpful assistant.",
+    "contextual_compression": "You are a helpful assistant.",
+    "rag_self_query": "You are a helpful assistant.",
+    "hyde_rag": "You are a helpful assistant.",
+    "choose_rag": "You are a helpful assistant.",
+    "sys_ragbot": "You are a helpful assistant.",
+    "rag_answer_reformat": "You are a helpful assistant.",
+}
+
+
+class PromptCache:
+    """
+    Keeps the prompts of the active client in memory and up to date with 'PromptStrings'.
+
+    All prompts are loaded in one query together with a version stamp each (a hash of the prompt string
+    computed by the database, since the table has no row version or update time). A daemon thread then
+    checks only the versions every `check_interval` seconds and reloads just the prompts that changed, so
+    prompt edits go live without a restart. Changes are applied to the same dictionary in place, so modules
+    holding the result of `work_prompts` see them, and `subscribe` callbacks are notified.
+
+    The last known good prompts are written to a local snapshot file. On startup the snapshot is served
+    immediately and checked against the database in the background, so the first render does not wait for
+    MSSQL, and a database outage keeps the last good prompts instead of the defaults.
+    """
+
+    def __init__(
+        self,
+        defaults: Optional[Dict[str, str]] = None,
+        check_interval: Optional[float] = None,
+        snapshot_path: Optional[str] = None
+    ) -> None:
+        """
+        Initializes the cache. Nothing is loaded before the first `get`.
+
+        Args:
+            defaults (Optional[Dict[str, str]], optional): Prompt names mapped to fallback texts. Defaults to
+                                                           DEFAULT_PROMPTS.
+            check_interval (Optional[float], optional): Seconds between version checks. Defaults to the
+                                                        'PROMPT_CHECK_INTERVAL' environment variable or 60.
+            snapshot_path (Optional[str], optional): The snapshot file. Defaults to 'PROMPT_SNAPSHOT_PATH' or
+                                                     'prompt_snapshot_<APP_ID>.json', read when first loading.
+        """
+        self.defaults = defaults if defaults is not None else DEFAULT_PROMPTS
+        self.check_interval = check_interval if check_interval is not None else float(getenv("PROMPT_CHECK_INTERVAL", "60"))
+        self.snapshot_path = snapshot_path
+        self.prompts: Dict[str, str] = {}
+        self.versions: Dict[str, str] = {}
+        self.db_names: Dict[str, Optional[str]] = {}
+        self.source: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        self.checks = 0
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+        self._listeners: List[Callable[[Dict[str, str]], None]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def get(self) -> Dict[str, str]:
+        """
+        Returns the prompts, loading them on the first call.
+
+        Returns:
+            Dict[str, str]: Prompt names mapped to prompt texts. The same dictionary is returned on every call
+                            and updated in place when prompts change.
+        """
+        with self._lock:
+            if self.source is None:
+                self._load()
+                self._thread = threading.Thread(target=self._run, name="prompt-cache", daemon=True)
+                self._thread.start()
+        return self.prompts
+
+    def subscribe(self, callback: Callable[[Dict[str, str]], None]) -> None:
+        """
+        Registers a callback called from the checking thread with the prompts that changed (name to new text).
+        """
+        self._listeners.append(callback)
+
+    def check(self) -> Dict[str, str]:
+        """
+        Compares the prompt versions with the database and reloads the prompts that changed.
+
+        Errors are printed and the current prompts are kept.
+
+        Returns:
+            Dict[str, str]: The prompts that changed, mapped to their new texts.
+        """
+        names = [name for name in set(self.db_names.values()) if name]
+        try:
+            with PromptDatabase() as db:
+                versions = db.query_prompt_versions(names) if names else {}
+                stale = [name for name in names if versions.get(name) != self.versions.get(name)]
+                rows = db.query_versioned_prompt_strings([name for name in stale if name in versions]) if stale else {}
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Error checking prompt versions: {e}")
+            return {}
+        self.checks += 1
+        self.checked_at = monotonic()
+        self.last_error = None
+        self.source = 'database'
+        if not stale:
+            return {}
+        changed = self._apply(rows, stale)
+        self.reloads += 1
+        self._save_snapshot()
+        if changed:
+            print(f"Prompts reloaded: {', '.join(sorted(changed))}")
+            for callback in list(self._listeners):
+                try:
+                    callback(changed)
+                except Exception as e:
+                    print(f"Error notifying prompt change: {e}")
+        return changed
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Reports where the prompts were loaded from and the state of the version checks.
+
+        Returns:
+            Dict[str, Any]: 'source' ('database', 'snapshot' or 'defaults'), 'age' in seconds since the last
+                            successful check (None before the first one), 'checks', 'reloads', 'last_error'
+                            and the prompt 'versions'.
+        """
+        return {
+            'source': self.source,
+            'age': None if self.checked_at is None else monotonic() - self.checked_at,
+            'checks': self.checks,
+            'reloads': self.reloads,
+            'last_error': self.last_error,
+            'versions': dict(self.versions),
+        }
+
+    def _apply(self, rows: Dict[str, Tuple[str, str]], names: List[str]) -> Dict[str, str]:
+        """
+        Stores the loaded (text, version) rows of the given database prompt names, falling back to the default
+        for names without a row, and returns the prompts whose text changed.
+        """
+        for name in names:
+            if name in rows:
+                self.versions[name] = rows[name][1]
+            else:
+                self.versions.pop(name, None)
+        changed = {}
+        for prompt_name, name in self.db_names.items():
+            if name not in names:
+                continue
+            text = rows[name][0] if name in rows and rows[name][0] is not None else self.defaults[prompt_name]
+            if self.prompts.get(prompt_name) != text:
+                self.prompts[prompt_name] = changed[prompt_name] = text
+        conversation_codec.register_prompts(changed)
+        return changed
+
+    def _load(self) -> None:
+        self.db_names = {name: getenv(name.upper()) for name in self.defaults}
+        self.snapshot_path = self.snapshot_path or getenv("PROMPT_SNAPSHOT_PATH") or f"prompt_snapshot_{getenv('APP_ID') or 'default'}.json"
+        self.prompts.update(self.defaults)
+        names = [name for name in set(self.db_names.values()) if name]
+        snapshot = self._read_snapshot()
+        if snapshot is not None and set(names) <= set(snapshot['names']):
+            rows = {name: (entry['text'], entry['version']) for name, entry in snapshot['prompts'].items()}
+            self._apply(rows, names)
+            self.source = 'snapshot'
+            return
+        try:
+            with PromptDatabase() as db:
+                rows = db.query_versioned_prompt_strings(names) if names else {}
+            self._apply(rows, names)
+            self.source = 'database'
+            self.checked_at = monotonic()
+            self._save_snapshot()
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Error loading prompts, using {'the snapshot' if snapshot else 'default prompts'}: {e}")
+            if snapshot is not None:
+                rows = {name: (entry['text'], entry['version']) for name, entry in snapshot['prompts'].items()}
+                self._apply(rows, [name for name in names if name in rows])
+            self.source = 'snapshot' if snapshot is not None else 'defaults'
+
+    def _read_snapshot(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as snapshot_file:
+                return json.load(snapshot_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Error reading prompt snapshot {self.snapshot_path}: {e}")
+            return None
+
+    def _save_snapshot(self) -> None:
+        snapshot = {
+            'names': sorted(name for name in set(self.db_names.values()) if name),
+            'prompts': {
+                name: {'text': self.prompts[prompt_name], 'version': self.versions[name]}
+                for prompt_name, name in self.db_names.items() if name in self.versions
+            },
+            'saved_at': datetime.now().isoformat(),
+        }
+        temp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as snapshot_file:
+                json.dump(snapshot, snapshot_file, ensure_ascii=False)
+            os.replace(temp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"Error writing prompt snapshot {self.snapshot_path}: {e}")
+
+    def _run(self) -> None:
+        if self.source != 'database':
+            self.check()
+        while True:
+            sleep(self.check_interval)
+            self.check()
+
+
+prompt_cache = PromptCache()
+
+
 def work_prompts() -> Dict[str, str]:
     """
-    Retrieves and constructs a mapping of prompt names to their corresponding prompt strings.
+    Retrieves the mapping of prompt names to their corresponding prompt strings for the active client.
 
-    This function performs the following steps:
-        1. Defines a default prompt string to be used as a fallback.
-        2. Initializes a dictionary of prompt names mapped to the default prompt.
-        3. Retrieves environment variable values corresponding to each prompt name.
-        4. Uses the `PromptDatabase` class to fetch prompt strings from the database based on the environment variable values.
-        5. Constructs the final `prompt_map` dictionary by:
-            - Assigning the fetched prompt string if available.
-            - Falling back to the default prompt if no database entry is found.
+    The prompt names in 'PromptStrings' are taken from the environment variables of the upper-cased keys of
+    DEFAULT_PROMPTS, and prompts not found in the database fall back to the default prompt. The prompts are
+    served by `prompt_cache`, which picks up prompt edits in the background.
 
     Returns:
         Dict[str, str]: A dictionary mapping each prompt name to its corresponding prompt string.
                         If a prompt string is not found in the database, the default prompt is used.
     """
-    default_prompt = "You are a helpful assistant."
-
-    all_prompts = {
-        "text_from_image": default_prompt,
-        "contextual_compression": default_prompt,
-        "rag_self_query": default_prompt,
-        "hyde_rag": default_prompt,
-        "choose_rag": default_prompt,
-        "sys_ragbot": default_prompt,
-        "rag_answer_reformat": default_prompt,
-    }
+    return prompt_cache.get()
 
-    prompt_names = list(all_prompts.keys())
+if __name__ == "__main__":
+    import sys
 
-    # Build a mapping from original prompt names to environment variable values
-    prompt_env_map = {name: getenv(name.upper()) for name in prompt_names}
-
-    # Extract the environment variable values
-    env_vars = list(prompt_env_map.values())
-    with PromptDatabase() as db:
-        # Fetch the prompt strings from the database using the environment variable values
-        sql_results = db.query_sql_prompt_strings(env_vars)
-
-    # Build the output dictionary with original prompt names as keys
-    prompt_map: Dict[str, str] = {}
-    for prompt_name in prompt_names:
-        env_var = prompt_env_map[prompt_name]
-        prompt_string = sql_results.get(env_var)
-        if prompt_string is not None:
-            prompt_map[prompt_name] = prompt_string
-        else:
-            # Use the default prompt if no result is found in the database
-            prompt_map[prompt_name] = all_prompts[prompt_name]
-    return prompt_map
\ No newline at end of file
+    with ConversationDatabase() as db:
+        db.create_sql_table()
+        if "migrate-messages" in sys.argv[1:]:
+            db.migrate_to_messages()
+        if "codec-report" in sys.argv[1:]:
+            db.codec_report()
\ No newline at end of file
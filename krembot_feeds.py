@@ -0,0 +1,197 @@
+import random
+import threading
+
+from os import getenv
+from time import monotonic
+from typing import Any, Callable, Dict, Optional
+
+from krembot_http import http_client
+
+
+class Feed:
+    """
+    State of a single catalogue feed owned by the FeedRefresher.
+
+    Holds the last successfully parsed value together with the validators (ETag / Last-Modified) used for
+    conditional requests, and the bookkeeping needed for scheduling and backoff.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        interval: float,
+        parse: Optional[Callable[[Any], Any]] = None
+    ) -> None:
+        """
+        Initializes the feed state.
+
+        Args:
+            name (str): Short feed name used in logs and for the interval override variable.
+            url (str): The URL of the feed.
+            interval (float): Refresh interval in seconds.
+            parse (Optional[Callable[[Any], Any]], optional): Turns the decoded JSON into the value served to
+                                                              readers. Defaults to serving the JSON as is.
+        """
+        self.name = name
+        self.url = url
+        self.interval = interval
+        self.parse = parse
+        self.value: Any = None
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.loaded = threading.Event()
+        self.refreshed_at: Optional[float] = None
+        self.next_refresh = 0.0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+
+class FeedRefresher:
+    """
+    A background scheduler that keeps catalogue feeds fresh so user turns never download them.
+
+    Every registered feed is refreshed on its own interval by a single daemon thread. Readers always get the
+    last good value (stale-while-revalidate). Requests go through the shared HTTP client under the feed's
+    name. Refreshes use conditional GETs when the server sends ETag or Last-Modified headers, are jittered to
+    avoid synchronized bursts, and back off exponentially on failure.
+    """
+
+    def __init__(
+        self,
+        retry_delay: float = 15.0,
+        max_backoff: float = 900.0,
+        jitter: float = 0.1
+    ) -> None:
+        """
+        Initializes the FeedRefresher.
+
+        Args:
+            retry_delay (float, optional): Delay in seconds before the first retry after a failure. Defaults to 15.
+            max_backoff (float, optional): Upper bound for the retry delay in seconds. Defaults to 900.
+            jitter (float, optional): Relative jitter applied to every delay. Defaults to 0.1.
+        """
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.first_load_timeout = float(getenv("FEED_FIRST_LOAD_TIMEOUT", "5"))
+        self.feeds: Dict[str, Feed] = {}
+        self._wakeup = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(
+        self,
+        url: str,
+        parse: Optional[Callable[[Any], Any]] = None,
+        interval: float = 600.0,
+        name: Optional[str] = None
+    ) -> Feed:
+        """
+        Registers a feed for background refreshing. Registering an already known URL is a no-op.
+
+        The interval can be overridden per feed with the 'FEED_INTERVAL_<NAME>' environment variable.
+
+        Args:
+            url (str): The URL of the feed.
+            parse (Optional[Callable[[Any], Any]], optional): Turns the decoded JSON into the served value.
+            interval (float, optional): Refresh interval in seconds. Defaults to 600.
+            name (Optional[str], optional): Short feed name. Defaults to the URL.
+
+        Returns:
+            Feed: The registered feed.
+        """
+        with self._wakeup:
+            feed = self.feeds.get(url)
+            if feed is None:
+                name = name or url
+                interval = float(getenv(f"FEED_INTERVAL_{name.upper()}", interval))
+                feed = self.feeds[url] = Feed(name, url, interval, parse)
+                self._wakeup.notify()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="catalogue-feeds", daemon=True)
+                self._thread.start()
+        return feed
+
+    def get(self, url: str) -> Any:
+        """
+        Returns the current value of a feed without downloading it.
+
+        Only the very first read of a feed that has not loaded yet waits, at most 'FEED_FIRST_LOAD_TIMEOUT'
+        seconds, for the initial background download.
+
+        Args:
+            url (str): The URL of a registered feed.
+
+        Returns:
+            Any: The last successfully parsed value, or None if the feed has never loaded.
+        """
+        feed = self.feeds[url]
+        if not feed.loaded.is_set():
+            feed.loaded.wait(self.first_load_timeout)
+        return feed.value
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Reports the age and health of every feed.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Per feed name: 'age' in seconds (None if never loaded), 'failures'
+                                       and 'last_error'.
+        """
+        now = monotonic()
+        return {
+            feed.name: {
+                'age': None if feed.refreshed_at is None else now - feed.refreshed_at,
+                'failures': feed.failures,
+                'last_error': feed.last_error,
+            }
+            for feed in list(self.feeds.values())
+        }
+
+    def refresh(self, feed: Feed) -> None:
+        """
+        Refreshes a single feed and schedules its next refresh.
+
+        Args:
+            feed (Feed): The feed to refresh.
+        """
+        headers = {}
+        if feed.etag:
+            headers['If-None-Match'] = feed.etag
+        if feed.last_modified:
+            headers['If-Modified-Since'] = feed.last_modified
+        try:
+            response = http_client.get(feed.name, feed.url, headers=headers)
+            if response.status_code != 304:
+                response.raise_for_status()
+                data = response.json()
+                feed.value = feed.parse(data) if feed.parse else data
+                feed.etag = response.headers.get('ETag')
+                feed.last_modified = response.headers.get('Last-Modified')
+            feed.refreshed_at = monotonic()
+            feed.failures = 0
+            feed.last_error = None
+            delay = feed.interval
+        except Exception as e:
+            feed.failures += 1
+            feed.last_error = str(e)
+            delay = min(self.retry_delay * 2 ** (feed.failures - 1), self.max_backoff)
+            print(f"Error refreshing feed '{feed.name}' (attempt {feed.failures}): {e}")
+        finally:
+            feed.loaded.set()
+        feed.next_refresh = monotonic() + delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _run(self) -> None:
+        while True:
+            with self._wakeup:
+                now = monotonic()
+                due = [feed for feed in self.feeds.values() if feed.next_refresh <= now]
+                if not due:
+                    next_refresh = min(feed.next_refresh for feed in self.feeds.values())
+                    self._wakeup.wait(next_refresh - now)
+                    continue
+            for feed in due:
+                self.refresh(feed)
+
+
+catalogue_feeds = FeedRefresher()
@@ -14,6 +14,8 @@ from openai import OpenAI, APIConnectionError, APIError, RateLimitError
 from os import getenv
 from typing import List, Dict, Any, Tuple, Union, Optional, Callable
 
+from krembot_usage import usage_collector
+
 client = OpenAI(api_key=getenv("OPENAI_API_KEY"))
 
 
@@ -287,6 +289,7 @@ async def fetch_spoken_response(
 
         if response.status != 200:
             raise Exception(f"API request failed with status {response.status}")
+        usage_collector.speech("tts-1-hd", full_response, "tts")
 
         audio_data = await response.read()
         return audio_data
@@ -340,6 +343,7 @@ async def suggest_questions(
             },
         )
         data = await response.json()
+        usage_collector.chat(data, "suggestions")
         odgovor = data['choices'][0]['message']['content']
         return odgovor
 
@@ -509,6 +513,7 @@ def suggest_questions_s(
                     model=getenv("OPENAI_MODEL"),
                     messages=[system_message, user_message],
                     )
+    usage_collector.chat(response, "suggestions")
                
     odgovor =  response.choices[0].message.content
     return odgovor
@@ -587,6 +592,7 @@ def play_audio_from_stream_s(full_response: str) -> None:
         voice="nova",
         input=full_response,
     )
+    usage_collector.speech("tts-1-hd", full_response, "tts")
     spoken_response_bytes = spoken_response.read()
     buffer = io.BytesIO(spoken_response_bytes)
     buffer.seek(0)
@@ -0,0 +1,235 @@
+import random
+import requests
+import threading
+import time
+
+from collections import deque
+from os import getenv
+from requests.adapters import HTTPAdapter
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+
+# Connect/read timeouts and retry counts per backend endpoint. Unknown endpoints use 'default'.
+ENDPOINTS = {
+    'default': {'timeout': (3.05, 10), 'retries': 1},
+    'toplists': {'timeout': (3.05, 15), 'retries': 1},
+    'actions': {'timeout': (3.05, 15), 'retries': 1},
+    'bookstores': {'timeout': (3.05, 15), 'retries': 1},
+    'products': {'timeout': (3.05, 10), 'retries': 2},
+    'order_info': {'timeout': (3.05, 10), 'retries': 2},
+    'aks': {'timeout': (3.05, 10), 'retries': 2},
+}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised without contacting the backend while its circuit breaker is open.
+    """
+
+
+class Endpoint:
+    """
+    Per-endpoint state of the HttpClient: settings, retry budget, circuit breaker and metrics.
+    """
+
+    def __init__(self, name: str, timeout: Any, retries: int) -> None:
+        """
+        Initializes the endpoint state.
+
+        Args:
+            name (str): The endpoint name used in metrics.
+            timeout (Any): The (connect, read) timeout for requests to the endpoint.
+            retries (int): Maximum number of retries per request.
+        """
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_tokens = 10.0
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.requests = 0
+        self.errors = 0
+        self.retried = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=500)
+
+
+class HttpClient:
+    """
+    The HTTP client every Delfi and AKS request goes through.
+
+    Requests share one pooled keep-alive session per host and use per-endpoint connect/read timeouts from
+    ENDPOINTS. GET requests that fail with a connection error, a timeout or a 5xx response are retried with
+    exponential backoff, as long as the endpoint's retry budget allows it (about one retry per ten requests),
+    so retries cannot multiply the load on a struggling backend. Other request errors (e.g. a broken chunked
+    response) are raised without a retry but count as failures. After several consecutive failures the
+    endpoint's circuit breaker opens and requests fail fast with CircuitOpenError until a cool-down has passed
+    and a single probe request succeeds.
+    """
+
+    def __init__(
+        self,
+        pool_maxsize: Optional[int] = None,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+        backoff: float = 0.2,
+        retry_budget: float = 0.1
+    ) -> None:
+        """
+        Initializes the HttpClient.
+
+        Args:
+            pool_maxsize (Optional[int], optional): Maximum open connections per host. Defaults to the
+                                                    'HTTP_POOL_MAXSIZE' environment variable or 16.
+            failure_threshold (int, optional): Consecutive failures that open a circuit breaker. Defaults to 5.
+            cooldown (float, optional): Seconds an open circuit breaker rejects requests. Defaults to 30.
+            backoff (float, optional): Delay in seconds before the first retry. Defaults to 0.2.
+            retry_budget (float, optional): Retries earned per request. Defaults to 0.1.
+        """
+        self.pool_maxsize = pool_maxsize or int(getenv("HTTP_POOL_MAXSIZE", "16"))
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.backoff = backoff
+        self.retry_budget = retry_budget
+        self.endpoints: Dict[str, Endpoint] = {}
+        self.sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def endpoint(self, name: str) -> Endpoint:
+        """
+        Returns the state of an endpoint, creating it from ENDPOINTS on first use.
+        """
+        with self._lock:
+            if name not in self.endpoints:
+                settings = ENDPOINTS.get(name, ENDPOINTS['default'])
+                self.endpoints[name] = Endpoint(name, settings['timeout'], settings['retries'])
+            return self.endpoints[name]
+
+    def session(self, url: str) -> requests.Session:
+        """
+        Returns the pooled session for the host of a URL.
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self.sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self.sessions[host] = session
+            return self.sessions[host]
+
+    def _allow(self, endpoint: Endpoint) -> bool:
+        with self._lock:
+            if endpoint.opened_at is None:
+                return True
+            if endpoint.probing or time.monotonic() - endpoint.opened_at < self.cooldown:
+                endpoint.rejected += 1
+                return False
+            # After the cool-down a single probe request is let through
+            endpoint.probing = True
+            return True
+
+    def _record(self, endpoint: Endpoint, latency: float, failed: bool) -> None:
+        with self._lock:
+            endpoint.latencies.append(latency)
+            endpoint.probing = False
+            if failed:
+                endpoint.errors += 1
+                endpoint.failures += 1
+                if endpoint.opened_at is not None or endpoint.failures >= self.failure_threshold:
+                    if endpoint.opened_at is None:
+                        print(f"Circuit breaker opened for endpoint '{endpoint.name}'")
+                    endpoint.opened_at = time.monotonic()
+            else:
+                endpoint.failures = 0
+                endpoint.opened_at = None
+
+    def get(self, name: str, url: str, **kwargs: Any) -> requests.Response:
+        """
+        Sends a GET request to a backend endpoint.
+
+        Args:
+            name (str): The endpoint name, a key of ENDPOINTS.
+            url (str): The request URL.
+            **kwargs: Passed on to requests.Session.get (params, headers, stream...). A 'timeout' overrides the
+                      endpoint's timeout.
+
+        Returns:
+            requests.Response: The response. 4xx responses are returned as they are.
+
+        Raises:
+            CircuitOpenError: If the endpoint's circuit breaker is open.
+            requests.exceptions.RequestException: If the request still fails after all retries.
+        """
+        endpoint = self.endpoint(name)
+        kwargs.setdefault('timeout', endpoint.timeout)
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.retry_tokens = min(10.0, endpoint.retry_tokens + self.retry_budget)
+
+        attempt = 0
+        while True:
+            if not self._allow(endpoint):
+                raise CircuitOpenError(f"Circuit breaker open for endpoint '{name}'")
+            started = time.perf_counter()
+            error = None
+            try:
+                response = self.session(url).get(url, **kwargs)
+                if response.status_code >= 500:
+                    error = requests.exceptions.HTTPError(f"{response.status_code} Server Error for url: {url}", response=response)
+            except requests.exceptions.RequestException as e:
+                error = e
+            except BaseException:
+                # Never leave a half-open probe in flight, or the circuit would reject requests for good
+                self._record(endpoint, time.perf_counter() - started, True)
+                raise
+            self._record(endpoint, time.perf_counter() - started, error is not None)
+            if error is None:
+                return response
+
+            with self._lock:
+                retry = (
+                    isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.HTTPError))
+                    and attempt < endpoint.retries and endpoint.retry_tokens >= 1 and endpoint.opened_at is None
+                )
+                if retry:
+                    endpoint.retry_tokens -= 1
+                    endpoint.retried += 1
+            if isinstance(error, requests.exceptions.HTTPError):
+                if not retry:
+                    return error.response
+                error.response.close()
+            elif not retry:
+                raise error
+            time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+            attempt += 1
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Reports request counts, errors and latency per endpoint.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Per endpoint: 'requests', 'errors' (failed attempts), 'retries',
+                                       'rejected' (by the circuit breaker), 'circuit' ('closed' or 'open'),
+                                       and 'latency_avg' / 'latency_p95' in seconds over recent attempts.
+        """
+        with self._lock:
+            report = {}
+            for name, endpoint in self.endpoints.items():
+                latencies = sorted(endpoint.latencies)
+                report[name] = {
+                    'requests': endpoint.requests,
+                    'errors': endpoint.errors,
+                    'retries': endpoint.retried,
+                    'rejected': endpoint.rejected,
+                    'circuit': 'closed' if endpoint.opened_at is None else 'open',
+                    'latency_avg': sum(latencies) / len(latencies) if latencies else None,
+                    'latency_p95': latencies[int(len(latencies) * 0.95)] if latencies else None,
+                }
+            return report
+
+
+http_client = HttpClient()
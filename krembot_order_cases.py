@@ -0,0 +1,87 @@
+import itertools
+
+from typing import Any, Dict, List, Tuple
+
+
+ORDER_CASE_FIELDS = ('type', 'status', 'delivery_service', 'payment_type', 'package_status')
+CARD_PAYMENTS = ['ANY_CREDIT_CARD', 'VISA_PREMIUM_CREDIT_CARD', 'VISA_CREDIT_CARD']
+
+# Tabela slučajeva porudžbina, po prioritetu: prvi slučaj koji odgovara porudžbini se bira.
+# Lista znači da je dozvoljena bilo koja od vrednosti, a polje koje nije navedeno može imati bilo koju vrednost.
+# Porudžbina koja ne odgovara nijednom slučaju je slučaj 'x24'.
+ORDER_CASES = [
+    ('x1', {'type': 'standard', 'status': 'finished', 'delivery_service': 'DEFAULT', 'payment_type': 'ON_DELIVERY', 'package_status': 'WAITING_FOR_EXPORT'}),
+    ('x2', {'type': 'standard', 'status': 'finished', 'delivery_service': 'DEFAULT', 'payment_type': 'ON_DELIVERY', 'package_status': 'WAITING_FOR_MP99'}),
+    ('x3', {'type': 'standard', 'status': 'finished', 'delivery_service': 'DEFAULT', 'payment_type': 'ON_DELIVERY', 'package_status': 'EXPORTED_TO_MP99'}),
+    ('x4', {'type': 'standard', 'status': 'finished', 'delivery_service': 'DEFAULT', 'payment_type': 'ON_DELIVERY', 'package_status': 'EXPORTED'}),
+    ('x5', {'type': 'standard', 'status': 'finished', 'delivery_service': 'DEFAULT', 'payment_type': 'ON_DELIVERY', 'package_status': 'MAIL_SENT'}),
+    ('x6', {'type': 'standard', 'status': 'paymentCompleted', 'delivery_service': 'DEFAULT', 'payment_type': CARD_PAYMENTS, 'package_status': 'EXPORTED'}),
+    ('x7', {'type': 'standard', 'status': 'paymentCompleted', 'delivery_service': 'DEFAULT', 'payment_type': CARD_PAYMENTS, 'package_status': 'MAIL_SENT'}),
+    ('x8', {'type': 'standard', 'status': 'paymentCompleted', 'delivery_service': 'DEFAULT', 'payment_type': CARD_PAYMENTS, 'package_status': 'WAITING_FOR_MP99'}),
+    ('x9', {'type': 'standard', 'status': 'paymentCompleted', 'delivery_service': 'DEFAULT', 'payment_type': CARD_PAYMENTS, 'package_status': 'EXPORTED_TO_MP99'}),
+    ('x10', {'type': 'standard', 'status': 'paymentCompleted', 'delivery_service': 'DEFAULT', 'payment_type': CARD_PAYMENTS, 'package_status': 'WAITING_FOR_EXPORT'}),
+    ('x11', {'type': 'standard', 'status': 'paymentCompleted', 'delivery_service': 'DHL', 'payment_type': CARD_PAYMENTS, 'package_status': ['EXPORTED', 'WAITING_FOR_EXPORT']}),
+    ('x12', {'type': ['standard', 'ebook'], 'status': 'readyForOnlinePayment', 'delivery_service': ['DEFAULT', 'DHL'], 'payment_type': CARD_PAYMENTS}),
+    ('x13', {'type': ['standard', 'ebook'], 'status': 'waitingForFinalOnlinePaymentStatus', 'delivery_service': ['DEFAULT', 'DHL'], 'payment_type': CARD_PAYMENTS}),
+    ('x14', {'type': 'ebook', 'status': 'ebookSuccessfullyAdded', 'payment_type': CARD_PAYMENTS}),
+    ('x15', {'type': ['standard', 'ebook'], 'status': 'canceled', 'payment_type': CARD_PAYMENTS}),
+    ('x16', {'type': 'standard', 'status': 'paymentCompleted', 'delivery_service': 'DHL', 'payment_type': CARD_PAYMENTS, 'package_status': 'INVITATION_SENT'}),
+    ('x17', {'type': 'standard', 'status': 'finished', 'delivery_service': 'DEFAULT', 'payment_type': 'ON_DELIVERY', 'package_status': 'INVITATION_SENT'}),
+    ('x18', {'type': 'standard', 'status': 'paymentCompleted', 'delivery_service': 'DEFAULT', 'payment_type': CARD_PAYMENTS, 'package_status': 'INVITATION_SENT'}),
+    ('x19', {'type': 'standard', 'status': 'finished', 'delivery_service': 'DEFAULT', 'payment_type': 'PAYMENT_SLIP', 'package_status': 'INVITATION_SENT'}),
+    ('x20', {'type': 'standard', 'status': 'finished', 'delivery_service': 'DEFAULT', 'payment_type': 'ADMINISTRATIVE_BAN', 'package_status': 'INVITATION_SENT'}),
+    ('x21', {'type': 'standard', 'status': 'finished', 'payment_type': 'ADMINISTRATIVE_BAN', 'package_status': 'WAITING_FOR_EXPORT'}),
+    ('x22', {'type': 'standard', 'status': 'manuallyCanceled'}),
+    ('x23', {'type': 'standard', 'status': 'returned'}),
+    ('x25', {'type': 'standard', 'status': 'finished', 'delivery_service': 'DEFAULT', 'payment_type': 'PAYMENT_SLIP', 'package_status': 'WAITING_FOR_EXPORT'}),
+    ('x26', {'type': 'standard', 'status': 'finished', 'delivery_service': 'DEFAULT', 'payment_type': 'PAYMENT_SLIP', 'package_status': 'WAITING_FOR_MP99'}),
+    ('x27', {'type': 'standard', 'status': 'finished', 'delivery_service': 'DEFAULT', 'payment_type': 'PAYMENT_SLIP', 'package_status': 'EXPORTED_TO_MP99'}),
+    ('x28', {'type': 'standard', 'status': 'finished', 'delivery_service': 'DEFAULT', 'payment_type': 'PAYMENT_SLIP', 'package_status': 'EXPORTED'}),
+    ('x29', {'type': 'standard', 'status': 'finished', 'delivery_service': 'DEFAULT', 'payment_type': 'PAYMENT_SLIP', 'package_status': 'MAIL_SENT'}),
+    ('x30', {'type': 'standard', 'status': 'finished', 'delivery_service': 'DHL', 'payment_type': 'ON_DELIVERY', 'package_status': 'EXPORTED_TO_MP99'}),
+]
+
+
+def compile_order_cases(cases: List[Tuple[str, Dict[str, Any]]]) -> Dict[Tuple[str, ...], Dict[Tuple[Any, ...], Tuple[int, str]]]:
+    """
+    Kompajlira tabelu slučajeva u heš indekse, po jedan za svaku kombinaciju navedenih polja.
+
+    Svaka lista vrednosti se razvija u sve pojedinačne ključeve, tako da se slučaj porudžbine nalazi sa nekoliko
+    pretraga rečnika umesto proverom svih slučajeva redom.
+
+    Args:
+        cases (List[Tuple[str, Dict[str, Any]]]): Slučajevi po prioritetu, kao u ORDER_CASES.
+
+    Returns:
+        Dict[Tuple[str, ...], Dict[Tuple[Any, ...], Tuple[int, str]]]: Za svaku kombinaciju navedenih polja,
+            indeks od vrednosti tih polja do (prioritet, slučaj).
+    """
+    indexes = {}
+    for priority, (case, conditions) in enumerate(cases):
+        fields = tuple(field for field in ORDER_CASE_FIELDS if field in conditions)
+        values = [conditions[field] if isinstance(conditions[field], list) else [conditions[field]] for field in fields]
+        index = indexes.setdefault(fields, {})
+        for key in itertools.product(*values):
+            index.setdefault(key, (priority, case))
+    return indexes
+
+
+ORDER_CASE_INDEXES = compile_order_cases(ORDER_CASES)
+
+
+def delfi_check_which_case(order_info: Dict[str, Any]) -> str:
+    """
+    Određuje slučaj porudžbine (x1-x30) na osnovu tabele ORDER_CASES.
+
+    Args:
+        order_info (Dict[str, Any]): Podaci o porudžbini iz parse_order_info.
+
+    Returns:
+        str: Prvi slučaj iz tabele koji odgovara porudžbini, ili 'x24' ako nijedan ne odgovara.
+    """
+    matches = [
+        index[key]
+        for fields, index in ORDER_CASE_INDEXES.items()
+        if (key := tuple(order_info.get(field) for field in fields)) in index
+    ]
+    return min(matches)[1] if matches else 'x24'
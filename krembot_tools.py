@@ -1,30 +1,54 @@
+import json
 import pytz
 import re
 import requests
+import threading
 import xml.etree.ElementTree as ET
 from langchain.chains.query_constructor.base import AttributeInfo
 from langchain.retrievers.self_query.base import SelfQueryRetriever
+from langchain_community.callbacks import get_openai_callback
 from langchain_community.vectorstores import Pinecone as LangPine
 from langchain_openai import OpenAIEmbeddings
 from langchain_openai.chat_models import ChatOpenAI
 
 from datetime import datetime, time
+from time import perf_counter
 from openai import OpenAI
 from os import getenv
 from pinecone_text.sparse import BM25Encoder
-from typing import List, Dict, Any, Tuple, Union, Optional
-from krembot_db import work_prompts
-from krembot_auxiliary import load_matching_tools, connect_to_neo4j, connect_to_pinecone, neo4j_isinstance
+from typing import List, Dict, Any, Iterable, Tuple, Union, Optional
+from krembot_db import work_prompts, prompt_cache
+from krembot_auxiliary import load_matching_tools, connect_to_neo4j, connect_to_pinecone, neo4j_isinstance, strip_diacritics
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import lru_cache
+from krembot_order_cases import delfi_check_which_case
+from krembot_cache import OrderStatusCache, ProductInfoCache, description_store, single_flight
+from krembot_feeds import catalogue_feeds
+from krembot_http import http_client
+from krembot_usage import usage_collector
 mprompts = work_prompts()
 client = OpenAI(api_key=getenv("OPENAI_API_KEY"))
 
 
 all_tools = load_matching_tools(mprompts["choose_rag"])
 
+
+def reload_tools(changed: Dict[str, str]) -> None:
+    """Rebuilds the tool list when the 'choose_rag' prompt changes."""
+    global all_tools
+    if "choose_rag" in changed:
+        all_tools = load_matching_tools(changed["choose_rag"])
+
+
+prompt_cache.subscribe(reload_tools)
+
+TOPLISTS_URL = 'https://delfi.rs/api/pc-frontend-api/toplists'
+ACTIONS_URL = 'https://delfi.rs/api/pc-frontend-api/actions-page'
+BOOKSTORES_URL = 'https://delfi.rs/api/bookstores'
+
 def get_tool_response(prompt: str):
     """Function to cache external API tool responses if needed."""
-    return client.chat.completions.create(
+    response = client.chat.completions.create(
         model="gpt-4o",
         messages=[
             {"role": "system", "content": "Your one and only job is to determine the name of the tool that should be used to solve the user query. Do not return any other information."}, 
@@ -34,6 +58,25 @@ def get_tool_response(prompt: str):
         temperature=0.0,
         tool_choice="required",
     )
+    return usage_collector.chat(response, "router")
+
+
+def embed_text(text: str, model: str = "text-embedding-3-large") -> List[float]:
+    """
+    Returns the embedding of a text. Concurrent requests for the same text share one OpenAI call.
+
+    Args:
+        text (str): The text to be embedded.
+        model (str, optional): The embedding model. Defaults to "text-embedding-3-large".
+
+    Returns:
+        List[float]: The embedding vector of the text.
+    """
+    return single_flight("embeddings").do(
+        (model, text),
+        lambda: usage_collector.embedding(client.embeddings.create(input=[text], model=model), "embeddings").data[0].embedding
+    )
+
 
 def rag_tool_answer(prompt: str, x: int) -> Tuple[Any, str]:
     """
@@ -86,10 +129,10 @@ def rag_tool_answer(prompt: str, x: int) -> Tuple[Any, str]:
         return processor_cache[key]
 
     # Use get_processor to cache class instances
-    toplist_processor = get_processor(TopListFetcher, 'https://delfi.rs/api/pc-frontend-api/toplists')
+    toplist_processor = get_processor(TopListFetcher, TOPLISTS_URL)
     common_processor = get_processor(HybridQueryProcessor, namespace="delfi-podrska", delfi_special=1)
     bookstore_processor = get_processor(BookstoreSearcher)
-    actions_processor = get_processor(ActionFetcher, 'https://delfi.rs/api/pc-frontend-api/actions-page')
+    actions_processor = get_processor(ActionFetcher, ACTIONS_URL)
 
 
     # Update your tool_processors dictionary
@@ -101,7 +144,7 @@ def rag_tool_answer(prompt: str, x: int) -> Tuple[Any, str]:
         "top_list": lambda: toplist_processor.decide_and_respond(prompt),
         "Orders": lambda: delfi_orders(prompt),
         "Promotion": lambda: actions_processor.decide_and_respond(prompt),
-        "Knjizare": lambda: bookstore_processor.return_all(),
+        "Knjizare": lambda: bookstore_processor.search(prompt),
         "Calendly": lambda: positive_calendly(prompt),
     }
 
@@ -113,8 +156,7 @@ def rag_tool_answer(prompt: str, x: int) -> Tuple[Any, str]:
 
 def fetch_or_fallback(question):
     # Initialize TopListFetcher
-    api_url = 'https://delfi.rs/api/pc-frontend-api/toplists'
-    fetcher = TopListFetcher(api_url)
+    fetcher = TopListFetcher(TOPLISTS_URL)
     
     # Try to get an answer
     answer = fetcher.decide_and_respond(question)
@@ -132,70 +174,165 @@ def positive_calendly(y_no):
     return f"Naravno, sastanak sa nama možete zakazati na sledećem linku: <a href='{calendly_url}' target='_blank' class='custom-link'>ovde</a>"
 
 
+class BookstoreDirectory:
+    """
+    A searchable directory of bookstores built once per refresh of the bookstores feed.
+
+    Bookstore names and cities are tokenized without diacritics. A question word matches a store word only when
+    the two are equal, or, for the words right after a location preposition ("u Novom Sadu", "kod Beograda"),
+    when the question word is an inflected form of the store word. So "radno vreme knjižare u Novom Sadu" or
+    "Delfi SKC" resolve to the matching stores with a few dictionary lookups, while words like "nisu" or "radno"
+    elsewhere in the question do not match Niš or a store whose name starts with "rad".
+    Words shared by most stores (e.g. "delfi", "knjižara") are not indexed.
+    """
+
+    # Prepositions followed by a place, and how many words after them are matched as inflected forms
+    LOCATION_PREPOSITIONS = {'u', 'na', 'iz', 'kod', 'do', 'za', 'pored', 'blizu'}
+    LOCATION_WORDS = 2
+    # Letters an inflected form may add after the stem (beograd -> beogradu, novi -> novom)
+    MAX_SUFFIX = 3
+
+    def __init__(self, data: Dict[str, Any]) -> None:
+        """
+        Builds the directory from the bookstores API response.
+
+        Args:
+            data (Dict[str, Any]): The decoded bookstores API response.
+        """
+        self.stores: List[Dict[str, Any]] = data['data']
+        self.tokens: Dict[str, set] = {}
+        self.stems: Dict[str, set] = {}
+
+        store_tokens = []
+        for bookstore in self.stores:
+            city = bookstore.get('city') or bookstore.get('address', '').split(',')[-1]
+            store_tokens.append(set(re.findall(r"\w+", strip_diacritics(f"{bookstore.get('bookstoreName', '')} {city}"))))
+
+        token_counts: Dict[str, int] = {}
+        for tokens in store_tokens:
+            for token in tokens:
+                token_counts[token] = token_counts.get(token, 0) + 1
+
+        for position, tokens in enumerate(store_tokens):
+            for token in tokens:
+                if len(token) < 3 or (len(self.stores) >= 4 and token_counts[token] > len(self.stores) / 2):
+                    continue
+                self.tokens.setdefault(token, set()).add(position)
+                for stem in self.stems_of(token):
+                    self.stems.setdefault(stem, set()).add(position)
+
+    @staticmethod
+    def stems_of(token: str) -> set:
+        """
+        Returns the stems the inflected forms of a word start with: the word itself, the word without its last
+        letter (novi -> nov) and the word without a fleeting 'a' (kragujevac -> kragujevc, čačak -> čačk).
+        Stems shorter than three letters are left out.
+        """
+        stems = {token, token[:-1]}
+        if len(token) > 3 and token[-2] == 'a':
+            stems.add(token[:-2] + token[-1])
+        return {stem for stem in stems if len(stem) >= 3}
+
+    def location_words(self, words: List[str]) -> set:
+        """
+        Returns the words that follow a location preposition.
+        """
+        return {
+            word
+            for i, preposition in enumerate(words) if preposition in self.LOCATION_PREPOSITIONS
+            for word in words[i + 1:i + 1 + self.LOCATION_WORDS]
+        }
+
+    def search(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Returns the bookstores whose name or city best matches the query.
+
+        Args:
+            query (str): Free text, usually the user question.
+
+        Returns:
+            List[Dict[str, Any]]: The stores matching the most query words, or an empty list if none match.
+        """
+        words = re.findall(r"\w+", strip_diacritics(query))
+        locations = self.location_words(words)
+        scores: Dict[int, int] = {}
+        for word in set(words):
+            matched = set(self.tokens.get(word, ()))
+            if word in locations:
+                for length in range(max(3, len(word) - self.MAX_SUFFIX), len(word) + 1):
+                    matched.update(self.stems.get(word[:length], ()))
+            for position in matched:
+                scores[position] = scores.get(position, 0) + 1
+        if not scores:
+            return []
+        best = max(scores.values())
+        return [self.stores[position] for position in sorted(scores) if scores[position] == best]
+
+    @staticmethod
+    def format(stores: List[Dict[str, Any]]) -> str:
+        """
+        Formats bookstores as one "name: working hours, address" line per store.
+        """
+        return '\n'.join(f"{bookstore['bookstoreName']}: {bookstore['workingHours']}, {bookstore['address']}" for bookstore in stores)
+
+
 class BookstoreSearcher:
     """
     A class to handle searching for bookstores and their working hours by either bookstore name or city.
     
-    The class fetches data from an external API and caches the result to optimize repeated calls. It builds
-    structured lists and dictionaries to support efficient searches and provides methods for searching
-    based on input strings.
+    The bookstore directory is rebuilt by the background catalogue feed refresher whenever the feed is refreshed
+    (hourly by default), so searches never wait on the API and pick up new opening hours.
     """
 
     def __init__(self) -> None:
         """
-        Initializes the BookstoreSearcher class.
-        
-        Currently, this class has no attributes that need to be initialized upon creation.
+        Initializes the BookstoreSearcher class and makes sure the bookstores feed is refreshed in the background.
         """
-        pass
+        register_catalogue_feed("bookstores")
 
     @staticmethod
-    @lru_cache(maxsize=2)
-    def get_bookstore_data() -> dict | None:
+    def get_bookstore_data() -> BookstoreDirectory | None:
         """
-        Fetches bookstore data from the API and caches the result.
-        
-        Uses the Least Recently Used (LRU) caching to store the most recent API result for optimization.
-        Returns the API data if the request is successful, otherwise returns None.
+        Returns the bookstore directory kept fresh by the background feed refresher.
 
         Returns:
         --------
-        dict | None
-            The fetched bookstore data in a dictionary format or None if the API call fails.
+        BookstoreDirectory | None
+            The bookstore directory or None if the feed has not loaded yet.
         """
-        url = "https://delfi.rs/api/bookstores"
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            return response.json()['data']
-        else:
+        return catalogue_feeds.get(BOOKSTORES_URL)
+
+    @classmethod
+    def search(cls, question: str) -> str | None:
+        """
+        Returns only the bookstores matching the bookstore name or city mentioned in the question.
+
+        If the question mentions no known bookstore or city, all bookstores are returned.
+
+        Returns:
+        --------
+        str | None
+            One "name: working hours, address" line per matching bookstore, or None if data is unavailable.
+        """
+        directory = cls.get_bookstore_data()
+        if directory is None:
             return None
+        return directory.format(directory.search(question) or directory.stores)
 
     @classmethod
-    @lru_cache(maxsize=2)
     def return_all(cls) -> str | None:
         """
-        Builds and initializes the required data structures for storing bookstore and city information.
-        
-        This method:
-        - Fetches bookstore data.
-        - Extracts relevant information: bookstore names, working hours, and addresses.
-        - Formats the result into a structured string of bookstores, their working hours, and addresses.
+        Returns all bookstores, their working hours and addresses.
 
         Returns:
         --------
         str | None
             A formatted string listing all bookstores, their working hours, and addresses, or None if data is unavailable.
         """
-        # Call get_bookstore_data() directly from the class using cls
-        data = cls.get_bookstore_data()
-        if data is None:
+        directory = cls.get_bookstore_data()
+        if directory is None:
             return None
-
-        a, b, c = zip(*[(bookstore['bookstoreName'], bookstore['workingHours'], bookstore['address']) for bookstore in data])
-        result_string = '\n'.join(f"{name}: {hours}, {address}" for name, hours, address in zip(a, b, c))
-
-        return result_string
+        return directory.format(directory.stores)
 
 
 class GraphQueryProcessor:
@@ -316,6 +453,7 @@ class GraphQueryProcessor:
                 {"role": "user", "content": prompt}
             ]
         )
+        usage_collector.chat(response, "cypher")
         cypher_query = response.choices[0].message.content.strip()
 
         # Uklanjanje nepotrebnog teksta oko upita
@@ -329,24 +467,8 @@ class GraphQueryProcessor:
         return cypher_query
 
     def get_descriptions_from_pinecone(self, ids):
-        # print(f"IDs: {ids}")
-        # Initialize Pinecone
-        index = connect_to_pinecone(x = 0)
-
-        # Fetch the vectors by IDs
-        results = index.fetch(ids=ids, namespace=self.namespace)
-        descriptions = {}
-
-        for id in ids:
-            if id in results['vectors']:
-                vector_data = results['vectors'][id]
-                if 'metadata' in vector_data:
-                    descriptions[id] = vector_data['metadata'].get('text', 'No description available')
-                else:
-                    descriptions[id] = 'Metadata not found in vector data.'
-            else:
-                descriptions[id] = 'Nemamo opis za ovaj artikal.'
-        return descriptions
+        # Opisi se citaju iz lokalnog skladista, Pinecone se poziva samo za id-jeve kojih nema
+        return description_store().get_many(ids)
 
     def combine_data(self, book_data, descriptions):
         combined_data = []
@@ -376,6 +498,7 @@ class GraphQueryProcessor:
                 {"role": "user", "content": input_text}
             ]
         )
+        usage_collector.chat(response, "graph_answer")
         return response.choices[0].message.content.strip()
 
     def process_question(self, question):
@@ -391,9 +514,14 @@ class GraphQueryProcessor:
                 if not oldProductIds:
                     return "No matching books found."
 
-                api_podaci = delfi_api_products(oldProductIds)
+                # Upit nad grafom vec filtrira knjige na stanju (quantity > 0), pa se iz API-ja koriste samo
+                # URL i cene; stanje iz kesa se ne prikazuje, ali i dalje odlucuje koje knjige se vracaju
+                api_podaci = delfi_api_products(oldProductIds, groups=('static', 'price'))
                 # print(f"API Data: {api_podaci}")
-                products_info_map = {int(product['id']): product for product in api_podaci}
+                products_info_map = {
+                    int(product['id']): {key: value for key, value in product.items() if key != 'lager'}
+                    for product in api_podaci
+                }
                 filtered_book_data = []
 
                 # Iteracija kroz book_data i dodavanje relevantnih podataka
@@ -420,6 +548,10 @@ class GraphQueryProcessor:
             return "Invalid Cypher query."
         
 
+# Zajednicki pool za product API i Neo4j upite iz pineg, ogranicava broj istovremenih upita u celom procesu
+pineg_executor = ThreadPoolExecutor(max_workers=int(getenv("PINEG_MAX_WORKERS", "8")), thread_name_prefix="pineg")
+
+
 def pineg(pitanje):
     """
     Processes a user's question, performs a dense vector search in Pinecone, fetches relevant data from an API and Neo4j, 
@@ -440,8 +572,11 @@ def pineg(pitanje):
     5. Combines book data retrieved from Neo4j and API data using `combine_data()`.
     6. Displays the final combined data in a user-friendly format using `display_results()`.
     
-    The function performs error handling to avoid processing duplicate entries, limits the number of API calls to a maximum 
-    of three, and returns a list of combined results with enriched book information.
+    The lookups of all candidates run concurrently on `pineg_executor`, a thread pool shared by all sessions
+    (`PINEG_MAX_WORKERS`, default 8). Each lookup queries Neo4j only after the product API returned the product, and
+    not at all once enough results are in. A lookup that finds its product out of stock starts the second search and
+    the lookups of its results right away, on the same pool. Results are still taken in search order: the first three
+    in-stock products, deduplicated by sec_id, are returned and the remaining lookups are cancelled.
     """
     index = connect_to_pinecone(x=0)
     driver = connect_to_neo4j()
@@ -484,13 +619,7 @@ def pineg(pitanje):
             return book_data
 
     def get_embedding(text, model="text-embedding-3-large"):
-        response = client.embeddings.create(
-            input=[text],
-            model=model
-        ).data[0].embedding
-        # print(f"Embedding Response: {response}")
-        
-        return response
+        return embed_text(text, model)
 
     def dense_query(query, top_k, filter, namespace="opisi"):
         # Get embedding for the query
@@ -505,7 +634,10 @@ def pineg(pitanje):
             'namespace': namespace
         }
 
-        response = index.query(**query_params)
+        response = single_flight("pinecone").do(
+            ('pineg', query, top_k, json.dumps(filter, sort_keys=True), namespace),
+            lambda: index.query(**query_params)
+        )
 
         matches = response.to_dict().get('matches', [])
         # print(f"Matches: {matches}")
@@ -621,226 +753,303 @@ def pineg(pitanje):
 
         return x
 
+    started = perf_counter()
     search_results = search_pinecone(pitanje)
     print(f"Search Results: {search_results}")
+    # Opisi koji su vec stigli uz rezultate pretrage idu u lokalno skladiste
+    description_store().put_many({str(result['sec_id']): result['text'] for result in search_results})
+
+    # Jedinstveni kandidati, redosled iz Pinecone pretrage je sacuvan
+    candidates = {}
+    for result in search_results:
+        candidates.setdefault(result['sec_id'], result)
+    candidates = list(candidates.values())
 
     combined_results = []
     duplicate_filter = []
-    counter = 0
+    max_results = 3
+
+    enough = threading.Event()
+    pending = []
+
+    def lookup(sec_id):
+        # Neo4j upit ide tek kada API vrati proizvod, i ne ide kada vec imamo dovoljno rezultata
+        if enough.is_set():
+            return [], []
+        api_data = delfi_api_products([sec_id])
+        if not api_data or enough.is_set():
+            return api_data, []
+        return api_data, run_cypher_query(sec_id)
+
+    def lookup_candidate(result):
+        # Kada proizvoda nema na stanju, druga pretraga i upiti za njene rezultate krecu odmah, ne cekaju redosled
+        api_data, data = lookup(result['sec_id'])
+        if api_data or enough.is_set():
+            return api_data, data, []
+        futures_2 = [
+            (result_2, pineg_executor.submit(lookup, result_2['sec_id']))
+            for result_2 in search_pinecone_second_set(result['title'], result['authors'])
+        ]
+        pending.extend(future_2 for _, future_2 in futures_2)
+        return api_data, data, futures_2
 
-    for result in search_results:
-        print(f"Result: {result}")
-        if result['sec_id'] in duplicate_filter:
-            print(f"Duplicate Filter: {duplicate_filter}")
-            continue
-        else:
-            if counter < 3:
-                api_data = delfi_api_products([result['sec_id']])
-                # print(f"API Data: {api_data}")
-                if api_data:
-                    counter += 1
-                    print(f"Counter: {counter}")
-                else:
-                    print(f"API Data is empty for sec_id: {result['sec_id']}")
-                    title = result['title']
-                    authors = result['authors']
-                    search_results_2 = search_pinecone_second_set(title, authors)
-                    for result_2 in search_results_2:
-                        if result_2['sec_id'] in duplicate_filter:
-                            continue
-                        else:
-                            api_data = delfi_api_products([result_2['sec_id']])
-                            # print(f"API Data 2: {api_data}")
-                            if api_data:
-                                counter += 1
-                                # print(f"Counter 2: {counter}")
-                                data = run_cypher_query(result_2['sec_id'])
-                                # print(f"Data: {data}")
-
-                                combined_data = combine_data(api_data, data, result_2['text'])
-                                # print(f"Combined Data: {combined_data}")
-                                duplicate_filter.append(result_2['sec_id'])
-                                
-                                combined_results.append(combined_data)
-                            
-                                # display_results(combined_data)
-                                break
-
-                    continue # Preskoči ako je api_data prazan
-
-                data = run_cypher_query(result['sec_id'])
-                # print(f"Data: {data}")
-
-                combined_data = combine_data(api_data, data, result['text'])
-                # print(f"Combined Data: {combined_data}")
-                duplicate_filter.append(result['sec_id'])
-                # print(f"Duplicate Filter: {duplicate_filter}")
-                
-                combined_results.extend(combined_data)
-                # print(f"Combined Results: {combined_results}")
-                
-                
-                # return display_results(combined_data)
-            else:
+    # Upiti za sve kandidate krecu odjednom
+    futures = {c['sec_id']: pineg_executor.submit(lookup_candidate, c) for c in candidates}
+    pending.extend(futures.values())
+    try:
+        for result in candidates:
+            if len(duplicate_filter) >= max_results:
+                # Kada imamo dovoljno rezultata, preostali upiti ne idu u Neo4j
+                enough.set()
                 break
-    display_results(combined_data)
-    # print(f"Combined Results: {combined_results}")
-    # print(f"Display Results: {display_results(combined_results)}")
+            if result['sec_id'] in duplicate_filter:
+                print(f"Duplicate Filter: {duplicate_filter}")
+                continue
+
+            api_data, data, futures_2 = futures[result['sec_id']].result()
+            if api_data:
+                combined_results.extend(combine_data(api_data, data, result['text']))
+                duplicate_filter.append(result['sec_id'])
+                print(f"Counter: {len(duplicate_filter)}")
+                continue
+
+            print(f"API Data is empty for sec_id: {result['sec_id']}")
+            for result_2, future_2 in futures_2:
+                if result_2['sec_id'] in duplicate_filter:
+                    continue
+                api_data, data = future_2.result()
+                if api_data:
+                    combined_results.extend(combine_data(api_data, data, result_2['text']))
+                    duplicate_filter.append(result_2['sec_id'])
+                    break
+    finally:
+        # Preostali upiti se ne cekaju
+        enough.set()
+        for future in pending:
+            future.cancel()
+
+    display_results(combined_results)
+    print(f"pineg: {len(combined_results)} results in {perf_counter() - started:.2f}s")
     return combined_results
 
 
-class TopListFetcher:
-    def __init__(self, api_url):
+TOPLIST_METHODS = ["getFirstItems", "fetchTopListByCategory", "fetchTopListByGenre", "fetchTopListByAuthor"]
+
+
+@lru_cache(maxsize=1024)
+def decide_toplist_method(
+    question: str,
+    vocabulary: Tuple[Tuple[str, ...], Tuple[str, ...], Tuple[str, ...]]
+) -> Tuple[str, str]:
+    """
+    Chooses the top-list method and its argument for a normalized user question.
+
+    An author from the top list that is mentioned by full name is recognized locally, without a model call.
+    Everything else is decided by a single gpt-4o-mini call with structured output that returns the method
+    together with the category, genre or author to filter by. The prompt lists the actual category, genre and
+    author vocabulary of the current top list. Results are cached per (question, vocabulary).
+
+    Args:
+        question (str): The normalized user question.
+        vocabulary (Tuple[Tuple[str, ...], Tuple[str, ...], Tuple[str, ...]]): Lowercase categories, genres and
+            authors present on the top list.
+
+    Returns:
+        Tuple[str, str]: The method name (one of `TOPLIST_METHODS`) and its argument.
+    """
+    categories, genres, authors = vocabulary
+
+    def padded_words(text: str) -> str:
+        return " " + " ".join(re.findall(r"\w+", strip_diacritics(text))) + " "
+
+    padded_question = padded_words(question)
+    for author in authors:
+        if padded_words(author) in padded_question:
+            return "fetchTopListByAuthor", author
+
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        temperature=0.0,
+        messages=[
+            {
+                "role": "system",
+                "content": (
+                    "The user is asking about the top list of products. Choose the method that answers the question and its argument."
+                    "Methods: getFirstItems (the most popular products in general), fetchTopListByCategory (products of one category), "
+                    "fetchTopListByGenre (products of one genre), fetchTopListByAuthor (products of one author)."
+                    f"Categories on the top list: {', '.join(categories)}. If the user asks about a category which can't be found in this list, it's probably a genre."
+                    f"Genres on the top list: {', '.join(genres)}."
+                    f"Authors on the top list: {', '.join(authors)}."
+                    "For a category, return the category name from the list in its nominative form."
+                    "For an author, return the author name as written in the list."
+                    "For a genre, return a search term contained in the matching genre names from the list. Use the base form of the word so both singular and plural forms match, "
+                    "and use Serbian diacritics even if the user omitted them. For getFirstItems, return an empty argument."
+
+                    "Example user question: 'koje su najpopularnije knjige.' "
+                    "Method: getFirstItems, argument: ''"
+
+                    "Example user question: 'daj mi preporuku za domace pisce' "
+                    "Method: fetchTopListByGenre, argument: 'domaći pisci'"
+
+                    "Example user question: 'koje E-knjige su na top listi' "
+                    "Method: fetchTopListByGenre, argument: 'e-knjig'"
+
+                    "Example user question: 'preporuci mi neke knjige za decu' "
+                    "Method: fetchTopListByGenre, argument: 'knjige za decu'"
+
+                    "Example user question: 'daj mi preporuku za neke nagradjene knjige' "
+                    "Method: fetchTopListByGenre, argument: 'nagrađen'"
+
+                    "Example user question: 'koje autobiografije su na top listi' "
+                    "Method: fetchTopListByGenre, argument: 'biografij'"
+                )
+            },
+            {"role": "user", "content": question}
+        ],
+        response_format={
+            "type": "json_schema",
+            "json_schema": {
+                "name": "toplist_decision",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "method": {"type": "string", "enum": TOPLIST_METHODS},
+                        "argument": {"type": "string"}
+                    },
+                    "required": ["method", "argument"],
+                    "additionalProperties": False
+                }
+            }
+        },
+    )
+    usage_collector.chat(response, "toplists")
+    decision = json.loads(response.choices[0].message.content)
+    return decision["method"], decision["argument"].strip()
+
+
+class TopListSnapshot:
+    """
+    Jedan parsiran snimak "toplists" feed-a sa unapred izračunatim indeksima.
+
+    Svaki proizvod se parsira samo jednom u kompaktan zapis, a indeksi po kategoriji, žanru i autoru
+    (ključevi su malim slovima) pretvaraju upite nad top listom u pretragu rečnika.
+    """
+
+    def __init__(self, data: Dict[str, Any]) -> None:
         """
-        Inicijalizuje instancu klase sa zadatim URL-om API-ja.
+        Parsira sirove podatke sa API-ja i gradi indekse.
 
         Args:
-            api_url (str): URL API-ja odakle će se preuzimati podaci.
+            data (dict): Sirovi podaci preuzeti sa API-ja "toplists" u JSON formatu.
         """
-        self.api_url = api_url
-        self.today = datetime.now()
-        self.unique_actions = set()
+        self.items: List[Dict[str, Any]] = []
+        self.ids: List[Any] = []
+        self.by_category: Dict[str, List[int]] = {}
+        self.by_genre: Dict[str, List[int]] = {}
+        self.by_author: Dict[str, List[int]] = {}
+        self._genre_matches: Dict[str, List[int]] = {}
+
+        for section in data.get('data', {}).get('sections', []):
+            for product in section.get('content', {}).get('products', []):
+                position = len(self.items)
+                authors = [author.get('authorName', 'Nepoznat autor') for author in product.get('authors', [])]
+                genres = [genre.get('genreName', 'Nepoznat žanr') for genre in product.get('genres', [])]
+                category = product.get('category', '')
+                oldProductId = product.get('oldProductId', 'Nepoznat ID')
+
+                self.items.append({
+                    'title': product.get('title', 'Nema naslova'),
+                    'authors': authors,
+                    'genres': genres,
+                    'eBook': product.get('eBook'),
+                    'url': f"https://delfi.rs/{category.lower().replace(' ', '_')}/{oldProductId}"
+                })
+                self.ids.append(oldProductId)
 
-    def fetch_data(self):
-        """
-        Preuzima podatke sa API-ja.
+                self.by_category.setdefault(category.lower(), []).append(position)
+                for genre in dict.fromkeys(genre.lower() for genre in genres):
+                    self.by_genre.setdefault(genre, []).append(position)
+                for author in dict.fromkeys(author.lower() for author in authors):
+                    self.by_author.setdefault(author, []).append(position)
 
-        Returns:
-            dict: Sirovi podaci preuzeti sa API-ja u JSON formatu.
-            None: Vraća None ako dođe do greške prilikom preuzimanja podataka.
-        """
-        try:
-            response = requests.get(self.api_url)
-            response.raise_for_status()
-            data = response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"Greška pri povezivanju sa API-jem: {e}")
-            data = None
-        return data
+        # Rečnik kategorija, žanrova i autora koji se prosleđuje odluci o metodi
+        self.vocabulary: Tuple[Tuple[str, ...], Tuple[str, ...], Tuple[str, ...]] = (
+            tuple(sorted(self.by_category)), tuple(sorted(self.by_genre)), tuple(sorted(self.by_author))
+        )
 
-    def get_first_items(self):
-        """
-    Pribavlja i prikazuje prvih šest proizvoda iz API-ja "toplists".
+    def _items(self, positions: List[int]) -> List[Dict[str, Any]]:
+        # Vraćamo kopije kako pozivaoci ne bi menjali snimak
+        return [dict(self.items[position]) for position in positions]
 
-    Ova funkcija šalje GET zahtev ka API-ju i vraća najviše šest artikala iz sekcija
-    sadržanih u odgovoru. Artikli su sortirani po vrednosti `id` od najveće ka najmanjoj.
-    Za svaki artikal prikazuje sledeće informacije:
-    - Naslov
-    - Autor(i)
-    - Žanr(ovi)
-    - eBook
-    - Link ka stranici artikla
-    
-    Napomena: `id` polje se koristi za sortiranje, ali se uklanja iz rezultata pre vraćanja liste.
+    def first_items(self, limit: int = 6) -> List[Dict[str, Any]]:
+        """
+        Vraća prvih `limit` artikala, sortiranih po `id` vrednosti od najveće ka najmanjoj.
+        """
+        positions = sorted(range(min(limit, len(self.items))), key=lambda position: int(self.ids[position]), reverse=True)
+        return self._items(positions)
 
-    Parameters:
-    -----------
-    self : object
-        Referenca na instancu klase (ako je metoda deo klase).
-
-    Returns: 
-    --------
-    list of dict
-        Lista rečnika, gde svaki rečnik sadrži sledeće ključeve:
-        - 'title': Naslov artikla (str)
-        - 'authors': Lista autora (list of str)
-        - 'genres': Lista žanrova (list of str)
-        - 'eBook': Informacija o dostupnosti u eBook formatu (bool)
-        - 'url': Link ka stranici artikla (str)
-    """
-        # URL API-ja koji koristite
-        api_url = "https://delfi.rs/api/pc-frontend-api/toplists"
+    def items_by_category(self, category: str) -> List[Dict[str, Any]]:
+        """
+        Vraća artikle čija kategorija odgovara zadatoj (bez obzira na velika i mala slova).
+        """
+        return self._items(self.by_category.get(category.lower(), []))
 
-        try:
-            # Slanje GET zahteva prema API-ju
-            response = requests.get(api_url)
-            response.raise_for_status()  # Provera uspešnosti zahteva
+    def items_by_genre(self, genre: str) -> List[Dict[str, Any]]:
+        """
+        Vraća artikle kod kojih bar jedan žanr sadrži zadati tekst (npr. "biografij").
 
-            print("Konekcija sa API-jem uspešno ostvarena!")
-            
-            # Parsiranje odgovora iz JSON formata
-            data = response.json()
+        Podudaranje po delu reči se računa jednom nad rečnikom žanrova i pamti za naredne upite.
+        """
+        genre = genre.lower()
+        positions = self._genre_matches.get(genre)
+        if positions is None:
+            matched = set()
+            for name, genre_positions in self.by_genre.items():
+                if genre in name:
+                    matched.update(genre_positions)
+            positions = self._genre_matches[genre] = sorted(matched)
+        return self._items(positions)
+
+    def items_by_author(self, author: str) -> List[Dict[str, Any]]:
+        """
+        Vraća artikle zadatog autora (bez obzira na velika i mala slova).
+        """
+        return self._items(self.by_author.get(author.lower(), []))
 
-            items = []  # Lista za skladištenje rečnika artikala
-            item_count = 0  # Brojač za artikle
-            
-            for item in data.get('data', {}).get('sections', []):
-                # print("Iteriramo kroz sekciju:", item)  # Dodato za proveru
-                for product in item.get('content', {}).get('products', []):
-                    # print("Pronađen proizvod u kategoriji:", category)
-                    title = product.get('title', 'Nema naslova')
-                    authors = [author.get('authorName', 'Nepoznat autor') for author in product.get('authors', [])]
-                    genres = [genre.get('genreName', 'Nepoznat žanr') for genre in product.get('genres', [])]
-                    eBook = product.get('eBook')
-                    category = product['category'].lower().replace(' ', '_')
-                    oldProductId = product.get('oldProductId', 'Nepoznat ID')
-                    url = f"https://delfi.rs/{category}/{oldProductId}"
-                    # opis = product.get('description')
-                    
-                    # Kreiranje rečnika za artikal
-                    item_dict = {
-                        'title': title,
-                        'authors': authors,
-                        'genres': genres,
-                        'eBook': eBook,
-                        'url': url,
-                        'id': oldProductId
-                    }
 
-                    # Dodavanje rečnika u listu
-                    items.append(item_dict)
-
-                    # Prikaz naslova i autora
-                    print(f"Naslov: {title}")
-                    for author in authors:
-                        print(f"Autor: {author}")
-                    for genre in genres:
-                        print(f"Žanr: {genre}")
-                    print(f"eBook: {eBook}")
-                    print(f"Link: {url}")
-                    # print(f"Opis: {opis}")
-                    print()
-
-                    item_count += 1
-                    if item_count >= 6:
-                        break
-
-                if item_count >= 6:
-                    break
+class TopListFetcher:
+    def __init__(self, api_url):
+        """
+        Inicijalizuje instancu klase sa zadatim URL-om API-ja.
 
-            # Sortiranje artikala po `id` vrednosti od najvećeg ka manjem
-            items = sorted(items, key=lambda x: int(x['id']), reverse=True)
+        Top lista se osvežava u pozadini (vidi `krembot_feeds.FeedRefresher`), pa upiti nikada ne čekaju
+        na preuzimanje podataka sa API-ja.
 
-            # Brisanje ključa 'id' iz svakog rečnika, da smanjimo šum u odgovoru
-            for item in items:
-                del item['id']
+        Args:
+            api_url (str): URL API-ja odakle će se preuzimati podaci.
+        """
+        self.api_url = api_url
+        self.today = datetime.now()
+        self.unique_actions = set()
+        register_catalogue_feed("toplists", api_url)
 
-            return items
-        
-        except requests.exceptions.RequestException as e:
-            print(f"Došlo je do greške prilikom povezivanja sa API-jem: {e}")
-            return []
+    def snapshot(self) -> Optional[TopListSnapshot]:
+        """
+        Vraća poslednji snimak top liste koji je osvežen u pozadini.
 
-    def get_items_by_category(self, category):
+        Returns:
+            TopListSnapshot: Parsiran snimak top liste.
+            None: Ako podaci još nikada nisu uspešno preuzeti.
         """
-        Pribavlja i vraća listu proizvoda iz određene kategorije sa API-ja "toplists".
+        return catalogue_feeds.get(self.api_url)
 
-        Ova funkcija šalje GET zahtev ka API-ju i vraća sve artikle koji pripadaju zadatoj kategoriji. 
-        Za svaki artikal vraća sledeće informacije:
-        - Naslov
-        - Autor(i)
-        - Žanr(ovi)
-        - eBook
-        - Link ka stranici artikla
+    def get_first_items(self):
+        """
+        Vraća prvih šest proizvoda sa top liste.
 
-        Parameters:
-        -----------
-        self : object
-            Referenca na instancu klase (ako je metoda deo klase).
-        
-        category : str
-            Ime kategorije za koju se pretražuju artikli (npr. "knjige").
-            Naziv kategorije nije osetljiv na velika i mala slova.
+        Artikli su sortirani po vrednosti `id` od najveće ka najmanjoj. `id` polje se koristi
+        za sortiranje, ali se ne nalazi u rezultatu.
 
         Returns:
         --------
@@ -851,571 +1060,276 @@ class TopListFetcher:
             - 'genres': Lista žanrova (list of str)
             - 'eBook': Informacija o dostupnosti u eBook formatu (bool)
             - 'url': Link ka stranici artikla (str)
-        
-        Raises:
-        -------
-        requests.exceptions.RequestException
-            Ako dođe do greške prilikom slanja zahteva ka API-ju.
         """
-        api_url = "https://delfi.rs/api/pc-frontend-api/toplists"
-        category_name_lower = category.lower()
-        try:
-            # Slanje GET zahteva prema API-ju
-            response = requests.get(api_url)
-            response.raise_for_status()  # Provera uspešnosti zahteva
+        snapshot = self.snapshot()
+        return snapshot.first_items() if snapshot else []
 
-            print("Konekcija sa API-jem uspešno ostvarena!")
-            
-            # Parsiranje odgovora iz JSON formata
-            data = response.json()
+    def get_items_by_category(self, category):
+        """
+        Vraća listu proizvoda sa top liste iz određene kategorije.
 
-            items = []  # Lista za skladištenje rečnika artikala
-            
-            for item in data.get('data', {}).get('sections', []):
-                # print("Iteriramo kroz sekciju:", item)  # Dodato za proveru
-                for product in item.get('content', {}).get('products', []):
-                    # print("Proizvod:", product)  # Dodato za proveru
-                    if product.get('category').lower() == category_name_lower:
-                        # print("Pronađen proizvod u kategoriji:", category)
-                        title = product.get('title', 'Nema naslova')
-                        authors = [author.get('authorName', 'Nepoznat autor') for author in product.get('authors', [])]
-                        genres = [genre.get('genreName', 'Nepoznat žanr') for genre in product.get('genres', [])]
-                        eBook = product.get('eBook')
-                        category = product['category'].lower().replace(' ', '_')
-                        oldProductId = product.get('oldProductId', 'Nepoznat ID')
-                        url = f"https://delfi.rs/{category}/{oldProductId}"
-                        # opis = product.get('description')
-                        
-                        # Kreiranje rečnika za artikal
-                        item_dict = {
-                            'title': title,
-                            'authors': authors,
-                            'genres': genres,
-                            'eBook': eBook,
-                            'url': url
-                        }
+        Parameters:
+        -----------
+        category : str
+            Ime kategorije za koju se pretražuju artikli (npr. "knjiga").
+            Naziv kategorije nije osetljiv na velika i mala slova.
 
-                        # Dodavanje rečnika u listu
-                        items.append(item_dict)
-
-                        # # Prikaz naslova i autora
-                        # print(f"Naslov: {title}")
-                        # for author in authors:
-                        #     print(f"Autor: {author}")
-                        # for genre in genres:
-                        #     print(f"Žanr: {genre}")
-                        # print(f"eBook: {eBook}")
-                        # print(f"Link: {url}")
-                        # # print(f"Opis: {opis}")
-                        # print()
-            return items
-        
-        except requests.exceptions.RequestException as e:
-            print(f"Došlo je do greške prilikom povezivanja sa API-jem: {e}")
-            return []
+        Returns:
+        --------
+        list of dict
+            Lista rečnika sa ključevima 'title', 'authors', 'genres', 'eBook' i 'url'.
+        """
+        snapshot = self.snapshot()
+        return snapshot.items_by_category(category) if snapshot else []
 
     def get_items_by_genre(self, genre):
         """
-        Pribavlja i vraća listu proizvoda iz određene kategorije sa API-ja "toplists".
-
-        Ova funkcija šalje GET zahtev ka API-ju i vraća sve artikle koji pripadaju zadatoj kategoriji. 
-        Za svaki artikal vraća sledeće informacije:
-        - Naslov
-        - Autor(i)
-        - Žanr(ovi)
-        - eBook
-        - Link ka stranici artikla
+        Vraća listu proizvoda sa top liste čiji neki žanr sadrži zadati naziv.
 
         Parameters:
         -----------
-        self : object
-            Referenca na instancu klase (ako je metoda deo klase).
-        
         genre : str
-            Ime žanra za koju se pretražuju artikli (npr. "drama").
+            Ime žanra ili njegov deo za koji se pretražuju artikli (npr. "drama", "biografij").
             Naziv žanra nije osetljiv na velika i mala slova.
 
         Returns:
         --------
         list of dict
-            Lista rečnika, gde svaki rečnik sadrži sledeće ključeve:
-            - 'title': Naslov artikla (str)
-            - 'authors': Lista autora (list of str)
-            - 'genres': Lista žanrova (list of str)
-            - 'eBook': Informacija o dostupnosti u eBook formatu (bool)
-            - 'url': Link ka stranici artikla (str)
-        
-        Raises:
-        -------
-        requests.exceptions.RequestException
-            Ako dođe do greške prilikom slanja zahteva ka API-ju.
+            Lista rečnika sa ključevima 'title', 'authors', 'genres', 'eBook' i 'url'.
         """
+        snapshot = self.snapshot()
+        return snapshot.items_by_genre(genre) if snapshot else []
 
-        api_url = "https://delfi.rs/api/pc-frontend-api/toplists"
-        genre_name_lower = genre.lower()
-        try:
-            # Slanje GET zahteva prema API-ju
-            response = requests.get(api_url)
-            response.raise_for_status()  # Provera uspešnosti zahteva
-
-            print("Konekcija sa API-jem uspešno ostvarena!")
-            
-            # Parsiranje odgovora iz JSON formata
-            data = response.json()
-
-            items = []  # Lista za skladištenje rečnika artikala
-            
-            for item in data.get('data', {}).get('sections', []):
-                # print("Iteriramo kroz sekciju:", item)  # Dodato za proveru
-                for product in item.get('content', {}).get('products', []):
-                    # Lista žanrova
-                    genres = [genre.get('genreName', 'Nepoznat žanr').lower() for genre in product.get('genres', [])]
-                
-                    # Provera da li bilo koji žanr odgovara zadatom
-                    if any(genre_name_lower in g for g in genres):
-                        title = product.get('title', 'Nema naslova')
-                        authors = [author.get('authorName', 'Nepoznat autor') for author in product.get('authors', [])]
-                        genres = [genre.get('genreName', 'Nepoznat žanr') for genre in product.get('genres', [])]
-                        eBook = product.get('eBook')
-                        category = product['category'].lower().replace(' ', '_')
-                        oldProductId = product.get('oldProductId', 'Nepoznat ID')
-                        url = f"https://delfi.rs/{category}/{oldProductId}"
-                        # opis = product.get('description')
-
-                        # Kreiranje rečnika za artikal
-                        item_dict = {
-                            'title': title,
-                            'authors': authors,
-                            'genres': genres,
-                            'eBook': eBook,
-                            'url': url
-                        }
-
-                        # Dodavanje rečnika u listu
-                        items.append(item_dict)
-
-                        # # Prikaz naslova i autora
-                        # print(f"Naslov: {title}")
-                        # for author in authors:
-                        #     print(f"Autor: {author}")
-                        # for genre in genres:
-                        #     print(f"Žanr: {genre}")
-                        # print(f"eBook: {eBook}")
-                        # print(f"Link: {url}")
-                        # # print(f"Opis: {opis}")
-                        # print()
-            return items
-        
-        except requests.exceptions.RequestException as e:
-            print(f"Došlo je do greške prilikom povezivanja sa API-jem: {e}")
-            return []
-        
     def get_items_by_author(self, author):
         """
-        Pribavlja i vraća listu proizvoda iz određene kategorije sa API-ja "toplists".
-
-        Ova funkcija šalje GET zahtev ka API-ju i vraća sve artikle koji pripadaju zadatoj kategoriji. 
-        Za svaki artikal vraća sledeće informacije:
-        - Naslov
-        - Autor(i)
-        - Žanr(ovi)
-        - eBook
-        - Link ka stranici artikla
+        Vraća listu proizvoda sa top liste za zadatog autora.
 
         Parameters:
         -----------
-        self : object
-            Referenca na instancu klase (ako je metoda deo klase).
-        
         author : str
             Ime autora za kog se pretražuju artikli (npr. "Ivo Andrić").
-            Ime autora nije osetljiv na velika i mala slova.
+            Ime autora nije osetljivo na velika i mala slova.
 
         Returns:
         --------
         list of dict
-            Lista rečnika, gde svaki rečnik sadrži sledeće ključeve:
-            - 'title': Naslov artikla (str)
-            - 'authors': Lista autora (list of str)
-            - 'genres': Lista žanrova (list of str)
-            - 'eBook': Informacija o dostupnosti u eBook formatu (bool)
-            - 'url': Link ka stranici artikla (str)
-        
-        Raises:
-        -------
-        requests.exceptions.RequestException
-            Ako dođe do greške prilikom slanja zahteva ka API-ju.
+            Lista rečnika sa ključevima 'title', 'authors', 'genres', 'eBook' i 'url'.
         """
-        api_url = "https://delfi.rs/api/pc-frontend-api/toplists"
-        author_name_lower = author.lower()
-        try:
-            # Slanje GET zahteva prema API-ju
-            response = requests.get(api_url)
-            response.raise_for_status()  # Provera uspešnosti zahteva
+        snapshot = self.snapshot()
+        return snapshot.items_by_author(author) if snapshot else []
 
-            print("Konekcija sa API-jem uspešno ostvarena!")
-            
-            # Parsiranje odgovora iz JSON formata
-            data = response.json()
+    def decide(self, question: str) -> Tuple[str, str]:
+        """
+        Određuje metodu i njen argument za korisnikovo pitanje.
 
-            items = []  # Lista za skladištenje rečnika artikala
-            
-            for item in data.get('data', {}).get('sections', []):
-                # print("Iteriramo kroz sekciju:", item)  # Dodato za proveru
-                for product in item.get('content', {}).get('products', []):
-                    # Lista žanrova
-                    authors = [author.get('authorName', 'Nepoznat autor').lower() for author in product.get('authors', [])]
-                
-                    # Provera da li bilo koji žanr odgovara zadatom
-                    if author_name_lower in authors:
-                        title = product.get('title', 'Nema naslova')
-                        authors = [author.get('authorName', 'Nepoznat autor') for author in product.get('authors', [])]
-                        genres = [genre.get('genreName', 'Nepoznat žanr') for genre in product.get('genres', [])]
-                        eBook = product.get('eBook')
-                        category = product['category'].lower().replace(' ', '_')
-                        oldProductId = product.get('oldProductId', 'Nepoznat ID')
-                        url = f"https://delfi.rs/{category}/{oldProductId}"
-                        # opis = product.get('description')
-                        
-                        # Kreiranje rečnika za artikal
-                        item_dict = {
-                            'title': title,
-                            'authors': authors,
-                            'genres': genres,
-                            'eBook': eBook,
-                            'url': url
-                        }
+        Pitanje se normalizuje (mala slova, bez suvišnih razmaka i interpunkcije na krajevima),
+        a odluka se kešira po normalizovanom pitanju i rečniku trenutne top liste.
 
-                        # Dodavanje rečnika u listu
-                        items.append(item_dict)
-            return items
-        
-        except requests.exceptions.RequestException as e:
-            print(f"Došlo je do greške prilikom povezivanja sa API-jem: {e}")
-            return []
+        Args:
+            question (str): Pitanje korisnika.
+
+        Returns:
+            Tuple[str, str]: Naziv metode i argument (kategorija, žanr ili autor; prazan za getFirstItems).
+        """
+        question_key = " ".join(question.lower().split()).strip(" ?!.")
+        snapshot = self.snapshot()
+        vocabulary = snapshot.vocabulary if snapshot else ((), (), ())
+        return decide_toplist_method(question_key, vocabulary)
 
     def decide_and_respond(self, question):
         """
-        Funkcija koja koristi LLM da odluči koja metoda će se koristiti na osnovu pitanja korisnika.
+        Funkcija koja na osnovu pitanja korisnika bira metodu i vraća odgovarajuće artikle sa top liste.
+
+        Odluka košta najviše jedan poziv malog modela (vidi `decide_toplist_method`).
         """
-        # Ovde koristimo 4o-mini ili drugi LLM
-        openai.api_key = os.getenv("OPENAI_API_KEY")  # Preuzimanje API ključa
-        client = OpenAI()
+        try:
+            decision, argument = self.decide(question)
+        except Exception as e:
+            print(f"Greška pri odlučivanju o metodi: {e}")
+            decision, argument = "Warning: No function was called", ""
 
-        tools = [
-        {
-            "type": "function",
-            "function": {
-                "name": "getFirstItems",
-                "description": "",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "If the user asks for most popular products."
-                    }
-                    },
-                    "required": ["query"],
-                    "additionalProperties": False
-                },
-                "strict": True
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "fetchTopListByCategory",
-                "description": "",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "If the user asks about products by category."
-                    }
-                    },
-                    "required": ["query"],
-                    "additionalProperties": False
-                },
-                "strict": True
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "fetchTopListByGenre",
-                "description": "",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "If the user asks about products by genre."
-                    }
-                    },
-                    "required": ["query"],
-                    "additionalProperties": False
-                },
-                "strict": True
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "fetchTopListByAuthor",
-                "description": "",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "If the user asks about products by the author."
-                    }
-                    },
-                    "required": ["query"],
-                    "additionalProperties": False
-                },
-                "strict": True
-            }
-        }
-        ]
-
-        response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "Your one and only job is to determine the name of the tool that should be used to solve the user query."
-                            "The user is asking about the top list of products. You have 4 tools on your disposal."
-                            "There are 8 categories of products: knjiga, film, muzika, strana knjiga, gift, udžbenik, video igra. If you think the user is asking about category which can't be found in this list, it's probably a genre."
-                            "Do not return any other information."
-
-                            "Here is an example: "
-                            "Example user question: 'koje su najpopularnije knjige.' "
-                            "Tool to use: getFirstItems"
-
-                            "Example user question: 'daj mi preporuku za domace pisce' "
-                            "Tool to use: fetchTopListByGenre"
-
-                            "Example user question: 'koje E-knjige su na top listi' "
-                            "Tool to use: fetchTopListByGenre"
-
-                            "Example user question: 'preporuci mi neke knjige za decu' "
-                            "Tool to use: fetchTopListByGenre"
-                            )
-                    },                  
-                    {"role": "user", "content": question}
-                ],
-                tools=tools,
-                temperature=0.0,
-                tool_choice="required",
-            )
-        assistant_message = response.choices[0].message
-        finish_reason = response.choices[0].finish_reason
-
-        if finish_reason == "tool_calls" or "stop":
-            decision = assistant_message.tool_calls[0].function.name
-        else:
-            decision = "Warning: No function was called"
-
-        print(f"Odluka: {decision}")
+        print(f"Odluka: {decision}, argument: {argument}")
 
         if decision == 'getFirstItems':
             # Korisnik pita za popularne knjige
             return self.get_first_items()
-        
+
         elif decision == 'fetchTopListByCategory':
             # Korisnik pita za knjige po kategoriji
-            prompt_for_category = f"The user question: {question}"
-            category_name_response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                temperature=0.0,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are a helpful assistant. The user is asking about products for a specific category."
-                            "You need to extract the specific category name from the question based on this list: knjiga, film, muzika, strana knjiga, gift, udžbenik, video igra."
-                            "Return only the name of the category in order to the function can filter the data for that category. ensure to handle inflected forms properly by converting all names to their nominative form."
-                        
-                        )
-                    },
-                    {"role": "user", "content": prompt_for_category}
-                ]
-            )
-            category_name = category_name_response.choices[0].message.content.strip()
-            print(f"naziv kategorije: ", category_name)
-            return self.get_items_by_category(category_name)
+            return self.get_items_by_category(argument)
 
         elif decision == 'fetchTopListByGenre':
             # Korisnik pita za knjige po žanru
-            prompt_for_genre = f"The user question: {question}"
-            genre_name_response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                temperature=0.0,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are a helpful assistant. The user is asking about products for a specific genre."
-                            "You need to extract the specific genre name from the question, ensuring to handle inflected forms by converting them to their nominative form."
-                            "Normalize the search term by replacing non-diacritic characters with their diacritic equivalents. For instance, convert 'z' to 'ž', 's' to 'š', 'c' to 'ć' or 'č', and so on, so that the search returns accurate results even when diacritics are omitted."
-                            "Additionally, ensure that the genre contains the base form of the word. For example, if the user asks for 'autobiografije,' the search should be conducted using 'autobiografij' to account for both singular and plural forms."
-                            
-                            "Here is an example: "
-                            "Example user question: 'koje E-knjige su na top listi' "
-                            "Search with: 'e-knjig'"
-
-                            "Example user question: 'daj knjige iz oblasti popularne psihologije' "
-                            "Search with: 'popularna psihologij'"
-
-                            "Example user question: 'daj mi preporuku za neke nagradjene knjige' "
-                            "Search with: 'nagrađen'"
-
-                            "Example user question: 'preporuci mi neke knjige za decu' "
-                            "Search with: 'knjige za decu'"
-
-                            "Example user question: 'daj mi top domacih pisaca' "
-                            "Search with: 'domaći pisci'"
-
-                            "Return only the name of the genre in order to the function can filter the data for that genre."
-                        )
-                    },
-                    {"role": "user", "content": prompt_for_genre}
-                ]
-            )
-            genre_name = genre_name_response.choices[0].message.content.strip()
-            print(f"naziv žanra: ", genre_name)
-            return self.get_items_by_genre(genre_name)
+            return self.get_items_by_genre(argument)
 
         elif decision == 'fetchTopListByAuthor':
             # Korisnik pita za knjige po autoru
-            prompt_for_author = f"The user question: {question}"
-            author_name_response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                temperature=0.0,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant. The user is asking about products for a specific author. You need to extract the author name from the question. Return only the author name in order to the function can filter the data for that author."},
-                    {"role": "user", "content": prompt_for_author}
-                ]
-            )    
-            author_name = author_name_response.choices[0].message.content.strip()
-            print(f"naziv autora: ", author_name)
-            return self.get_items_by_author(author_name)
+            return self.get_items_by_author(argument)
 
         else:
             return {"error": "Nije moguće odlučiti šta korisnik želi."}
 
+ORDER_INFO_URL = 'http://185.22.145.64:3003/api/order-info/{}'
+AKS_TRACKING_URL = 'http://www.akskurir.com/AKSVipService/Pracenje/{}'
+# Slučajevi u kojima odgovor zavisi od statusa pošiljke kod AKS kurirske službe
+AKS_CASES = ('x17', 'x18', 'x19', 'x20')
 
-def delfi_api_orders(order_ids: List[str]) -> Union[List[Dict[str, Any]], str]:
-    """
-    Retrieves and processes information for a list of order IDs.
+# Stanja posle kojih se porudžbina, odnosno pošiljka, više ne menja
+ORDER_FINAL_STATUSES = ('canceled', 'manuallyCanceled', 'returned', 'ebookSuccessfullyAdded')
+AKS_FINAL_STATUSES = ('Posiljka Isporucena', 'Unet povrat')
+
+order_info_cache = OrderStatusCache(
+    "order_info",
+    lambda order: (order[0].get('status') in ORDER_FINAL_STATUSES) if order[0] else None
+)
+aks_status_cache = OrderStatusCache(
+    "aks",
+    lambda status: (
+        bool(status['status_changes']) and status['status_changes'][-1]['StatusOpis'] in AKS_FINAL_STATUSES
+    ) if status['current_status'].get('ErrorCode') == 0 else None
+)
 
-    This function fetches detailed information for each order ID by making API requests to an external service.
-    It parses the JSON responses to extract relevant order details such as ID, type, status, delivery service,
-    delivery time, payment type, package status, and order item type. Additionally, it collects tracking codes
-    and performs an auxiliary search if tracking codes are available.
+
+def get_order_info(order_id: str) -> Dict[str, Any]:
+    """
+    Fetches the raw order information for a single order ID from the order-info API.
 
     Args:
-        order_ids (List[str]): A list of order IDs for which information is to be retrieved.
+        order_id (str): The order ID.
 
     Returns:
-        List[Dict[str, Any]] or str: A list of dictionaries containing the extracted order information. If an error
-                                     occurs during the retrieval process, it returns an error message indicating that
-                                     no orders were found for the given IDs.
+        Dict[str, Any]: The JSON response of the order-info API.
     """
-    def get_order_info(order_id):
-        url = f"http://185.22.145.64:3003/api/order-info/{order_id}"
-        headers = {
-            'x-api-key': getenv("DELFI_ORDER_API_KEY")
-        }
-        return requests.get(url, headers=headers).json()
-    tc = []
-    # Function to parse the JSON response and extract required fields
-    def parse_order_info(json_data: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        Parses the JSON data for a single order and extracts relevant order information.
+    response = http_client.get(
+        'order_info',
+        ORDER_INFO_URL.format(order_id),
+        headers={'x-api-key': getenv("DELFI_ORDER_API_KEY")}
+    )
+    return response.json()
 
-        Args:
-            json_data (Dict[str, Any]): The JSON data received from the order information API.
 
-        Returns:
-            Dict[str, Any]: A dictionary containing extracted order details such as:
-                - id (str): The unique identifier of the order.
-                - type (str): The type of the order.
-                - status (str): The current status of the order.
-                - delivery_service (str): The delivery service used for the order.
-                - delivery_time (str): The estimated delivery time.
-                - payment_type (str): The type of payment used.
-                - package_status (str): The status of the package.
-                - order_item_type (str): The type of items in the order.
-        """
-        order_info = {}
-        if 'orderData' in json_data:
-            data = json_data['orderData']
-            # Extract required fields from the order info
-            order_info['id'] = data.get('id', 'N/A')
-            order_info['type'] = data.get('type', 'N/A')
-            order_info['status'] = data.get('status', 'N/A')
-            order_info['delivery_service'] = data.get('delivery_service', 'N/A')
-            order_info['payment_type'] = data.get('payment_detail', {}).get('payment_type', 'N/A')
-            tc.append(data.get('tracking_codes', None))
-            packages = data.get('packages', [])
-            if packages:
-                package_status = packages[0].get('status', 'N/A')
-                order_info['package_status'] = package_status
-
-        return order_info
-
-    # Main function to get info for a list of order IDs
-    def get_multiple_orders_info(order_ids: List[str]) -> List[Dict[str, Any]]:
-        """
-        Retrieves and processes information for multiple order IDs.
+def parse_order_info(json_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Parses the JSON data for a single order and extracts relevant order information.
 
-        Args:
-            order_ids (List[str]): A list of order IDs for which information is to be retrieved.
+    Args:
+        json_data (Dict[str, Any]): The JSON data received from the order information API.
 
-        Returns:
-            List[Dict[str, Any]]: A list of dictionaries, each containing details of an order, including:
+    Returns:
+        Tuple[Dict[str, Any], Optional[str]]:
+            - A dictionary containing extracted order details such as:
                 - id (str): The unique identifier of the order.
                 - type (str): The type of the order.
                 - status (str): The current status of the order.
                 - delivery_service (str): The delivery service used for the order.
-                - delivery_time (str): The estimated delivery time.
                 - payment_type (str): The type of payment used.
                 - package_status (str): The status of the package.
-                - order_item_type (str): The type of items in the order.
-            If an error occurs during retrieval, the list may contain an error message string.
-        """
-        orders_info = []
-        for order_id in order_ids:
-            json_data = get_order_info(order_id)
-            order_info = parse_order_info(json_data)
-            if order_info:
-                orders_info.append(order_info)
-        return orders_info
+            - The comma separated tracking codes of the order, if any.
+    """
+    order_info = {}
+    tracking_codes = None
+    if 'orderData' in json_data:
+        data = json_data['orderData']
+        # Extract required fields from the order info
+        order_info['id'] = data.get('id', 'N/A')
+        order_info['type'] = data.get('type', 'N/A')
+        order_info['status'] = data.get('status', 'N/A')
+        order_info['delivery_service'] = data.get('delivery_service', 'N/A')
+        order_info['payment_type'] = data.get('payment_detail', {}).get('payment_type', 'N/A')
+        tracking_codes = data.get('tracking_codes', None)
+        packages = data.get('packages', [])
+        if packages:
+            package_status = packages[0].get('status', 'N/A')
+            order_info['package_status'] = package_status
+
+    return order_info, tracking_codes
+
+
+def lookup_order(order_id: str) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Returns the parsed order information and tracking codes of an order, served from the order status cache
+    while they are fresh.
 
-    # Retrieve order information for all provided order IDs
-    try:
-        orders_info = get_multiple_orders_info(order_ids)
-    except Exception as e:
-        print(f"Error retrieving order information: {e}")
-        orders_info = "No orders found for the given IDs."
+    Args:
+        order_id (str): The order ID.
+
+    Returns:
+        Tuple[Dict[str, Any], Optional[str]]: The result of parse_order_info for the order.
+    """
+    return order_info_cache.get(order_id, lambda previous: parse_order_info(get_order_info(order_id)))
 
-    final_output = delfi_orders_reply(orders_info, tc)
 
-    final_output = delfi_orders_reply(orders_info, tc)
+def delfi_api_orders(order_ids: List[str]) -> Union[List[Dict[str, Any]], str]:
+    """
+    Retrieves and processes information for a list of order IDs.
+
+    Order information for all (deduplicated) order IDs is fetched concurrently. As soon as an order with tracking
+    codes arrives, its AKS courier status is fetched in the background, so the courier lookup overlaps with the
+    remaining order lookups. Everything has to finish within 'ORDER_LOOKUP_DEADLINE' seconds (default 12);
+    orders or courier statuses that are slower than that are left out and the reply is built from what arrived.
+
+    Args:
+        order_ids (List[str]): A list of order IDs for which information is to be retrieved.
+
+    Returns:
+        List[Dict[str, Any]] or str: A list of dictionaries containing the extracted order information, or the
+                                     message to forward to the user. If no order could be retrieved, it returns
+                                     an error message indicating that no orders were found for the given IDs.
+    """
+    order_ids = list(dict.fromkeys(str(order_id) for order_id in order_ids))
+    deadline = perf_counter() + float(getenv("ORDER_LOOKUP_DEADLINE", "12"))
+    orders, tracking_codes, aks_futures = {}, {}, {}
+
+    executor = ThreadPoolExecutor(max_workers=int(getenv("ORDER_API_MAX_WORKERS", "8")))
+    try:
+        info_futures = {executor.submit(lookup_order, order_id): order_id for order_id in order_ids}
+        try:
+            for future in as_completed(info_futures, timeout=max(0, deadline - perf_counter())):
+                order_id = info_futures[future]
+                try:
+                    orders[order_id], tracking_codes[order_id] = future.result()
+                except Exception as e:
+                    print(f"Error retrieving order information for {order_id}: {e}")
+                    continue
+                if tracking_codes[order_id]:
+                    # Za odgovor je bitan samo prvi kod za praćenje
+                    aks_futures[order_id] = executor.submit(get_aks_status, tracking_codes[order_id].split(",")[0].strip())
+        except TimeoutError:
+            print(f"Order lookup deadline reached, {len(orders)} of {len(order_ids)} orders retrieved")
+
+        orders_info = [orders[order_id] for order_id in order_ids if orders.get(order_id)]
+        if not orders_info:
+            return "No orders found for the given IDs."
+
+        tracking_status = None
+        if delfi_check_which_case(orders_info[0]) in AKS_CASES:
+            tracked = next((order_id for order_id in order_ids if tracking_codes.get(order_id)), None)
+            if tracked in aks_futures:
+                try:
+                    tracking_status = aks_futures[tracked].result(timeout=max(0, deadline - perf_counter()))
+                except TimeoutError:
+                    print(f"AKS tracking lookup for order {tracked} missed the deadline")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    final_output = delfi_orders_reply(orders_info, tracking_status)
     if final_output.strip() == "":
         return orders_info
     else:
         return f"Prosledi naredni tekst korisniku (nemoj dodavati nikakve druge info): {final_output}" 
 
 
-def delfi_orders_reply(orders_info: Union[List[Dict[str, Any]], str], tc: List) -> str:
+def delfi_orders_reply(orders_info: List[Dict[str, Any]], tracking_status: Optional[Dict[str, Any]] = None) -> str:
     """
     Maps the values of the order details to a human-readable message.
+
+    Args:
+        orders_info (List[Dict[str, Any]]): The parsed order information; the reply is based on the first order.
+        tracking_status (Optional[Dict[str, Any]], optional): The AKS courier status of the order's first tracking
+                                                              code, if it was retrieved in time.
+
+    Returns:
+        str: The message for the user, or an empty string if there is no predefined message for the case.
     """
     def check_if_working_hours():
         belgrade_timezone = pytz.timezone('Europe/Belgrade')
@@ -1430,12 +1344,12 @@ def delfi_orders_reply(orders_info: Union[List[Dict[str, Any]], str], tc: List)
             return False
 
 
-    def aks_odgovori(orders_dict):
+    def aks_odgovori(order_status):
         def extract_timestamp(date_string):
             timestamp = int(date_string[6:-2]) / 1000  # convert milliseconds to seconds
             return datetime.fromtimestamp(timestamp)
 
-        sorted_status_changes = sorted(orders_dict[0]['status_changes'], key=lambda x: extract_timestamp(x['Vreme']))
+        sorted_status_changes = sorted(order_status.get('status_changes', []), key=lambda x: extract_timestamp(x['Vreme']))
 
         try:
             most_recent_status = sorted_status_changes[-1]['StatusOpis']
@@ -1542,19 +1456,9 @@ def delfi_orders_reply(orders_info: Union[List[Dict[str, Any]], str], tc: List)
         Ona je otkazana pošto nismo dobili povratnu informaciju da li želite da se pošalje ponovo. Molimo Vas da ponovite porudžbinu kako bismo je obradili i poslali.
         """
 
-    elif slucaj in ['x17', 'x18', 'x19', 'x20']:
-        reply0 = []
-        tc = [x for x in tc if x is not None]
-        if len(tc) > 0:
-            if "," in tc[0]:
-                tc = tc[0].split(",")
-                for i in range(len(tc)):
-                    reply0.append(delfi_api_aks([tc[i]]))
-            else:
-                reply0.append(delfi_api_aks(tc))
-        print(4444444444, reply0[0])
-        reply = aks_odgovori(reply0[0])
-        print(333333333333, reply)
+    elif slucaj in AKS_CASES:
+        if tracking_status is not None:
+            reply = aks_odgovori(tracking_status)
 
 
     elif slucaj == 'x21':
@@ -1571,423 +1475,6 @@ def delfi_orders_reply(orders_info: Union[List[Dict[str, Any]], str], tc: List)
     return reply
 
 
-def delfi_check_which_case(order_info):
-    # x1
-    x1 = {
-        'type': 'standard',
-        'status': 'finished',
-        'delivery_service': 'DEFAULT',
-        'payment_type': 'ON_DELIVERY',
-        'package_status': 'WAITING_FOR_EXPORT'
-    }
-    # x2
-    x2 = {
-        'type': 'standard',
-        'status': 'finished',
-        'delivery_service': 'DEFAULT',
-        'payment_type': 'ON_DELIVERY',
-        'package_status': 'WAITING_FOR_MP99'
-    }
-    # x3
-    x3 = {
-        'type': 'standard',
-        'status': 'finished',
-        'delivery_service': 'DEFAULT',
-        'payment_type': 'ON_DELIVERY',
-        'package_status': 'EXPORTED_TO_MP99'
-    }
-    # x4
-    x4 = {
-        'type': 'standard',
-        'status': 'finished',
-        'delivery_service': 'DEFAULT',
-        'payment_type': 'ON_DELIVERY',
-        'package_status': 'EXPORTED'
-    }
-    # x5
-    x5 = {
-        'type': 'standard',
-        'status': 'finished',
-        'delivery_service': 'DEFAULT',
-        'payment_type': 'ON_DELIVERY',
-        'package_status': 'MAIL_SENT'
-    }
-    # x6
-    x6 = {
-        'type': 'standard',
-        'status': 'paymentCompleted',
-        'delivery_service': 'DEFAULT',
-        'payment_type': ['ANY_CREDIT_CARD', 'VISA_PREMIUM_CREDIT_CARD', 'VISA_CREDIT_CARD'],
-        'package_status': 'EXPORTED'
-    }
-    # x7
-    x7 = {
-        'type': 'standard',
-        'status': 'paymentCompleted',
-        'delivery_service': 'DEFAULT',
-        'payment_type': ['ANY_CREDIT_CARD', 'VISA_PREMIUM_CREDIT_CARD', 'VISA_CREDIT_CARD'],
-        'package_status': 'MAIL_SENT'
-    }
-    # x8
-    x8 = {
-        'type': 'standard',
-        'status': 'paymentCompleted',
-        'delivery_service': 'DEFAULT',
-        'payment_type': ['ANY_CREDIT_CARD', 'VISA_PREMIUM_CREDIT_CARD', 'VISA_CREDIT_CARD'],
-        'package_status': 'WAITING_FOR_MP99'
-    }
-    # x9
-    x9 = {
-        'type': 'standard',
-        'status': 'paymentCompleted',
-        'delivery_service': 'DEFAULT',
-        'payment_type': ['ANY_CREDIT_CARD', 'VISA_PREMIUM_CREDIT_CARD', 'VISA_CREDIT_CARD'],
-        'package_status': 'EXPORTED_TO_MP99'
-    }
-    # x10
-    x10 = {
-        'type': 'standard',
-        'status': 'paymentCompleted',
-        'delivery_service': 'DEFAULT',
-        'payment_type': ['ANY_CREDIT_CARD', 'VISA_PREMIUM_CREDIT_CARD', 'VISA_CREDIT_CARD'],
-        'package_status': 'WAITING_FOR_EXPORT'
-    }
-    # x11
-    x11 = {
-        'type': 'standard',
-        'status': 'paymentCompleted',
-        'delivery_service': 'DHL',
-        'payment_type': ['ANY_CREDIT_CARD', 'VISA_PREMIUM_CREDIT_CARD', 'VISA_CREDIT_CARD'],
-        'package_status': 'EXPORTED'
-    }
-
-    x11 = {
-        'type': 'standard',
-        'status': 'paymentCompleted',
-        'delivery_service': 'DHL',
-        'payment_type': ['ANY_CREDIT_CARD', 'VISA_PREMIUM_CREDIT_CARD', 'VISA_CREDIT_CARD'],
-        'package_status': ['EXPORTED', 'WAITING_FOR_EXPORT']
-    }
-
-    # x12
-    x12 = {
-        'type': ['standard', 'ebook'],
-        'status': 'readyForOnlinePayment',
-        'delivery_service': ['DEFAULT', 'DHL'],
-        'payment_type': ['ANY_CREDIT_CARD', 'VISA_PREMIUM_CREDIT_CARD', 'VISA_CREDIT_CARD']
-    }
-    # x13
-    x13 = {
-        'type': ['standard', 'ebook'],
-        'status': 'waitingForFinalOnlinePaymentStatus',
-        'delivery_service': ['DEFAULT', 'DHL'],
-        'payment_type': ['ANY_CREDIT_CARD', 'VISA_PREMIUM_CREDIT_CARD', 'VISA_CREDIT_CARD']
-    }
-    # x14
-    x14 = {
-        'type': 'ebook',
-        'status': 'ebookSuccessfullyAdded',
-        'payment_type': ['ANY_CREDIT_CARD', 'VISA_PREMIUM_CREDIT_CARD', 'VISA_CREDIT_CARD']
-    }
-    # x15
-    x15 = {
-        'type': ['standard', 'ebook'],
-        'status': 'canceled',
-        'payment_type': ['ANY_CREDIT_CARD', 'VISA_PREMIUM_CREDIT_CARD', 'VISA_CREDIT_CARD']
-    }
-    # x16
-    x16 = {
-        'type': 'standard',
-        'status': 'paymentCompleted',
-        'delivery_service': 'DHL',
-        'payment_type': ['ANY_CREDIT_CARD', 'VISA_PREMIUM_CREDIT_CARD', 'VISA_CREDIT_CARD'],
-        'package_status': 'INVITATION_SENT'
-    }
-    # x17
-    x17 = {
-        'type': 'standard',
-        'status': 'finished',
-        'delivery_service': 'DEFAULT',
-        'payment_type': 'ON_DELIVERY',
-        'package_status': 'INVITATION_SENT'
-    }
-    # x18
-    x18 = {
-        'type': 'standard',
-        'status': 'paymentCompleted',
-        'delivery_service': 'DEFAULT',
-        'payment_type': ['ANY_CREDIT_CARD', 'VISA_PREMIUM_CREDIT_CARD', 'VISA_CREDIT_CARD'],
-        'package_status': 'INVITATION_SENT'
-    }
-    # x19
-    x19 = {
-        'type': 'standard',
-        'status': 'finished',
-        'delivery_service': 'DEFAULT',
-        'payment_type': 'PAYMENT_SLIP',
-        'package_status': 'INVITATION_SENT'
-    }
-    # x20
-    x20 = {
-        'type': 'standard',
-        'status': 'finished',
-        'delivery_service': 'DEFAULT',
-        'payment_type': 'ADMINISTRATIVE_BAN',
-        'package_status': 'INVITATION_SENT'
-    }
-    # x21
-    x21 = {
-        'type': 'standard',
-        'status': 'finished',
-        'payment_type': 'ADMINISTRATIVE_BAN',
-        'package_status': 'WAITING_FOR_EXPORT'
-    }
-    # x22
-    x22 = {
-        'type': 'standard',
-        'status': 'manuallyCanceled'
-    }
-    # x23
-    x23 = {
-        'type': 'standard',
-        'status': 'returned'
-    }
-
-    x25 = {
-        'type': 'standard',
-        'status': 'finished',
-        'delivery_service': 'DEFAULT',
-        'payment_type': 'PAYMENT_SLIP',
-        'package_status': 'WAITING_FOR_EXPORT'
-    }
-
-    x26 = {
-        'type': 'standard',
-        'status': 'finished',
-        'delivery_service': 'DEFAULT',
-        'payment_type': 'PAYMENT_SLIP',
-        'package_status': 'WAITING_FOR_MP99'
-    }
-
-    x27 = {
-        'type': 'standard',
-        'status': 'finished',
-        'delivery_service': 'DEFAULT',
-        'payment_type': 'PAYMENT_SLIP',
-        'package_status': 'EXPORTED_TO_MP99'
-    }
-
-    x28 = {
-        'type': 'standard',
-        'status': 'finished',
-        'delivery_service': 'DEFAULT',
-        'payment_type': 'PAYMENT_SLIP',
-        'package_status': 'EXPORTED'
-    }
-
-    x29 = {
-        'type': 'standard',
-        'status': 'finished',
-        'delivery_service': 'DEFAULT',
-        'payment_type': 'PAYMENT_SLIP',
-        'package_status': 'MAIL_SENT'
-    }
-
-    x30 = {
-        'type': 'standard',
-        'status': 'finished',
-        'delivery_service': 'DHL',
-        'payment_type': 'ON_DELIVERY',
-        'package_status': 'EXPORTED_TO_MP99'
-    }
-
-
-    if (order_info['type'] == x1['type'] and
-            order_info['status'] == x1['status'] and
-            order_info['delivery_service'] == x1['delivery_service'] and
-            order_info['payment_type'] == x1['payment_type'] and
-            order_info['package_status'] == x1['package_status']):
-        return 'x1'
-
-    elif (order_info['type'] == x2['type'] and
-            order_info['status'] == x2['status'] and
-            order_info['delivery_service'] == x2['delivery_service'] and
-            order_info['payment_type'] == x2['payment_type'] and
-            order_info['package_status'] == x2['package_status']):
-        return 'x2'
-
-    elif (order_info['type'] == x3['type'] and
-            order_info['status'] == x3['status'] and
-            order_info['delivery_service'] == x3['delivery_service'] and
-            order_info['payment_type'] == x3['payment_type'] and
-            order_info['package_status'] == x3['package_status']):
-        return 'x3'
-
-    elif (order_info['type'] == x4['type'] and
-            order_info['status'] == x4['status'] and
-            order_info['delivery_service'] == x4['delivery_service'] and
-            order_info['payment_type'] == x4['payment_type'] and
-            order_info['package_status'] == x4['package_status']):
-        return 'x4'
-    elif (order_info['type'] == x5['type'] and
-            order_info['status'] == x5['status'] and
-            order_info['delivery_service'] == x5['delivery_service'] and
-            order_info['payment_type'] == x5['payment_type'] and
-            order_info['package_status'] == x5['package_status']):
-        return 'x5'
-
-    elif (order_info['type'] == x6['type'] and
-            order_info['status'] == x6['status'] and
-            order_info['delivery_service'] == x6['delivery_service'] and
-            order_info['payment_type'] in x6['payment_type'] and
-            order_info['package_status'] == x6['package_status']):
-        return 'x6'
-
-    elif (order_info['type'] == x7['type'] and
-            order_info['status'] == x7['status'] and
-            order_info['delivery_service'] == x7['delivery_service'] and
-            order_info['payment_type'] in x7['payment_type'] and
-            order_info['package_status'] == x7['package_status']):
-        return 'x7'
-
-    elif (order_info['type'] == x8['type'] and
-            order_info['status'] == x8['status'] and
-            order_info['delivery_service'] == x8['delivery_service'] and
-            order_info['payment_type'] in x8['payment_type'] and
-            order_info['package_status'] == x8['package_status']):
-        return 'x8'
-    elif (order_info['type'] == x9['type'] and
-            order_info['status'] == x9['status'] and
-            order_info['delivery_service'] == x9['delivery_service'] and
-            order_info['payment_type'] in x9['payment_type'] and
-            order_info['package_status'] == x9['package_status']):
-        return 'x9'
-
-    elif (order_info['type'] == x10['type'] and
-            order_info['status'] == x10['status'] and
-            order_info['delivery_service'] == x10['delivery_service'] and
-            order_info['payment_type'] in x10['payment_type'] and
-            order_info['package_status'] == x10['package_status']):
-        return 'x10'
-
-    elif (order_info['type'] == x11['type'] and
-            order_info['status'] == x11['status'] and
-            order_info['delivery_service'] == x11['delivery_service'] and
-            order_info['payment_type'] in x11['payment_type'] and
-            order_info['package_status'] in x11['package_status']):
-        return 'x11'
-
-    elif (order_info['type'] in x12['type'] and
-            order_info['status'] == x12['status'] and
-            order_info['delivery_service'] in x12['delivery_service'] and
-            order_info['payment_type'] in x12['payment_type']):
-        return 'x12'
-
-    elif (order_info['type'] in x13['type'] and
-            order_info['status'] == x13['status'] and
-            order_info['delivery_service'] in x13['delivery_service'] and
-            order_info['payment_type'] in x13['payment_type']):
-        return 'x13'
-
-    elif (order_info['type'] == x14['type'] and
-            order_info['status'] == x14['status'] and
-            order_info['payment_type'] in x14['payment_type']):
-        return 'x14'
-
-    elif (order_info['type'] in x15['type'] and
-            order_info['status'] == x15['status'] and
-            order_info['payment_type'] in x15['payment_type']):
-        return 'x15'
-
-    elif (order_info['type'] == x16['type'] and
-            order_info['status'] == x16['status'] and
-            order_info['delivery_service'] == x16['delivery_service'] and
-            order_info['payment_type'] in x16['payment_type'] and
-            order_info['package_status'] == x16['package_status']):
-        return 'x16'
-    
-    elif (order_info['type'] == x17['type'] and
-            order_info['status'] == x17['status'] and
-            order_info['delivery_service'] == x17['delivery_service'] and
-            order_info['payment_type'] == x17['payment_type'] and
-            order_info['package_status'] == x17['package_status']):
-        return 'x17'
-
-    elif (order_info['type'] == x18['type'] and
-            order_info['status'] == x18['status'] and
-            order_info['delivery_service'] == x18['delivery_service'] and
-            order_info['payment_type'] in x18['payment_type'] and
-            order_info['package_status'] == x18['package_status']):
-        return 'x18'
-
-    elif (order_info['type'] == x19['type'] and
-            order_info['status'] == x19['status'] and
-            order_info['delivery_service'] == x19['delivery_service'] and
-            order_info['payment_type'] == x19['payment_type'] and
-            order_info['package_status'] == x19['package_status']):
-        return 'x19'
-
-    elif (order_info['type'] == x20['type'] and
-            order_info['status'] == x20['status'] and
-            order_info['delivery_service'] == x20['delivery_service'] and
-            order_info['payment_type'] == x20['payment_type'] and
-            order_info['package_status'] == x20['package_status']):
-        return 'x20'
-
-    elif (order_info['type'] == x21['type'] and
-            order_info['status'] == x21['status'] and
-            order_info['payment_type'] == x21['payment_type'] and
-            order_info['package_status'] == x21['package_status']):
-        return 'x21'
-
-    elif (order_info['type'] == x22['type'] and
-            order_info['status'] == x22['status']):
-        return 'x22'
-
-    elif (order_info['type'] == x23['type'] and
-            order_info['status'] == x23['status']):
-        return 'x23'
-    
-    elif (order_info['type'] == x25['type'] and
-            order_info['status'] == x25['status'] and
-            order_info['delivery_service'] == x25['delivery_service'] and
-            order_info['payment_type'] == x25['payment_type'] and
-            order_info['package_status'] == x25['package_status']):
-        return 'x25'
-    elif (order_info['type'] == x26['type'] and
-            order_info['status'] == x26['status'] and
-            order_info['delivery_service'] == x26['delivery_service'] and
-            order_info['payment_type'] == x26['payment_type'] and
-            order_info['package_status'] == x26['package_status']):
-        return 'x26'
-    elif (order_info['type'] == x27['type'] and
-            order_info['status'] == x27['status'] and
-            order_info['delivery_service'] == x27['delivery_service'] and
-            order_info['payment_type'] == x27['payment_type'] and
-            order_info['package_status'] == x27['package_status']):
-        return 'x27'
-    elif (order_info['type'] == x28['type'] and
-            order_info['status'] == x28['status'] and
-            order_info['delivery_service'] == x28['delivery_service'] and
-            order_info['payment_type'] == x28['payment_type'] and
-            order_info['package_status'] == x28['package_status']):
-        return 'x28'
-    elif (order_info['type'] == x29['type'] and
-            order_info['status'] == x29['status'] and
-            order_info['delivery_service'] == x29['delivery_service'] and
-            order_info['payment_type'] == x29['payment_type'] and
-            order_info['package_status'] == x29['package_status']):
-        return 'x29'
-    elif (order_info['type'] == x30['type'] and
-            order_info['status'] == x30['status'] and
-            order_info['delivery_service'] == x30['delivery_service'] and
-            order_info['payment_type'] == x30['payment_type'] and
-            order_info['package_status'] == x30['package_status']):
-        return 'x30'
-    else:
-        return 'x24'
-
-
 def delfi_orders(prompt: str) -> str:
     """
     Extracts all integer order IDs consisting of five or more digits from the provided text.
@@ -2010,325 +1497,409 @@ def delfi_orders(prompt: str) -> str:
         return "Morate uneti tačan broj porudžbine/a."
 
 
-def delfi_api_products(matching_sec_ids: List[int]) -> List[Dict[str, Any]]:
+PRODUCTS_URL = 'https://www.delfi.rs/api/products'
+
+# Cene se porede samo po tome koje su od četiri cene međusobno jednake (redovna, premium, količinska, premium
+# količinska). Obrazac jednakosti je ključ tabele, a vrednost su oznake i indeksi cena koje se prikazuju.
+PRICE_LIST_TIERS = {
+    (0, 0, 0, 0): (('akcijska cena', 0),),
+    (0, 0, 1, 1): (('cena sa popustom', 0), ('cena sa količinskim popustom', 2)),
+    (0, 1, 0, 1): (('cena sa redovnim popustom', 0), ('cena sa premium popustom', 1)),
+    (0, 0, 0, 1): (('cena sa popustom', 0), ('cena sa premium količinskim popustom', 3)),
+    (0, 1, 0, 2): (('cena sa redovnim popustom', 0), ('cena sa premium popustom', 1), ('cena sa premium količinskim popustom', 3)),
+}
+PRICE_LIST_DEFAULT_TIERS = (
+    ('cena sa redovnim popustom', 0),
+    ('cena sa redovnim popustom na količinu', 2),
+    ('cena sa premium popustom', 1),
+    ('cena sa premium popustom na količinu', 3),
+)
+ACTION_PRICE_TIERS = {
+    (0, 0, 0, 0): (('akcijska cena', 0),),
+    (0, 0, 1, 1): (('akcijska cena', 0), ('akcijska cena sa količinskim popustom', 2)),
+    (0, 1, 0, 1): (('akcijska cena', 0), ('akcijska premium cena', 1)),
+    (0, 0, 0, 1): (('akcijska cena', 0), ('akcijska premium cena sa količinskim popustom', 3)),
+    (0, 1, 0, 2): (('akcijska cena', 0), ('akcijska premium cena', 1), ('akcijska premium cena sa količinskim popustom', 3)),
+}
+ACTION_DEFAULT_TIERS = (
+    ('akcijska cena', 0),
+    ('akcijska premium cena', 1),
+    ('akcijska cena sa količinskim popustom', 2),
+    ('akcijska premium cena sa količinskim popustom', 3),
+)
+PRODUCT_ACTION_DEFAULT_TIERS = (
+    ('cena sa redovnim popustom', 0),
+    ('cena sa premium popustom', 1),
+    ('cena sa redovnim količinskim popustom', 2),
+    ('cena sa premium količinskim popustom', 3),
+)
+
+
+def price_tiers(prices: Tuple[Any, ...], table: Dict[Tuple[int, ...], Tuple], default: Tuple) -> Dict[str, Any]:
+    """
+    Svodi cene na najmanji skup cena koje treba prikazati korisniku, pomoću tabele odluka.
 
-    def get_product_info(token, product_id):
-        return requests.get(url="https://www.delfi.rs/api/products", params={"token": token, "product_id": product_id}).content
+    Args:
+        prices (Tuple[Any, ...]): Redovna, premium, količinska i premium količinska cena.
+        table (Dict[Tuple[int, ...], Tuple]): Tabela odluka po obrascu jednakosti cena.
+        default (Tuple): Oznake i indeksi cena za obrasce kojih nema u tabeli.
 
-    # Function to parse the XML response and extract required fields
-    def parse_product_info(xml_data):
-        product_info = {}
-        quantity_discount2_flag = False
-        try:
-            root = ET.fromstring(xml_data)
-            product_node = root.find(".//product")
-            if product_node is not None:
-                # cena = product_node.findtext('cena')
-                lager = product_node.findtext('lager')
-                url = product_node.findtext('url')
-                id = product_node.findtext('ID')
-                navid = product_node.findtext('ID_nav')
-
-                action_node = product_node.find('action')
-                if action_node is not None:
-                    print(f"Action node found!")  # Debugging line
-                    type = action_node.find('type').text
-                    if type == "fixedPrice" or type == "fixedDiscount":
-                        title = action_node.find('title').text
-                        end_at = action_node.find('endAt').text
-                        price_regular_standard = float(action_node.find('priceRegularStandard').text)
-                        price_regular_premium = float(action_node.find('priceRegularPremium').text)
-                        price_quantity_standard = float(action_node.find('priceQuantityStandard').text)
-                        price_quantity_premium = float(action_node.find('priceQuantityPremium').text)
-
-                        if price_regular_standard == price_regular_premium == price_quantity_standard == price_quantity_premium:
-                            akcija = {
-                            'naziv akcije': title,
-                            'kraj akcije': end_at,
-                            'akcijska cena': price_regular_standard
-                        }
-                        elif price_regular_standard == price_regular_premium and price_quantity_standard == price_quantity_premium:
-                            akcija = {
-                            'naziv akcije': title,
-                            'kraj akcije': end_at,
-                            'akcijska cena': price_regular_standard,
-                            'akcijska cena sa količinskim popustom': price_quantity_standard
-                        }
-                        elif price_regular_standard == price_quantity_standard and price_regular_premium == price_quantity_premium:
-                            akcija = {
-                            'naziv akcije': title,
-                            'kraj akcije': end_at,
-                            'akcijska cena': price_regular_standard,
-                            'akcijska premium cena': price_regular_premium
-                        }
-                        elif price_regular_standard == price_regular_premium == price_quantity_standard != price_quantity_premium:
-                            akcija = {
-                            'naziv akcije': title,
-                            'kraj akcije': end_at,
-                            'akcijska cena': price_regular_standard,
-                            'akcijska premium cena sa količinskim popustom': price_quantity_premium
-                        }
-                        elif price_regular_standard == price_quantity_standard and price_regular_premium != price_regular_standard and price_quantity_premium != price_quantity_standard and price_regular_premium != price_quantity_premium:
-                            akcija = {
-                            'naziv akcije': title,
-                            'kraj akcije': end_at,
-                            'akcijska cena': price_regular_standard,
-                            'akcijska premium cena': price_regular_premium,
-                            'akcijska premium cena sa količinskim popustom': price_quantity_premium
-                        }
-                        else:
-                            akcija = {
-                                'naziv akcije': title,
-                                'kraj akcije': end_at,
-                                'cena sa redovnim popustom': price_regular_standard,
-                                'cena sa premium popustom': price_regular_premium,
-                                'cena sa redovnim količinskim popustom': price_quantity_standard,
-                                'cena sa premium količinskim popustom': price_quantity_premium
-                            }
-                    elif type == "exponentialDiscount":
-                        title = action_node.find('title').text
-                        end_at = action_node.find('endAt').text
-                        eksponencijalni_procenti = action_node.find('levelPercentages').text
-                        eksponencijalne_cene = action_node.find('levelPrices').text
-
-                        akcija = {
-                            'naziv akcije': title,
-                            'kraj akcije': end_at,
-                            'eksponencijalni procenti': eksponencijalni_procenti,
-                            'eksponencijalne cene': eksponencijalne_cene
-                        }
-                    elif type == "quantityDiscount2":
-                        quantity_discount2_flag = True
-                        title = action_node.find('title').text
-                        end_at = action_node.find('endAt').text
-                        price_quantity_standard_d2 = float(action_node.find('priceQuantityStandard').text)
-                        price_quantity_premium_d2 = float(action_node.find('priceQuantityPremium').text)
-                        quantity_discount_limit = int(action_node.find('quantityDiscount2Limit').text)
-
-                        akcija = {
-                            'naziv akcije': title,
-                            'kraj akcije': end_at,
-                            'cena sa redovnim količinskim popustom': price_quantity_standard_d2,
-                            'cena sa premium količinskim popustom': price_quantity_premium_d2,
-                            'limit za količinski popust': quantity_discount_limit
-                        }
-                else:
-                    print("Action node not found, taking regular price")  # Debugging line
-                
-                # Pristupanje priceList elementu
-                price_list = product_node.find('priceList')
-                if price_list is not None:
-                    collection_price = float(price_list.find('collectionFullPrice').text)
-                    full_price = float(price_list.find('fullPrice').text)
-                    eBook_price = float(price_list.find('eBookPrice').text)
-                    regular_discount_price = float(price_list.find('regularDiscountPrice').text)
-                    quantity_discount_price = float(price_list.find('quantityDiscountPrice').text)
-                    quantity_discount_limit = int(price_list.find('quantityDiscountLimit').text)
-                    premium_discount_price = float(price_list.find('regularDiscountPremiumPrice').text)
-                    premium_quantity_discount_price = float(price_list.find('quantityDiscountPremiumPrice').text)
-                    premium_quantity_discount_limit = int(price_list.find('quantityDiscountPremiumLimit').text)
-
-                    if regular_discount_price == premium_discount_price == quantity_discount_price == premium_quantity_discount_price:
-                        cene = {
-                            'akcijska cena': regular_discount_price
-                        }
-                    elif regular_discount_price == premium_discount_price and quantity_discount_price == premium_quantity_discount_price:
-                        cene = {
-                            'cena sa popustom': regular_discount_price,
-                            'cena sa količinskim popustom': quantity_discount_price
-                        }
-                    elif regular_discount_price == quantity_discount_price and premium_discount_price == premium_quantity_discount_price:
-                        cene = {
-                            'cena sa redovnim popustom': regular_discount_price,
-                            'cena sa premium popustom': premium_discount_price
-                        }
-                    elif regular_discount_price == premium_discount_price == quantity_discount_price != premium_quantity_discount_price:
-                        cene = {
-                            'cena sa popustom': regular_discount_price,
-                            'cena sa premium količinskim popustom': premium_quantity_discount_price
-                        }
-                    elif regular_discount_price == quantity_discount_price and premium_discount_price != regular_discount_price and premium_quantity_discount_price != quantity_discount_price and premium_discount_price != premium_quantity_discount_price:
-                        cene = {
-                            'cena sa redovnim popustom': regular_discount_price,
-                            'cena sa premium popustom': premium_discount_price,
-                            'cena sa premium količinskim popustom': premium_quantity_discount_price
-                        }
-                    else:
-                        cene = {
-                        'cena sa redovnim popustom': regular_discount_price,
-                        'cena sa redovnim popustom na količinu': quantity_discount_price,
-                        'cena sa premium popustom': premium_discount_price,
-                        'cena sa premium popustom na količinu': premium_quantity_discount_price,
-                        }
-                    
-                    if quantity_discount_limit == quantity_discount_limit:
-                        limit = {
-                            'limit za količinski popust': quantity_discount_limit
-                        }
-                    else:
-                        limit = {
-                            'limit za redovan količinski popust': quantity_discount_limit,
-                            'limit za premium količinski popust': premium_quantity_discount_limit
-                        }
-                
-                    pojedinacne_cene_za_quantity_discount2 = {
-                        'cena sa redovnim popustom': regular_discount_price,
-                        'cena sa premium popustom': premium_discount_price
-                    }
+    Returns:
+        Dict[str, Any]: Rečnik sa cenama koje se međusobno razlikuju.
+    """
+    seen = {}
+    pattern = tuple(seen.setdefault(price, len(seen)) for price in prices)
+    return {label: prices[position] for label, position in table.get(pattern, default)}
 
-                # if lager and int(lager) > 0:
-                if int(lager) > 0:
-                    product_info = {
-                        'puna cena': full_price,
-                        'eBook cena': eBook_price,
-                        'cena kolekcije': collection_price,
-                        'lager': lager,
-                        'url': url,
-                        'id': id,
-                        # 'navid': navid
-                    }
-                    if action_node is None:
-                        product_info.update(cene)
-                        product_info.update(limit)
-                    elif quantity_discount2_flag:
-                        product_info.update(pojedinacne_cene_za_quantity_discount2)
-                        product_info.update(akcija)
-                    else:
-                        product_info.update(akcija)
-                else:
-                    print(f"Skipping product with lager {lager}")  # Debugging line
-            else:
-                print("Product node not found in XML data")  # Debugging line
-        except ET.ParseError as e:
-            print(f"Error parsing XML: {e}")  # Debugging line
-        return product_info
-
-    # Main function to get info for a list of product IDs
-    def get_multiple_products_info(token, product_ids):
-        products_info = []
-        for product_id in product_ids:
-            # print(f"Product ID: {product_id}")
-            xml_data = get_product_info(token, product_id)
-            # print(f"XML data for product_id {product_id}: {xml_data}")  # Debugging line
-            product_info = parse_product_info(xml_data)
-            if product_info:
-                products_info.append(product_info)
-        return products_info
-
-    # Replace with your actual token and product IDs
-    token = os.getenv("DELFI_API_KEY")
-    product_ids = matching_sec_ids
 
+def read_product_node(chunks: Iterable[bytes]) -> Optional[ET.Element]:
+    """
+    Parses the product API XML chunk by chunk while it is downloaded and returns the <product> element.
+
+    The product is the last element of the response, so a pull parser could not stop any earlier, and its
+    per-element events made it slower than a plain incremental parse (see benchmarks/bench_product_info.py).
+
+    Args:
+        chunks (Iterable[bytes]): The response body, in one or more chunks.
+
+    Returns:
+        Optional[ET.Element]: The product element, or None if the response has none.
+    """
+    parser = ET.XMLParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    return next(parser.close().iter('product'), None)
+
+
+def parse_product_info(xml_data: Union[bytes, Iterable[bytes]]) -> Dict[str, Any]:
+    """
+    Extracts stock, URL and the prices to show from a product API response.
+
+    Args:
+        xml_data (Union[bytes, Iterable[bytes]]): The XML response, either whole or as streamed chunks.
+
+    Returns:
+        Dict[str, Any]: The product info, or an empty dictionary if the product is missing or out of stock.
+    """
     try:
-        products_info = get_multiple_products_info(token, product_ids)
-    except:
-        products_info = "No products found for the given IDs."
-    # print(f"API Info: {products_info}")
-    # output = "Data returned from API for each searched id: \n"
-    # for info in products_info:
-    #     output += str(info) + "\n"
-    return products_info
+        product_node = read_product_node([xml_data] if isinstance(xml_data, bytes) else xml_data)
+    except ET.ParseError as e:
+        print(f"Error parsing XML: {e}")
+        return {}
+    if product_node is None:
+        return {}
+
+    lager = product_node.findtext('lager')
+    if int(lager or 0) <= 0:
+        return {}
+
+    product_info = {}
+    price_list = product_node.find('priceList')
+    if price_list is not None:
+        product_info = {
+            'puna cena': float(price_list.findtext('fullPrice')),
+            'eBook cena': float(price_list.findtext('eBookPrice')),
+            'cena kolekcije': float(price_list.findtext('collectionFullPrice')),
+        }
+    product_info.update({
+        'lager': lager,
+        'url': product_node.findtext('url'),
+        'id': product_node.findtext('ID'),
+    })
+
+    action_node = product_node.find('action')
+    action_type = action_node.findtext('type') if action_node is not None else None
+    if action_type in ("fixedPrice", "fixedDiscount"):
+        product_info.update({'naziv akcije': action_node.findtext('title'), 'kraj akcije': action_node.findtext('endAt')})
+        product_info.update(price_tiers(
+            tuple(float(action_node.findtext(tag)) for tag in (
+                'priceRegularStandard', 'priceRegularPremium', 'priceQuantityStandard', 'priceQuantityPremium'
+            )),
+            ACTION_PRICE_TIERS,
+            PRODUCT_ACTION_DEFAULT_TIERS,
+        ))
+    elif action_type == "exponentialDiscount":
+        product_info.update({
+            'naziv akcije': action_node.findtext('title'),
+            'kraj akcije': action_node.findtext('endAt'),
+            'eksponencijalni procenti': action_node.findtext('levelPercentages'),
+            'eksponencijalne cene': action_node.findtext('levelPrices'),
+        })
+    elif price_list is not None:
+        regular_discount_price = float(price_list.findtext('regularDiscountPrice'))
+        premium_discount_price = float(price_list.findtext('regularDiscountPremiumPrice'))
+        if action_type == "quantityDiscount2":
+            product_info.update({
+                'cena sa redovnim popustom': regular_discount_price,
+                'cena sa premium popustom': premium_discount_price,
+                'naziv akcije': action_node.findtext('title'),
+                'kraj akcije': action_node.findtext('endAt'),
+                'cena sa redovnim količinskim popustom': float(action_node.findtext('priceQuantityStandard')),
+                'cena sa premium količinskim popustom': float(action_node.findtext('priceQuantityPremium')),
+                'limit za količinski popust': int(action_node.findtext('quantityDiscount2Limit')),
+            })
+        else:
+            product_info.update(price_tiers(
+                (
+                    regular_discount_price,
+                    premium_discount_price,
+                    float(price_list.findtext('quantityDiscountPrice')),
+                    float(price_list.findtext('quantityDiscountPremiumPrice')),
+                ),
+                PRICE_LIST_TIERS,
+                PRICE_LIST_DEFAULT_TIERS,
+            ))
+            quantity_discount_limit = int(price_list.findtext('quantityDiscountLimit'))
+            premium_quantity_discount_limit = int(price_list.findtext('quantityDiscountPremiumLimit'))
+            if quantity_discount_limit == premium_quantity_discount_limit:
+                product_info['limit za količinski popust'] = quantity_discount_limit
+            else:
+                product_info.update({
+                    'limit za redovan količinski popust': quantity_discount_limit,
+                    'limit za premium količinski popust': premium_quantity_discount_limit,
+                })
+    return product_info
 
 
-def delfi_api_aks(order_ids: List[str]) -> List[Dict[str, Any]]:
-    
-    def get_order_status(order_id: int) -> Dict[str, Any]:
-        url = f"http://www.akskurir.com/AKSVipService/Pracenje/{order_id}"
-        response = requests.get(url)
-        response.raise_for_status()  # Raise an error for failed requests
-        return response.json()
+class DelfiProductClient:
+    """
+    A client for the Delfi product API that fetches many products concurrently over keep-alive connections.
+
+    Requests go through the shared HTTP client ('products' endpoint), so consecutive lookups reuse open
+    connections instead of paying for a new TCP/TLS handshake per product.
+    """
 
-    def parse_order_status(json_data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    def __init__(
+        self,
+        url: str = PRODUCTS_URL,
+        max_workers: Optional[int] = None
+    ) -> None:
         """
-        Parses the JSON data of an order's status and extracts relevant information.
+        Initializes the DelfiProductClient.
 
         Args:
-            json_data (Dict[str, Any]): The JSON data received from the order tracking API.
+            url (str, optional): The product API endpoint. Defaults to PRODUCTS_URL.
+            max_workers (Optional[int], optional): Maximum number of concurrent requests. Defaults to the
+                                                   'PRODUCT_API_MAX_WORKERS' environment variable or 8.
+        """
+        self.url = url
+        self.max_workers = max_workers or int(getenv("PRODUCT_API_MAX_WORKERS", "8"))
+
+    def fetch(self, product_id: Any) -> Optional[Dict[str, Any]]:
+        """
+        Fetches and parses a single product, parsing the XML while it is downloaded.
+
+        Concurrent lookups of the same product share one request.
+
+        Args:
+            product_id (Any): The product id (oldProductId / sec_id).
 
         Returns:
-            Tuple[Dict[str, Any], List[Dict[str, Any]]]: 
-                - A dictionary containing the error code and current status of the order.
-                - A list of dictionaries detailing each status change, including:
-                    - 'Vreme' (str): The timestamp of the status change.
-                    - 'VremeInt' (str): An internal timestamp or identifier.
-                    - 'Centar' (str): The center or location associated with the status.
-                    - 'StatusOpis' (str): A description of the status.
-                    - 'NStatus' (str): A numerical or coded representation of the status.
-        """
-        status_info = {}
-        status_changes = []
-        
-        if 'ErrorCode' in json_data and json_data['ErrorCode'] == 0:
-            status_info['ErrorCode'] = json_data.get('ErrorCode', 'N/A')
-            status_info['Status'] = json_data.get('Status', 'N/A')
-            
-            lst = json_data.get('StatusList', [])
-            for status in lst:
-                status_change = {
-                    'Vreme': status.get('Vreme', 'N/A'),
-                    'VremeInt': status.get('VremeInt', 'N/A'),
-                    'Centar': status.get('Centar', 'N/A'),
-                    'StatusOpis': status.get('StatusOpis', 'N/A'),
-                    'NStatus': status.get('NStatus', 'N/A')
-                }
-                status_changes.append(status_change)
-        else:
-            status_info['ErrorCode'] = json_data.get('ErrorCode', 'N/A')
-            status_info['Status'] = json_data.get('Status', 'N/A')
+            Optional[Dict[str, Any]]: The product info, an empty dictionary if the product is out of stock,
+                                      or None if the request failed.
+        """
+        return single_flight("products").do(str(product_id), lambda: self._fetch(product_id))
 
-        return status_info, status_changes
+    def _fetch(self, product_id: Any) -> Optional[Dict[str, Any]]:
+        try:
+            with http_client.get(
+                'products',
+                self.url,
+                params={"token": getenv("DELFI_API_KEY"), "product_id": product_id},
+                stream=True
+            ) as response:
+                response.raise_for_status()
+                return parse_product_info(response.iter_content(chunk_size=8192))
+        except Exception as e:
+            print(f"Error fetching product {product_id}: {e}")
+            return None
 
-    def get_multiple_orders_info(order_ids: List[int]) -> List[Dict[str, Any]]:
+    def fetch_by_id(self, product_ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
         """
-        Retrieves and processes information for multiple order IDs.
+        Fetches many products concurrently.
 
         Args:
-            order_ids (List[int]): A list of order IDs for which information is to be retrieved.
+            product_ids (List[Any]): The product ids to fetch.
 
         Returns:
-            List[Dict[str, Any]]: A list of dictionaries, each containing:
-                - 'order_id' (int): The unique identifier of the order.
-                - 'current_status' (Dict[str, Any]): The current status information of the order, including:
-                    - 'ErrorCode' (Any): The error code returned by the API (if any).
-                    - 'Status' (Any): The current status of the order.
-                - 'status_changes' (List[Dict[str, Any]]): A list of status change records, each containing:
-                    - 'Vreme' (str): The timestamp of the status change.
-                    - 'VremeInt' (str): An internal timestamp or identifier.
-                    - 'Centar' (str): The center or location associated with the status.
-                    - 'StatusOpis' (str): A description of the status.
-                    - 'NStatus' (str): A numerical or coded representation of the status.
-                - 'error' (str, optional): An error message if the order information could not be retrieved.
-        """
-        orders_info = []
-        for order_id in order_ids:
-            try:
-                # Fetch order status
-                order_status_json = get_order_status(order_id)
-                current_status, status_changes = parse_order_status(order_status_json)
-                
-                # Assemble order information
-                order_info = {
-                    'order_id': order_id,
-                    'current_status': current_status,
-                    'status_changes': status_changes
-                }
-                orders_info.append(order_info)
-            except requests.exceptions.RequestException as e:
-                print(f"HTTP error for order {order_id}: {e}")
-                orders_info.append({'order_id': order_id, 'error': str(e)})
-            except Exception as e:
-                print(f"Error for order {order_id}: {e}")
-                orders_info.append({'order_id': order_id, 'error': str(e)})
-        return orders_info
+            Dict[Any, Dict[str, Any]]: Product info per id, an empty dictionary for products that are out of
+                                       stock. Ids whose request failed are left out.
+        """
+        if len(product_ids) <= 1:
+            products_info = [self.fetch(product_id) for product_id in product_ids]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(product_ids))) as executor:
+                products_info = list(executor.map(self.fetch, product_ids))
+        return {
+            product_id: product_info
+            for product_id, product_info in zip(product_ids, products_info) if product_info is not None
+        }
+
+    def fetch_many(self, product_ids: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Fetches many products concurrently, keeping the order of the given ids.
+
+        Args:
+            product_ids (List[Any]): The product ids to fetch.
+
+        Returns:
+            List[Dict[str, Any]]: Product info for every product that is available.
+        """
+        return [product_info for product_info in self.fetch_by_id(product_ids).values() if product_info]
+
+
+product_client = DelfiProductClient()
+product_cache = ProductInfoCache(product_client.fetch_by_id)
+
+
+def delfi_api_products(
+    matching_sec_ids: List[int],
+    groups: Iterable[str] = ('static', 'price', 'stock'),
+    bypass_cache: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Returns stock and price info for every available product among the given ids.
+
+    Product info is served from the product cache while the field groups the caller uses are fresh (see
+    ProductInfoCache). Since only products in stock are returned, the stock TTL always applies, and cached
+    products are refreshed in the background shortly before it runs out. A caller that must see the live stock
+    and prices, e.g. before an order is placed, passes bypass_cache=True.
+
+    Args:
+        matching_sec_ids (List[int]): Product ids (oldProductId / sec_id).
+        groups (Iterable[str], optional): Field groups that must be fresh besides the stock. Defaults to all
+                                          groups.
+        bypass_cache (bool, optional): Always fetch from the product API. Defaults to False.
+
+    Returns:
+        List[Dict[str, Any]]: Product info for every product in stock, in the order of the given ids.
+    """
+    products_info = product_cache.get_many(matching_sec_ids, groups=groups, bypass=bypass_cache)
+    return [products_info[str(product_id)] for product_id in matching_sec_ids if products_info.get(str(product_id))]
+
+
+def parse_status_change(status: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extracts the relevant fields of a single AKS status change.
+    """
+    return {
+        'Vreme': status.get('Vreme', 'N/A'),
+        'VremeInt': status.get('VremeInt', 'N/A'),
+        'Centar': status.get('Centar', 'N/A'),
+        'StatusOpis': status.get('StatusOpis', 'N/A'),
+        'NStatus': status.get('NStatus', 'N/A')
+    }
+
+
+def parse_order_status(
+    json_data: Dict[str, Any],
+    previous_changes: Optional[List[Dict[str, Any]]] = None
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Parses the JSON data of an order's status and extracts relevant information.
+
+    The AKS StatusList only grows, so when the status changes parsed on a previous lookup are passed in and
+    the list still ends with the same entry at the same position, only the new entries are parsed.
+
+    Args:
+        json_data (Dict[str, Any]): The JSON data received from the order tracking API.
+        previous_changes (Optional[List[Dict[str, Any]]], optional): Status changes parsed on the previous lookup.
+
+    Returns:
+        Tuple[Dict[str, Any], List[Dict[str, Any]]]: 
+            - A dictionary containing the error code and current status of the order.
+            - A list of dictionaries detailing each status change, including:
+                - 'Vreme' (str): The timestamp of the status change.
+                - 'VremeInt' (str): An internal timestamp or identifier.
+                - 'Centar' (str): The center or location associated with the status.
+                - 'StatusOpis' (str): A description of the status.
+                - 'NStatus' (str): A numerical or coded representation of the status.
+    """
+    status_info = {
+        'ErrorCode': json_data.get('ErrorCode', 'N/A'),
+        'Status': json_data.get('Status', 'N/A')
+    }
+    if json_data.get('ErrorCode') != 0:
+        return status_info, []
+
+    lst = json_data.get('StatusList', [])
+    known = len(previous_changes or [])
+    if known and len(lst) >= known and parse_status_change(lst[known - 1]) == previous_changes[-1]:
+        status_changes = previous_changes + [parse_status_change(status) for status in lst[known:]]
+    else:
+        status_changes = [parse_status_change(status) for status in lst]
+
+    return status_info, status_changes
+
+
+def fetch_aks_status(order_id: str, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Fetches the AKS courier status of a single shipment.
+
+    Args:
+        order_id (str): The AKS tracking code of the shipment.
+        previous (Optional[Dict[str, Any]], optional): The status from the previous lookup, if any.
+
+    Returns:
+        Dict[str, Any]: The 'order_id', 'current_status' and 'status_changes' of the shipment.
+    """
+    response = http_client.get('aks', AKS_TRACKING_URL.format(order_id))
+    response.raise_for_status()  # Raise an error for failed requests
+    current_status, status_changes = parse_order_status(
+        response.json(), previous['status_changes'] if previous else None
+    )
+    return {
+        'order_id': order_id,
+        'current_status': current_status,
+        'status_changes': status_changes
+    }
+
+
+def get_aks_status(order_id: str) -> Dict[str, Any]:
+    """
+    Retrieves the AKS courier status of a single shipment, served from the order status cache while it is fresh.
 
-    # Main function to retrieve information for all orders
+    Args:
+        order_id (str): The AKS tracking code of the shipment.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing:
+            - 'order_id' (str): The tracking code.
+            - 'current_status' (Dict[str, Any]): The current status information, including:
+                - 'ErrorCode' (Any): The error code returned by the API (if any).
+                - 'Status' (Any): The current status of the shipment.
+            - 'status_changes' (List[Dict[str, Any]]): A list of status change records, each containing:
+                - 'Vreme' (str): The timestamp of the status change.
+                - 'VremeInt' (str): An internal timestamp or identifier.
+                - 'Centar' (str): The center or location associated with the status.
+                - 'StatusOpis' (str): A description of the status.
+                - 'NStatus' (str): A numerical or coded representation of the status.
+            - 'error' (str, optional): An error message if the status could not be retrieved.
+    """
     try:
-        orders_info = get_multiple_orders_info(order_ids)
+        return aks_status_cache.get(order_id, lambda previous: fetch_aks_status(order_id, previous))
+    except requests.exceptions.RequestException as e:
+        print(f"HTTP error for order {order_id}: {e}")
+        return {'order_id': order_id, 'error': str(e)}
     except Exception as e:
-        print(f"Error retrieving order information: {e}")
-        orders_info = "No orders found for the given IDs."
+        print(f"Error for order {order_id}: {e}")
+        return {'order_id': order_id, 'error': str(e)}
+
+
+def delfi_api_aks(order_ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    Retrieves the AKS courier status of several shipments concurrently.
 
-    return orders_info
+    Args:
+        order_ids (List[str]): AKS tracking codes.
+
+    Returns:
+        List[Dict[str, Any]]: The status of every shipment (see get_aks_status), in the order of the given codes.
+    """
+    if len(order_ids) <= 1:
+        return [get_aks_status(order_id) for order_id in order_ids]
+    with ThreadPoolExecutor(max_workers=min(len(order_ids), int(getenv("ORDER_API_MAX_WORKERS", "8")))) as executor:
+        return list(executor.map(get_aks_status, order_ids))
 
 
 def SelfQueryDelfi(
@@ -2406,7 +1977,9 @@ def SelfQueryDelfi(
     )
     try:
         result = ""
-        doc_result = retriever.get_relevant_documents(upit)
+        with get_openai_callback() as callback:
+            doc_result = retriever.get_relevant_documents(upit)
+        usage_collector.record("self_query", llm.model_name, prompt_tokens=callback.prompt_tokens, completion_tokens=callback.completion_tokens)
         for doc in doc_result:
             print("DOC: ", doc)
             metadata = doc.metadata
@@ -2479,10 +2052,7 @@ class HybridQueryProcessor:
             List[float]: The embedding vector of the given text.
         """
         
-        text = text.replace("\n", " ")
-        result = client.embeddings.create(input=[text], model=model).data[0].embedding
-       
-        return result
+        return embed_text(text.replace("\n", " "), model)
     
     def hybrid_score_norm(self, dense: List[float], sparse: Dict[str, Any]) -> Tuple[List[float], Dict[str, List[float]]]:
         """
@@ -2555,7 +2125,10 @@ class HybridQueryProcessor:
         if filter:
             query_params['filter'] = filter
 
-        response = self.index.query(**query_params)
+        response = single_flight("pinecone").do(
+            (id(self.index), upit, query_params['top_k'], json.dumps(filter, sort_keys=True), query_params['namespace']),
+            lambda: self.index.query(**query_params)
+        )
         matches = response.to_dict().get('matches', [])
         results = []
         
@@ -2630,62 +2203,224 @@ class HybridQueryProcessor:
 
 from datetime import datetime
 
-class ActionFetcher:
-    def __init__(self, api_url):
+
+def action_price_tiers(
+    price_regular_standard: Any,
+    price_regular_premium: Any,
+    price_quantity_standard: Any,
+    price_quantity_premium: Any
+) -> Dict[str, Any]:
+    """
+    Svodi četiri akcijske cene na najmanji skup cena koje treba prikazati korisniku.
+
+    Returns:
+        Dict[str, Any]: Rečnik sa akcijskim cenama koje se međusobno razlikuju.
+    """
+    return price_tiers(
+        (price_regular_standard, price_regular_premium, price_quantity_standard, price_quantity_premium),
+        ACTION_PRICE_TIERS,
+        ACTION_DEFAULT_TIERS,
+    )
+
+
+class ActionIndex:
+    """
+    Indeks aktuelnih akcija napravljen jednom po osvežavanju "actions-page" feed-a.
+
+    Akcije su ključevane po normalizovanom nazivu (mala slova, bez dijakritika) i svaka je mapirana na
+    zapise proizvoda sa unapred izračunatim akcijskim cenama. Istekle akcije se odbacuju već pri izgradnji,
+    pa su upiti o akcijama čisto pretraživanje u memoriji.
+    """
+
+    def __init__(self, data: Dict[str, Any]) -> None:
         """
-        Inicijalizuje instancu klase sa zadatim URL-om API-ja.
+        Gradi indeks iz sirovih podataka sa API-ja.
 
         Args:
-            api_url (str): URL API-ja odakle će se preuzimati podaci.
+            data (dict): JSON podaci preuzeti sa API-ja, koji sadrže sekcije i akcije.
         """
-        self.api_url = api_url
-        self.today = datetime.now()
-        self.unique_actions = set()
+        now = datetime.now()
+        self.actions: Dict[str, Dict[str, Any]] = {}
+        self.end_dates: Dict[str, Optional[datetime]] = {}
+        self.books: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+
+        position = 0
+        for section in data.get('data', {}).get('sections', []):
+            for product in section.get('content', {}).get('products', []):
+                position += 1
+                seen = set()
+                for action in product.get('actions', []):
+                    end_at = action.get('endAt')
+                    end_date = None
+                    if end_at:
+                        try:
+                            end_date = datetime.fromisoformat(end_at.replace('Z', ''))
+                        except ValueError:
+                            continue
+                        if end_date <= now:
+                            continue
 
-    def fetch_data(self):
+                    key = self.normalize(action.get('actionTitle', ''))
+                    if key in seen:
+                        continue
+                    seen.add(key)
+
+                    if key not in self.actions:
+                        self.actions[key] = {
+                            'action_title': action.get('actionTitle'),
+                            'action_description': action.get('raw', {}).get('description', 'Nema opisa'),
+                            'end_date': end_date.strftime('%d.%m.%Y. %H:%M:%S') if end_date else 'N/A'
+                        }
+                        self.end_dates[key] = end_date
+                    self.books.setdefault(key, []).append((position, self.book_record(product, action)))
+
+    @staticmethod
+    def normalize(title: str) -> str:
+        """
+        Normalizuje naziv akcije: mala slova, bez dijakritika i suvišnih razmaka.
         """
-        Preuzima podatke sa API-ja.
+        return ' '.join(strip_diacritics(title).split())
+
+    @staticmethod
+    def book_record(product: Dict[str, Any], action: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Pravi zapis o knjizi za zadatu akciju, sa cenama koje zavise od vrste akcije.
+
+        Args:
+            product (dict): Proizvod iz feed-a.
+            action (dict): Akcija proizvoda za koju se pravi zapis.
 
         Returns:
-            dict: Sirovi podaci preuzeti sa API-ja u JSON formatu.
-            None: Vraća None ako dođe do greške prilikom preuzimanja podataka.
+            dict: Rečnik sa podacima o knjizi, akciji i cenama.
         """
-        try:
-            response = requests.get(self.api_url)
-            response.raise_for_status()
-            data = response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"Greška pri povezivanju sa API-jem: {e}")
-            data = None
-        return data
+        category = (product.get('category') or '').lower().replace(' ', '_')
+        oldProductId = product.get('oldProductId', 'Nepoznat ID')
+        price_list = product.get('priceList', {})
+        regular_discount_price = price_list.get('regularDiscountPrice', 'N/A')
+        premium_discount_price = price_list.get('regularDiscountPremiumPrice', 'N/A')
+        action_type = action.get('actionType', 'N/A')
+
+        book_data = {
+            'title': product.get('title', 'Nema naslova'),
+            'authors': [author.get('authorName', 'Nepoznat autor') for author in product.get('authors', [])],
+            'genres': [genre.get('genreName', 'Nepoznat žanr') for genre in product.get('genres', [])],
+            'eBook': product.get('eBook', False),
+            'url': f"https://delfi.rs/{category}/{oldProductId}",
+            'description': product.get('description', 'Nema opisa'),
+            'actionType': action_type,
+            'actionTitle': action.get('actionTitle', 'N/A'),
+            'endAt': action.get('endAt'),
+            'actionDescription': action.get('actionDescription', 'N/A'),
+            'collectionFullPrice': product.get('collectionFullPrice', 'N/A'),
+            'fullPrice': price_list.get('fullPrice', 'N/A'),
+            'eBookPrice': price_list.get('eBookPrice', 'N/A'),
+        }
+
+        # U zavisnosti od vrste akcije dodajemo cene
+        if action_type in ('fixedDiscount', 'fixedPrice'):
+            if action_type == 'fixedPrice':
+                book_data.update({
+                    'fiksna cena': action.get('raw', {}).get('fixedPrice', 'N/A'),
+                    'potrebna količina za ostvarivanje akcije': action.get('raw', {}).get('fixedPriceCount', 'N/A')
+                })
+            book_data.update(action_price_tiers(
+                action.get('priceRegularStandard', 'N/A'),
+                action.get('priceRegularPremium', 'N/A'),
+                action.get('priceQuantityStandard', 'N/A'),
+                action.get('priceQuantityPremium', 'N/A'),
+            ))
+        elif action_type == 'exponentialDiscount':
+            book_data.update({
+                'stepenasti popust': [
+                    {
+                        'procenat': level.get('levelPercentage', 'N/A'),
+                        'akcijska cena': level.get('levelPrice', 'N/A'),
+                    }
+                    for level in action.get('levels', [])
+                ]
+            })
+        elif action_type == 'quantityDiscount2':
+            price_quantity_standard = action.get('priceQuantityStandard', 'N/A')
+            price_quantity_premium = action.get('priceQuantityPremium', 'N/A')
+            quantity_discount2_limit = action.get('quantityDiscount2Limit', 'N/A')
+            if regular_discount_price == premium_discount_price and price_quantity_standard == price_quantity_premium:
+                book_data.update({
+                    'cena sa popustom': regular_discount_price,
+                    'akcijska cena sa količiniskim popustom': price_quantity_standard,
+                    'limit za količinski popust': quantity_discount2_limit,
+                })
+            else:
+                book_data.update({
+                    'cena sa redovnim popustom': regular_discount_price,
+                    'cena sa premium popustom': premium_discount_price,
+                    'akcijska cena sa količiniskim popustom': price_quantity_standard,
+                    'akcijska premium cena sa količiniskim popustom': price_quantity_premium,
+                    'limit za količinski popust': quantity_discount2_limit,
+                })
+        return book_data
+
+    def _active_keys(self) -> List[str]:
+        # Akcije koje su istekle posle izgradnje indeksa se preskaču do sledećeg osvežavanja
+        now = datetime.now()
+        return [key for key, end_date in self.end_dates.items() if end_date is None or end_date > now]
+
+    def all_actions(self) -> List[Dict[str, str]]:
+        """
+        Vraća listu aktuelnih akcija sa opisima i krajnjim datumima.
+        """
+        return [dict(self.actions[key]) for key in self._active_keys()]
 
-    def fetch_actions(self, data):
+    def books_for_action(self, action_name: str, limit: int = 9) -> List[Dict[str, Any]]:
         """
-        Procesira podatke o akcijama i izdvaja unikatne aktuelne akcije.
+        Vraća knjige sa akcija čiji naziv sadrži zadati tekst, redom kojim se pojavljuju u feed-u.
 
         Args:
-            data (dict): JSON podaci preuzeti sa API-ja, koji sadrže sekcije i akcije.
+            action_name (str): Naziv akcije ili njegov deo (npr. "nauči kroz igr").
+            limit (int): Najveći broj knjiga koji se vraća. Podrazumevano 9.
+
+        Returns:
+            list: Lista rečnika sa informacijama o knjigama.
+        """
+        action_name = self.normalize(action_name)
+        matches = []
+        for key in self._active_keys():
+            if action_name in key:
+                matches.extend(self.books[key])
+
+        books = []
+        seen = set()
+        for position, book in sorted(matches, key=lambda match: match[0]):
+            if position in seen:
+                continue
+            seen.add(position)
+            books.append(dict(book))
+            if len(books) >= limit:
+                break
+        return books
+
+
+class ActionFetcher:
+    def __init__(self, api_url):
+        """
+        Inicijalizuje instancu klase sa zadatim URL-om API-ja.
+
+        Indeks akcija se gradi u pozadini pri svakom osvežavanju feed-a (vidi `krembot_feeds.FeedRefresher`).
+
+        Args:
+            api_url (str): URL API-ja odakle će se preuzimati podaci.
+        """
+        self.api_url = api_url
+        register_catalogue_feed("actions", api_url)
+
+    def index(self) -> Optional[ActionIndex]:
+        """
+        Vraća poslednji indeks akcija koji je osvežen u pozadini.
 
         Returns:
-            None: Podaci se interno dodaju u `self.unique_actions`.
-        """
-        if data:
-            for section in data.get('data', {}).get('sections', []):
-                products = section.get('content', {}).get('products', [])
-                for product in products:
-                    for action in product.get('actions', []):
-                        end_at = action.get('endAt')
-                        if end_at:
-                            try:
-                                end_date = datetime.fromisoformat(end_at.replace('Z', ''))
-                            except ValueError:
-                                continue
-                            if end_date > self.today:
-                                action_type = action.get('actionType')
-                                action_title = action.get('actionTitle')
-                                action_description = action.get('raw', {}).get('description', 'Nema opisa')
-                                end_date_str = end_date.strftime('%d.%m.%Y. %H:%M:%S')
-                                self.unique_actions.add((action_type, action_title, action_description, end_date_str))
+            ActionIndex: Indeks aktuelnih akcija.
+            None: Ako podaci još nikada nisu uspešno preuzeti.
+        """
+        return catalogue_feeds.get(self.api_url)
 
     def get_all_actions(self):
         """
@@ -2698,18 +2433,12 @@ class ActionFetcher:
                 - 'action_description' (str): Opis akcije.
                 - 'end_date' (str): Krajnji datum akcije u formatu 'dd.mm.yyyy. HH:MM:SS'.
         """
-        actions = []
-        for action in self.unique_actions:
-            actions.append({
-                'action_title': action[0],
-                'action_description': action[1],
-                'end_date': action[2]
-            })
-        return actions
+        index = self.index()
+        return index.all_actions() if index else []
 
     def fetch_books_for_action(self, action_name):
         """
-        Procesira podatke o knjigama za zadatu akciju i vraća listu knjiga sa svim relevantnim podacima.
+        Vraća listu knjiga sa svim relevantnim podacima za zadatu akciju.
 
         Args:
             action_name (str): Naziv akcije za koju treba pronaći knjige.
@@ -2720,182 +2449,8 @@ class ActionFetcher:
         Napomena:
             Ako je pronađeno više od 9 knjiga koje odgovaraju akciji, metoda će vratiti prvih 9 knjiga.
         """
-        
-        books = []
-        data = self.fetch_data()
-        if data:
-            action_name_lower = action_name.lower()
-            for section in data.get('data', {}).get('sections', []):
-                products = section.get('content', {}).get('products', [])
-                for product in products:
-                    # Proveravamo samo akcije pre nego što obrađujemo proizvode
-                    relevant_action = None
-                    for action in product.get('actions', []):
-                        if action_name_lower in action.get('actionTitle', '').lower():
-                            relevant_action = action
-                            break  # Pronašli smo relevantnu akciju, nema potrebe da tražimo dalje
-                    
-                    # Ako smo našli akciju, onda nastavljamo sa obradom proizvoda
-                    if relevant_action:
-                        # Extract common book data
-                        title = product.get('title', 'Nema naslova')
-                        description = product.get('description', 'Nema opisa')
-                        authors = [author.get('authorName', 'Nepoznat autor') for author in product.get('authors', [])]
-                        genres = [genre.get('genreName', 'Nepoznat žanr') for genre in product.get('genres', [])]
-                        eBook = product.get('eBook', False)
-                        category = product['category'].lower().replace(' ', '_')
-                        oldProductId = product.get('oldProductId', 'Nepoznat ID')
-                        url = f"https://delfi.rs/{category}/{oldProductId}"
-                        collection_price = product.get('collectionFullPrice', 'N/A')
-                        price_list = product.get('priceList', {})
-                        full_price = price_list.get('fullPrice', 'N/A')
-                        ebook_price = price_list.get('eBookPrice', 'N/A')
-                        regular_discount_price = price_list.get('regularDiscountPrice', 'N/A')
-                        premium_discount_price = price_list.get('regularDiscountPremiumPrice', 'N/A')
-
-                        # Extract action data
-                        action_type = relevant_action.get('actionType', 'N/A')
-                        end_at = relevant_action.get('endAt')
-                        action_title = relevant_action.get('actionTitle', 'N/A')
-                        action_description = relevant_action.get('actionDescription', 'N/A')
-                        # print(f"action_title: {action_title}")
-
-                        # Create the base data dictionary
-                        book_data = {
-                            'title': title,
-                            'authors': authors,
-                            'genres': genres,
-                            'eBook': eBook,
-                            'url': url,
-                            'description': description,
-                            'actionType': action_type,
-                            'actionTitle': action_title,
-                            'endAt':end_at,
-                            'actionDescription': action_description,
-                            'collectionFullPrice': collection_price,
-                            'fullPrice': full_price,
-                            'eBookPrice': ebook_price,
-                        }
-
-                        # Depending on the action type, add extra data
-                        if action_type == 'fixedDiscount':
-                            price_regular_standard = action.get('priceRegularStandard', 'N/A')
-                            price_regular_premium = action.get('priceRegularPremium', 'N/A')
-                            price_quantity_standard = action.get('priceQuantityStandard', 'N/A')
-                            price_quantity_premium = action.get('priceQuantityPremium', 'N/A')
-                            if price_regular_standard == price_regular_premium == price_quantity_standard == price_quantity_premium:
-                                book_data.update({
-                                    'akcijska cena': price_regular_standard
-                                })
-                            elif price_regular_standard == price_regular_premium and price_quantity_standard == price_quantity_premium:
-                                book_data.update({
-                                    'akcijska cena': price_regular_standard,
-                                    'akcijska cena sa količinskim popustom': price_quantity_standard,
-                                })
-                            elif price_regular_standard == price_quantity_standard and price_regular_premium == price_quantity_premium:
-                                book_data.update({
-                                    'akcijska cena': price_regular_standard,
-                                    'akcijska premium cena': price_regular_premium
-                                })
-                            elif price_regular_standard == price_regular_premium == price_quantity_standard != price_quantity_premium:
-                                book_data.update({
-                                    'akcijska cena': price_regular_standard,
-                                    'akcijska premium cena sa količinskim popustom': price_quantity_premium
-                                })
-                            elif price_regular_standard == price_quantity_standard and price_regular_premium != price_regular_standard and price_quantity_premium != price_quantity_standard and price_regular_premium != price_quantity_premium:
-                                book_data.update({
-                                    'akcijska cena': price_regular_standard,
-                                    'akcijska premium cena': price_regular_premium,
-                                    'akcijska premium cena sa količinskim popustom': price_quantity_premium
-                                })
-                            else:
-                                book_data.update({
-                                    'akcijska cena': price_regular_standard,
-                                    'akcijska premium cena': price_regular_premium,
-                                    'akcijska cena sa količinskim popustom': price_quantity_standard,
-                                    'akcijska premium cena sa količinskim popustom': price_quantity_premium,
-                                })
-                        elif action_type == 'fixedPrice':
-                            price_regular_standard = action.get('priceRegularStandard', 'N/A')
-                            price_regular_premium = action.get('priceRegularPremium', 'N/A')
-                            price_quantity_standard = action.get('priceQuantityStandard', 'N/A')
-                            price_quantity_premium = action.get('priceQuantityPremium', 'N/A')
-                            fixed_price = action.get('raw', {}).get('fixedPrice', 'N/A')
-                            fixed_price_limit = action.get('raw', {}).get('fixedPriceCount', 'N/A')
-                            book_data.update({
-                                'fiksna cena': fixed_price,
-                                'potrebna količina za ostvarivanje akcije': fixed_price_limit
-                            })
-                            if price_regular_standard == price_regular_premium == price_quantity_standard == price_quantity_premium:
-                                book_data.update({
-                                    'akcijska cena': price_regular_standard
-                                })
-                            elif price_regular_standard == price_regular_premium and price_quantity_standard == price_quantity_premium:
-                                book_data.update({
-                                    'akcijska cena': price_regular_standard,
-                                    'akcijska cena sa količinskim popustom': price_quantity_standard,
-                                })
-                            elif price_regular_standard == price_quantity_standard and price_regular_premium == price_quantity_premium:
-                                book_data.update({
-                                    'akcijska cena': price_regular_standard,
-                                    'akcijska premium cena': price_regular_premium
-                                })
-                            elif price_regular_standard == price_regular_premium == price_quantity_standard != price_quantity_premium:
-                                book_data.update({
-                                    'akcijska cena': price_regular_standard,
-                                    'akcijska premium cena sa količinskim popustom': price_quantity_premium
-                                })
-                            elif price_regular_standard == price_quantity_standard and price_regular_premium != price_regular_standard and price_quantity_premium != price_quantity_standard and price_regular_premium != price_quantity_premium:
-                                book_data.update({
-                                    'akcijska cena': price_regular_standard,
-                                    'akcijska premium cena': price_regular_premium,
-                                    'akcijska premium cena sa količinskim popustom': price_quantity_premium
-                                })
-                            else:
-                                book_data.update({
-                                    'akcijska cena': price_regular_standard,
-                                    'akcijska premium cena': price_regular_premium,
-                                    'akcijska cena sa količinskim popustom': price_quantity_standard,
-                                    'akcijska premium cena sa količinskim popustom': price_quantity_premium,
-                                })
-                        elif action_type == 'exponentialDiscount':
-                            levels = action.get('levels', [])
-                            level_list = []
-                            for level in levels:
-                                level_percentage = level.get('levelPercentage', 'N/A')
-                                level_price = level.get('levelPrice', 'N/A')
-                                level_list.append({
-                                    'procenat': level_percentage,
-                                    'akcijska cena': level_price,
-                                })
-                            book_data.update({
-                                'stepenasti popust': level_list
-                            })
-                        elif action_type == 'quantityDiscount2':
-                            price_quantity_standard = relevant_action.get('priceQuantityStandard', 'N/A')
-                            price_quantity_premium = relevant_action.get('priceQuantityPremium', 'N/A')
-                            quantity_discount2_limit = relevant_action.get('quantityDiscount2Limit', 'N/A')
-                            if regular_discount_price == premium_discount_price and price_quantity_standard == price_quantity_premium:
-                                book_data.update({
-                                    'cena sa popustom': regular_discount_price,
-                                    'akcijska cena sa količiniskim popustom': price_quantity_standard,
-                                    'limit za količinski popust': quantity_discount2_limit,
-                                })
-                            else:
-                                book_data.update({
-                                    'cena sa redovnim popustom': regular_discount_price,
-                                    'cena sa premium popustom': premium_discount_price,
-                                    'akcijska cena sa količiniskim popustom': price_quantity_standard,
-                                    'akcijska premium cena sa količiniskim popustom': price_quantity_premium,
-                                    'limit za količinski popust': quantity_discount2_limit,
-                                })
-
-                        # Add the book data to the list
-                        books.append(book_data)
-
-                        if len(books) >= 9:
-                            return books
-        return books
+        index = self.index()
+        return index.books_for_action(action_name) if index else []
 
     def decide_and_respond(self, question):
         """
@@ -2984,6 +2539,7 @@ class ActionFetcher:
                 temperature=0.0,
                 tool_choice="required",
             )
+        usage_collector.chat(response, "actions_router")
         assistant_message = response.choices[0].message
         finish_reason = response.choices[0].finish_reason
         
@@ -2994,8 +2550,6 @@ class ActionFetcher:
 
         if decision == 'Actions':
             # Korisnik pita za aktuelne akcije
-            data = self.fetch_data()
-            self.fetch_actions(data)
             return self.get_all_actions()
 
         elif decision == 'Books':
@@ -3021,10 +2575,44 @@ class ActionFetcher:
                             "Example user question: 'koje knjige su na akciji Nauci kroz igru' "
                             "domaći izdavači"
                         )
-                    },])
+                    },
+                    {"role": "user", "content": question}
+                ])
+            usage_collector.chat(action_name_response, "actions_name")
             action_name = action_name_response.choices[0].message.content.strip()
             print(f"naziv akcije: ", action_name)
             return self.fetch_books_for_action(action_name)
 
         else:
             return {"error": "Nije moguće odlučiti šta korisnik želi."}
+
+
+# Delfi catalogue feeds refreshed in the background: name -> (URL, parser, refresh interval in seconds)
+CATALOGUE_FEEDS = {
+    "toplists": (TOPLISTS_URL, TopListSnapshot, 600),
+    "actions": (ACTIONS_URL, ActionIndex, 600),
+    "bookstores": (BOOKSTORES_URL, BookstoreDirectory, 3600),
+}
+
+
+def register_catalogue_feed(name: str, url: Optional[str] = None) -> None:
+    """
+    Registers a feed of CATALOGUE_FEEDS for background refreshing.
+
+    Args:
+        name (str): The feed name.
+        url (Optional[str], optional): The URL to load the feed from. Defaults to the URL in CATALOGUE_FEEDS.
+    """
+    default_url, parse, interval = CATALOGUE_FEEDS[name]
+    catalogue_feeds.register(url or default_url, parse=parse, interval=interval, name=name)
+
+
+def register_catalogue_feeds() -> None:
+    """
+    Registers the Delfi catalogue feeds so they start loading in the background as soon as this module is imported.
+    """
+    for name in CATALOGUE_FEEDS:
+        register_catalogue_feed(name)
+
+
+register_catalogue_feeds()
@@ -0,0 +1,179 @@
+import atexit
+import threading
+
+from os import getenv
+from time import sleep
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from krembot_db import write_behind
+
+
+# Token columns of 'chatbot_token_log', in the order of `add_token_record_openai`
+USAGE_FIELDS = ('embedding_tokens', 'prompt_tokens', 'completion_tokens', 'stt_tokens', 'tts_tokens')
+
+
+def usage_of(response: Any) -> Tuple[Optional[str], Dict[str, Any]]:
+    """
+    Returns the model and the usage block of an OpenAI response object or decoded JSON response.
+    """
+    if isinstance(response, dict):
+        return response.get('model'), response.get('usage') or {}
+    usage = getattr(response, 'usage', None)
+    if hasattr(usage, 'model_dump'):
+        usage = usage.model_dump()
+    return getattr(response, 'model', None), usage or {}
+
+
+class UsageCollector:
+    """
+    Collects the token usage of every OpenAI call and writes it to 'chatbot_token_log' in bulk.
+
+    Calls are only counted in memory, per app_id and model, and every `flush_interval` seconds one row per
+    app_id and model is queued on the write-behind queue, so counting adds no database write per call.
+    Totals per call site (source) are kept for the lifetime of the process and reported by `stats`, to show
+    which paths are the most expensive.
+
+    Speech-to-text is counted in the tokens the API reports (none for whisper-1, which is billed per minute);
+    text-to-speech is counted in input characters, which is how it is billed.
+    """
+
+    def __init__(
+        self,
+        flush_interval: Optional[float] = None,
+        sink: Optional[Callable[..., None]] = None
+    ) -> None:
+        """
+        Initializes the collector. The flush thread starts with the first recorded call.
+
+        Args:
+            flush_interval (Optional[float], optional): Seconds between flushes. Defaults to the
+                                                        'USAGE_FLUSH_INTERVAL' environment variable or 60.
+            sink (Optional[Callable[..., None]], optional): Receives one aggregated row with the arguments of
+                                                            `add_token_record_openai`. Defaults to queueing it
+                                                            on the write-behind queue.
+        """
+        self.flush_interval = flush_interval if flush_interval is not None else float(getenv("USAGE_FLUSH_INTERVAL", "60"))
+        self.sink = sink or write_behind.add_token_record
+        self.totals: Dict[Tuple[str, str], List[int]] = {}
+        self.sources: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, source: str, model: Optional[str], **tokens: int) -> None:
+        """
+        Counts one call.
+
+        Args:
+            source (str): The call site, e.g. 'router' or 'answer'.
+            model (Optional[str]): The model name.
+            **tokens (int): Token counts by `USAGE_FIELDS` name.
+        """
+        counts = [int(tokens.get(field) or 0) for field in USAGE_FIELDS]
+        key = (getenv("APP_ID") or '', model or 'unknown')
+        with self._lock:
+            totals = self.totals.setdefault(key, [0] * len(USAGE_FIELDS))
+            for i, count in enumerate(counts):
+                totals[i] += count
+            per_source = self.sources.setdefault(source, dict.fromkeys(('calls',) + USAGE_FIELDS, 0))
+            per_source['calls'] += 1
+            for field, count in zip(USAGE_FIELDS, counts):
+                per_source[field] += count
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="usage-flush", daemon=True)
+                self._thread.start()
+
+    def chat(self, response: Any, source: str) -> Any:
+        """
+        Counts a chat completion, or the final chunk of a stream with `include_usage`.
+
+        Args:
+            response (Any): The response object or decoded JSON response.
+            source (str): The call site.
+
+        Returns:
+            Any: The response, so calls can be wrapped.
+        """
+        model, usage = usage_of(response)
+        if usage:
+            self.record(source, model, prompt_tokens=usage.get('prompt_tokens'), completion_tokens=usage.get('completion_tokens'))
+        return response
+
+    def embedding(self, response: Any, source: str) -> Any:
+        """
+        Counts an embeddings call.
+
+        Args:
+            response (Any): The response object.
+            source (str): The call site.
+
+        Returns:
+            Any: The response.
+        """
+        model, usage = usage_of(response)
+        self.record(source, model, embedding_tokens=usage.get('prompt_tokens'))
+        return response
+
+    def transcription(self, response: Any, model: str, source: str) -> Any:
+        """
+        Counts a speech-to-text call.
+
+        Args:
+            response (Any): The response object.
+            model (str): The transcription model (not part of the response).
+            source (str): The call site.
+
+        Returns:
+            Any: The response.
+        """
+        _, usage = usage_of(response)
+        self.record(source, model, stt_tokens=usage.get('total_tokens'))
+        return response
+
+    def speech(self, model: str, text: str, source: str) -> None:
+        """
+        Counts a text-to-speech call.
+
+        Args:
+            model (str): The speech model.
+            text (str): The input text.
+            source (str): The call site.
+        """
+        self.record(source, model, tts_tokens=len(text))
+
+    def flush(self) -> None:
+        """
+        Hands the aggregated usage since the last flush to the sink and, if there was any, prints the usage per
+        call site since the process started.
+        """
+        with self._lock:
+            totals, self.totals = self.totals, {}
+        for (app_id, model), counts in totals.items():
+            try:
+                self.sink(app_id, model, *counts)
+            except Exception as e:
+                print(f"Error flushing token usage: {e}")
+        if totals:
+            print("Token usage by source: " + "; ".join(
+                f"{row['source']}: {row['calls']} calls, " + ", ".join(f"{row[field]} {field}" for field in USAGE_FIELDS if row[field])
+                for row in self.stats()
+            ))
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """
+        Reports the usage per call site since the process started, most tokens first.
+
+        Returns:
+            List[Dict[str, Any]]: Per source: 'source', 'calls' and the `USAGE_FIELDS` token counts.
+        """
+        with self._lock:
+            report = [{'source': source, **counts} for source, counts in self.sources.items()]
+        return sorted(report, key=lambda row: -sum(row[field] for field in USAGE_FIELDS))
+
+    def _run(self) -> None:
+        while True:
+            sleep(self.flush_interval)
+            self.flush()
+
+
+usage_collector = UsageCollector()
+atexit.register(usage_collector.flush)
@@ -0,0 +1,147 @@
+import os
+import uuid
+
+import pytest
+
+from krembot_db import ConversationDatabase, MSSQLBackend, PromptDatabase, SQLiteBackend
+
+
+@pytest.fixture(params=['sqlite', 'mssql'])
+def backend(request, tmp_path):
+    """Every test runs against SQLite, and against MSSQL when 'MSSQL_HOST' points to a test database."""
+    if request.param == 'sqlite':
+        return SQLiteBackend(str(tmp_path / 'krembot.db'))
+    if not os.getenv('MSSQL_HOST'):
+        pytest.skip("MSSQL_HOST is not set")
+    pytest.importorskip('pyodbc')
+    return MSSQLBackend()
+
+
+@pytest.fixture
+def app_name():
+    """A unique app name, so tests never see rows of other runs on a shared MSSQL database."""
+    return f"test-{uuid.uuid4().hex[:12]}"
+
+
+def conversation(size, prefix='m'):
+    return [
+        {'role': 'user' if i % 2 == 0 else 'assistant', 'content': f"{prefix}{i}"}
+        for i in range(size)
+    ]
+
+
+@pytest.mark.parametrize('storage', ['blob', 'messages'])
+def test_conversation_round_trip(backend, app_name, storage):
+    with ConversationDatabase(backend=backend, storage=storage) as db:
+        db.create_sql_table()
+        assert db.query_sql_record(app_name, 'user', 't1') is None
+
+        db.update_or_insert_sql_record(app_name, 'user', 't1', conversation(3))
+        assert db.query_sql_record(app_name, 'user', 't1') == conversation(3)
+
+        db.update_or_insert_sql_record(app_name, 'user', 't1', conversation(6))
+        assert db.query_sql_record(app_name, 'user', 't1') == conversation(6)
+
+        db.update_or_insert_sql_record(app_name, 'user', 't1', conversation(2, prefix='r'))
+        assert db.query_sql_record(app_name, 'user', 't1') == conversation(2, prefix='r')
+
+        db.delete_sql_record(app_name, 'user', 't1')
+        assert db.query_sql_record(app_name, 'user', 't1') is None
+
+
+@pytest.mark.parametrize('storage', ['blob', 'messages'])
+def test_conversation_page(backend, app_name, storage):
+    with ConversationDatabase(backend=backend, storage=storage) as db:
+        db.create_sql_table()
+        db.update_or_insert_sql_record(app_name, 'user', 't1', conversation(10))
+        page, start = db.query_sql_record_page(app_name, 'user', 't1', limit=4)
+        assert (page, start) == (conversation(10)[6:], 6)
+        page, start = db.query_sql_record_page(app_name, 'user', 't1', limit=4, before=start)
+        assert (page, start) == (conversation(10)[2:6], 2)
+        db.delete_sql_record(app_name, 'user', 't1')
+
+
+def test_threads(backend, app_name):
+    with ConversationDatabase(backend=backend) as db:
+        db.create_sql_table()
+        for thread_id in ('t1', 't2', 't3'):
+            db.update_or_insert_sql_record(app_name, 'user', thread_id, conversation(2))
+        db.update_or_insert_sql_record(app_name, 'other', 't4', conversation(2))
+        db.update_or_insert_sql_record(app_name, 'user', 't1', conversation(4))
+
+        assert sorted(db.list_threads(app_name, 'user')) == ['t1', 't2', 't3']
+        assert db.list_threads(app_name, 'other') == ['t4']
+
+        for user_name, thread_id in (('user', 't1'), ('user', 't2'), ('user', 't3'), ('other', 't4')):
+            db.delete_sql_record(app_name, user_name, thread_id)
+        assert db.list_threads(app_name, 'user') == []
+
+
+def test_feedback(backend, app_name):
+    with ConversationDatabase(backend=backend) as db:
+        db.create_sql_table()
+        db.insert_feedback('t1', app_name, 'question', 'tool', 'answer', 'Good', '')
+        db.insert_feedback_many([
+            ('t1', app_name, 'question 2', 'tool', 'answer 2', 'Bad', 'wrong store'),
+            ('t2', app_name, 'question 3', 'tool', 'answer 3', 'Good', ''),
+        ])
+        db.cursor.execute(
+            "SELECT thread_id, previous_question, Thumbs, Feedback_text FROM Feedback WHERE app_name = ? ORDER BY id",
+            (app_name,)
+        )
+        rows = [tuple(row) for row in db.cursor.fetchall()]
+        db.cursor.execute("DELETE FROM Feedback WHERE app_name = ?", (app_name,))
+        db.conn.commit()
+
+    assert rows == [
+        ('t1', 'question', 'Good', ''),
+        ('t1', 'question 2', 'Bad', 'wrong store'),
+        ('t2', 'question 3', 'Good', ''),
+    ]
+
+
+def test_token_log(backend, app_name):
+    with ConversationDatabase(backend=backend) as db:
+        db.create_sql_table()
+        db.add_token_record_openai(app_name, 'gpt-4o', 1, 2, 3, 4, 5)
+        db.add_token_records_openai([
+            (app_name, 'gpt-4o-mini', 10, 20, 30, 0, 0),
+            (app_name, 'text-embedding-3-large', 100, 0, 0, 0, 0),
+        ])
+        db.cursor.execute(
+            "SELECT model_name, embedding_tokens, prompt_tokens, completion_tokens, stt_tokens, tts_tokens "
+            "FROM chatbot_token_log WHERE app_id = ? ORDER BY id",
+            (app_name,)
+        )
+        rows = [tuple(row) for row in db.cursor.fetchall()]
+        db.cursor.execute("DELETE FROM chatbot_token_log WHERE app_id = ?", (app_name,))
+        db.conn.commit()
+
+    assert rows == [
+        ('gpt-4o', 1, 2, 3, 4, 5),
+        ('gpt-4o-mini', 10, 20, 30, 0, 0),
+        ('text-embedding-3-large', 100, 0, 0, 0, 0),
+    ]
+
+
+def test_prompt_strings(backend, app_name):
+    names = [f"{app_name}-sys", f"{app_name}-rag"]
+    with PromptDatabase(backend=backend) as db:
+        for name, text in zip(names, ('system prompt', 'rag prompt')):
+            db.cursor.execute("INSERT INTO PromptStrings (PromptName, PromptString) VALUES (?, ?)", (name, text))
+        db.conn.commit()
+        try:
+            assert db.query_sql_prompt_strings(names) == {names[0]: 'system prompt', names[1]: 'rag prompt'}
+            assert db.query_sql_prompt_strings(names[::-1] + ['missing']) == {names[1]: 'rag prompt', names[0]: 'system prompt'}
+
+            versions = db.query_prompt_versions(names)
+            assert set(versions) == set(names) and versions[names[0]] != versions[names[1]]
+            assert db.query_versioned_prompt_strings(names[:1]) == {names[0]: ('system prompt', versions[names[0]])}
+
+            db.cursor.execute("UPDATE PromptStrings SET PromptString = ? WHERE PromptName = ?", ('new prompt', names[0]))
+            db.conn.commit()
+            changed = db.query_prompt_versions(names)
+            assert changed[names[0]] != versions[names[0]] and changed[names[1]] == versions[names[1]]
+        finally:
+            db.cursor.execute("DELETE FROM PromptStrings WHERE PromptName IN (?, ?)", tuple(names))
+            db.conn.commit()
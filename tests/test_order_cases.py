@@ -0,0 +1,50 @@
+import itertools
+
+import pytest
+
+from krembot_order_cases import ORDER_CASE_FIELDS, ORDER_CASES, delfi_check_which_case
+from legacy_order_cases import delfi_check_which_case as legacy_check_which_case
+
+
+def field_values(field):
+    """Every value a case mentions for the field, plus an unknown value and None."""
+    values = {None, 'UNKNOWN'}
+    for _, conditions in ORDER_CASES:
+        value = conditions.get(field)
+        if isinstance(value, list):
+            values.update(value)
+        elif value is not None:
+            values.add(value)
+    return sorted(values, key=str)
+
+
+ALL_ORDERS = [
+    dict(zip(ORDER_CASE_FIELDS, combination))
+    for combination in itertools.product(*(field_values(field) for field in ORDER_CASE_FIELDS))
+]
+
+
+def test_matches_legacy_logic_for_every_combination():
+    mismatches = [
+        (order, legacy_check_which_case(order), delfi_check_which_case(order))
+        for order in ALL_ORDERS
+        if legacy_check_which_case(order) != delfi_check_which_case(order)
+    ]
+    assert len(ALL_ORDERS) > 10000
+    assert mismatches == []
+
+
+def test_every_case_is_reachable():
+    reached = {delfi_check_which_case(order) for order in ALL_ORDERS}
+    assert reached == {case for case, _ in ORDER_CASES} | {'x24'}
+
+
+@pytest.mark.parametrize('order, expected', [
+    ({'type': 'standard', 'status': 'finished', 'delivery_service': 'DEFAULT', 'payment_type': 'ON_DELIVERY', 'package_status': 'WAITING_FOR_EXPORT'}, 'x1'),
+    ({'type': 'standard', 'status': 'paymentCompleted', 'delivery_service': 'DHL', 'payment_type': 'VISA_CREDIT_CARD', 'package_status': 'WAITING_FOR_EXPORT'}, 'x11'),
+    ({'type': 'ebook', 'status': 'canceled', 'delivery_service': None, 'payment_type': 'ANY_CREDIT_CARD', 'package_status': None}, 'x15'),
+    ({'type': 'standard', 'status': 'returned', 'delivery_service': 'DHL', 'payment_type': 'PAYMENT_SLIP', 'package_status': 'EXPORTED'}, 'x23'),
+    ({'type': 'standard', 'status': 'finished', 'delivery_service': 'DHL', 'payment_type': 'PAYMENT_SLIP', 'package_status': 'EXPORTED'}, 'x24'),
+])
+def test_known_orders(order, expected):
+    assert delfi_check_which_case(order) == expected